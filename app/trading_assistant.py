@@ -1,25 +1,56 @@
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
-import pandas as pd
 import ccxt
+import os
 import time
 import base64
 from openai import OpenAI
 
-from chart_to_code.main_plot import plot_main_chart
-from chart_to_code.oscillator_plot import plot_oscillator
-from chart_to_code.stock_rsi_plot import plot_stock_rsi
+from chart_to_code.main_plot import MainChartRenderer
+from chart_to_code.oscillator_plot import OscillatorRenderer
+from chart_to_code.stock_rsi_plot import StochRSIRenderer
 from chart_to_code.utils import make_rows
 from chart_to_code.rule_engine import evaluate_chart_logic
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.composite_plot import plot_composite
+from chart_to_code.render_cache import RenderCache
+from chart_to_code.vision_budget import PANEL_SIZES, token_report
+from chart_to_code.image_format import MIME_TYPES
+from chart_to_code.ohlcv_store import OHLCVStore
+from chart_to_code.rate_limit import LIVE, ScheduledExchange
+from chart_to_code.replay import ReplayExchange
+from chart_to_code.resample import candle_close
+from chart_to_code.single_flight import SingleFlight
 
 # Streamlit page config
 st.set_page_config(page_title="Trading Assistant", layout="wide")
 
 model_name = "/trained_model/snapshots/files"
 
-# Initialize exchange once and load markets
-exchange = ccxt.binance()
-exchange.load_markets()
+TIMEFRAME = "1h"
+
+# Lossless WebP: same pixels as PNG, fewer bytes to base64 and send per request
+IMAGE_FORMAT = "webp"
+
+# Initialize exchange once and load markets; requests share the machine-wide
+# Binance weight budget, ahead of dataset generation. REPLAY_DIR serves
+# recorded candles instead (offline load tests, see chart_to_code.replay)
+@st.cache_resource
+def get_exchange():
+    replay_dir = os.getenv("REPLAY_DIR")
+    if replay_dir:
+        exchange = ReplayExchange(
+            OHLCVStore(replay_dir),
+            speed=float(os.getenv("REPLAY_SPEED", 1)),
+            latency=float(os.getenv("REPLAY_LATENCY", 0)),
+            error_rate=float(os.getenv("REPLAY_ERROR_RATE", 0)),
+        )
+    else:
+        exchange = ScheduledExchange(ccxt.binance(), priority=LIVE)
+    exchange.load_markets()
+    return exchange
+
+exchange = get_exchange()
 
 # Load system and user prompts from files
 with open("prompts/chart_analysis_system_prompt.md", "r") as f:
@@ -34,6 +65,17 @@ with st.sidebar.form(key="settings_form"):
         "Enter up to 10 tokens (comma-separated)",
         value="BTC/USDT, ETH/USDT, LINK/USDT"
     )
+    image_mode = st.radio(
+        "Image layout",
+        options=["panels", "composite"],
+        format_func=lambda m: "Three panels" if m == "panels" else "One stacked image",
+        help="The stacked image sends one image per symbol to the model instead of three.",
+    )
+    pixel_budget = st.checkbox(
+        "Fit images to the model's 28px patch grid",
+        value=False,
+        help="Renders every image at a fixed size in multiples of 28px, which costs fewer vision tokens.",
+    )
     run_button = st.form_submit_button(label="Run Analysis")
 
 # Only run after user presses button
@@ -65,10 +107,119 @@ def get_client():
 
 client = get_client()
 
+# One render cache for all sessions: reruns over unchanged candles
+# (widget interaction, or refreshes of a slower market) reuse the images
+@st.cache_resource
+def get_render_cache():
+    return RenderCache(maxsize=256)
+
+render_cache = get_render_cache()
+
+# Local candle store: each refresh only downloads the candles since the last one
+@st.cache_resource
+def get_ohlcv_store():
+    # one directory per exchange: replayed candles stay out of the live store
+    return OHLCVStore.for_exchange(exchange)
+
+ohlcv_store = get_ohlcv_store()
+
+# One flight group for all sessions: sessions asking for the same symbol and
+# candle share a single fetch, render and model call
+@st.cache_resource
+def get_flights():
+    return SingleFlight(maxsize=512)
+
+flights = get_flights()
+
+# Persistent panel renderers, kept per browser session (matplotlib figures
+# must not be shared between the threads serving different sessions)
+# (one set per size setting)
+sizes = PANEL_SIZES if pixel_budget else {}
+if "renderers" not in st.session_state:
+    st.session_state.renderers = {}
+if pixel_budget not in st.session_state.renderers:
+    st.session_state.renderers[pixel_budget] = (
+        MainChartRenderer(size=sizes.get("main"), format=IMAGE_FORMAT),
+        OscillatorRenderer(size=sizes.get("ao"), format=IMAGE_FORMAT),
+        StochRSIRenderer(size=sizes.get("rsi"), format=IMAGE_FORMAT),
+    )
+main_renderer, osc_renderer, rsi_renderer = st.session_state.renderers[pixel_budget]
+# the cache keys include each renderer's size and format
+render_main = render_cache.wrap(main_renderer.render)
+render_osc = render_cache.wrap(osc_renderer.render)
+render_rsi = render_cache.wrap(rsi_renderer.render)
+render_composite = render_cache.wrap(plot_composite)
+
 # Helper to base64-encode image bytes for VLM
-def make_image_part(png_bytes: bytes):
-    b64 = base64.b64encode(png_bytes).decode("utf-8")
-    return {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
+def make_image_part(img_bytes: bytes):
+    b64 = base64.b64encode(img_bytes).decode("utf-8")
+    mime = MIME_TYPES[IMAGE_FORMAT]
+    return {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64}"}}
+
+# One user message per image: three for the panels, one for the composite
+def build_user_messages(images: list[bytes], debug_text: str) -> list[dict]:
+    # Pass user prompt and debug data before images
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": user_prompt_text},
+                {"type": "text", "text": debug_text},
+                make_image_part(img)
+            ]
+        }
+        for img in images
+    ]
+
+# Fetch, analysis and model call, each run once per symbol and candle for all
+# sessions (see get_flights); they must not call st.* themselves
+def fetch_candles(symbol):
+    return ohlcv_store.fetch(exchange, symbol, TIMEFRAME, limit=100)
+
+def analyze(df):
+    """Chart images and debug text for one window (no Streamlit output)."""
+    # Indicators are computed once and shared by the plots and the rule engine
+    ind = IndicatorFrame(df)
+
+    # Plot charts
+    if image_mode == "composite":
+        images = [render_composite(ind, size=sizes.get("composite"), format=IMAGE_FORMAT)]
+    else:
+        images = [render_main(ind), render_osc(ind), render_rsi(ind)[0]]
+    # the last %K/%D plotted, from the same memoized Stoch RSI as the panels
+    fastk, fastd = ind.stoch_rsi()
+    k_last, d_last = float(fastk.iloc[-1]), float(fastd.iloc[-1])
+
+    # Evaluate rule engine for numeric debug values
+    label, reasons, debug = evaluate_chart_logic(ind)
+    # override so they match the chart’s last points exactly:
+    debug['%K'] = round(k_last, 2)
+    debug['%D'] = round(d_last, 2)
+
+    # Prepare debug text
+    debug_text = (
+        f"price: {debug.get('price')}, trend: {debug.get('trend')}, ao: {debug.get('ao')}, "
+        f"%K: {debug.get('%K')}, %D: {debug.get('%D')}"
+    )
+    return images, debug_text
+
+def ask_model(images, debug_text):
+    """(answer text, prompt tokens, latency in seconds) from the VLM."""
+    # Build VLM prompt
+    system_msg = {"role": "system", "content": [{"type": "text", "text": system_prompt_text}]}
+    user_msgs = build_user_messages(images, debug_text)
+
+    # Call OpenAI once
+    start = time.time()
+    resp = client.chat.completions.create(
+        model=model_name,
+        messages=[system_msg] + user_msgs,
+        max_tokens=512
+    )
+    latency = time.time() - start
+    # prompt tokens show the image-token cost of the chosen layout
+    prompt_tokens = resp.usage.prompt_tokens if resp.usage else "n/a"
+    return resp.choices[0].message.content.strip(), prompt_tokens, latency
 
 # Title
 st.markdown("<h1 style='text-align: center;'>Trading Assistant</h1>", unsafe_allow_html=True)
@@ -83,71 +234,54 @@ for row in rows:
             continue
         with col:
             st.subheader(symbol)
-            # Fetch data
-            data = exchange.fetch_ohlcv(symbol, timeframe="1h", limit=100)
-            df = pd.DataFrame(data, columns=["ts","open","high","low","close","volume"])
-            df["ts"] = pd.to_datetime(df["ts"], unit="ms")
-            df.set_index("ts", inplace=True)
-
-            # Plot charts
-            main_png = plot_main_chart(df)
-            osc_png  = plot_oscillator(df)
-            # now returns (png_bytes, last_K, last_D)
-            rsi_png, k_last, d_last = plot_stock_rsi(df)
-
-
-            st.image(main_png, caption="Main Chart", use_container_width=True)
-            st.image(osc_png, caption="Oscillator Panel", use_container_width=True)
-            st.image(rsi_png, caption="Stochastic RSI Panel", use_container_width=True)
-
-            # Evaluate rule engine for numeric debug values
+            # Results are keyed by the close of the current candle, so every
+            # session shares them until the next candle opens
+            close = candle_close(TIMEFRAME, exchange.milliseconds())
+            layout = (image_mode, pixel_budget)
 
-            label, reasons, debug = evaluate_chart_logic(df)
-            # override so they match the chart’s last points exactly:
-            debug['%K'] = round(k_last, 2)
-            debug['%D'] = round(d_last, 2)
+            # Fetch data
+            df = flights.do(("ohlcv", symbol, TIMEFRAME, close), lambda: fetch_candles(symbol))
+            images, debug_text = flights.do(("analysis", symbol, TIMEFRAME, close, layout),
+                                            lambda: analyze(df))
 
+            if image_mode == "composite":
+                st.image(images[0], caption="Price / Oscillator / Stochastic RSI", use_container_width=True)
+            else:
+                main_png, osc_png, rsi_png = images
+                st.image(main_png, caption="Main Chart", use_container_width=True)
+                st.image(osc_png, caption="Oscillator Panel", use_container_width=True)
+                st.image(rsi_png, caption="Stochastic RSI Panel", use_container_width=True)
 
-            # Prepare debug text
-            debug_text = (
-                f"price: {debug.get('price')}, trend: {debug.get('trend')}, ao: {debug.get('ao')}, "
-                f"%K: {debug.get('%K')}, %D: {debug.get('%D')}"
-            )
             # Display debug values (for debugging)
             st.markdown(f"**Debug Values:** {debug_text}")
 
-            # Build VLM prompt
-            system_msg = {"role": "system", "content": [{"type": "text", "text": system_prompt_text}]}
-            user_msgs = []
-            # Pass user prompt and debug data before images
-            for img in [main_png, osc_png, rsi_png]:
-                part = make_image_part(img)
-                user_msgs.append({
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": user_prompt_text},
-                        {"type": "text", "text": debug_text},
-                        part
-                    ]
-                })
-
-            # Call OpenAI once
-            start = time.time()
-            resp = client.chat.completions.create(
-                model=model_name,
-                messages=[system_msg] + user_msgs,
-                max_tokens=512
+            result_text, prompt_tokens, latency = flights.do(
+                ("model", symbol, TIMEFRAME, close, layout), lambda: ask_model(images, debug_text)
             )
-            latency = time.time() - start
 
             # Display result with bold label
-            result_text = resp.choices[0].message.content.strip()
             lines = result_text.split("\n", 1)
             label_line = lines[0]
             rest = lines[1] if len(lines) > 1 else ""
 
-            st.write(f"⏱️ {latency:.2f}s")
+            vision_tokens = token_report(dict(enumerate(images)))["total"]["tokens"]
+            st.write(f"⏱️ {latency:.2f}s · {prompt_tokens} prompt tokens "
+                     f"({len(images)} image(s), ~{vision_tokens} vision tokens)")
             if rest:
                 st.markdown(f"**{label_line}**\n{rest}")
             else:
                 st.markdown(f"**{label_line}**")
+
+# Render cache usage, for sizing maxsize
+stats = render_cache.stats()
+st.sidebar.caption(
+    f"Render cache: {stats['hit_rate']:.0%} hit rate "
+    f"({stats['hits']} hits / {stats['misses']} misses), "
+    f"{stats['entries']}/{stats['maxsize']} entries, {stats['bytes'] / 1e6:.1f} MB"
+)
+# Shared work across sessions: executions vs. results reused or joined in flight
+flight_stats = flights.stats()
+st.sidebar.caption(
+    f"Shared results: {flight_stats['misses']} computed, {flight_stats['hits']} reused, "
+    f"{flight_stats['shared']} joined in flight"
+)
@@ -1,9 +1,11 @@
 import ccxt
-import pandas as pd
 import time
 from datetime import datetime, timezone
 import talib
 
+from chart_to_code.ohlcv_store import OHLCVStore
+from chart_to_code.rate_limit import LIVE, ScheduledExchange
+
 # ─── CONFIG
 API_KEY    = "BINANCE_API_KEY"
 API_SECRET = "BINANCE_SECRET_KEY"
@@ -19,20 +21,19 @@ START_TS = datetime(2017,1,1, tzinfo=timezone.utc).timestamp()
 END_TS   = datetime(2121,1,1, tzinfo=timezone.utc).timestamp()
 
 # ─── SETUP
-exchange = ccxt.binance({
+# candle requests draw from the machine-wide Binance weight budget
+exchange = ScheduledExchange(ccxt.binance({
     'apiKey': API_KEY,
     'secret': API_SECRET,
     'enableRateLimit': True,
-})
+}), priority=LIVE)
 exchange.load_markets()
 
-def fetch_ohlcv(since=None, limit=500):
-    data = exchange.fetch_ohlcv(SYMBOL, timeframe=TIMEFRAME,
-                                since=since, limit=limit)
-    df = pd.DataFrame(data, columns=['ts','open','high','low','close','vol'])
-    df['ts'] = pd.to_datetime(df['ts'], unit='ms')
-    df.set_index('ts', inplace=True)
-    return df
+# local candle store: after the first run only new candles are downloaded
+store = OHLCVStore.for_exchange(exchange)
+
+def fetch_ohlcv(limit=500):
+    return store.fetch(exchange, SYMBOL, TIMEFRAME, limit=limit)
 
 def within_window(ts):
     return START_TS <= ts.timestamp() <= END_TS
@@ -5,10 +5,14 @@ import signal
 import argparse
 from typing import List
 
-import pandas as pd
 from ccxt.async_support import binance as AsyncBinance
 from dotenv import load_dotenv
 
+from chart_to_code.indicators import IndicatorState
+from chart_to_code.ohlcv_store import OHLCVStore
+from chart_to_code.rate_limit import LIVE, ScheduledExchange
+from chart_to_code.replay import AsyncReplayExchange
+
 
 def setup_logger(name: str = __name__, level: int = logging.INFO) -> logging.Logger:
     """
@@ -37,31 +41,7 @@ def setup_logger(name: str = __name__, level: int = logging.INFO) -> logging.Log
     return logger
 
 
-async def fetch_ohlcv(
-    exchange: AsyncBinance,
-    symbol: str,
-    timeframe: str = "1h",
-    limit: int = 100
-) -> pd.DataFrame:
-    """
-    Fetch OHLCV data asynchronously and return a DataFrame.
-    """
-    raw = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-    df = pd.DataFrame(raw, columns=["ts", "open", "high", "low", "close", "volume"])
-    df["ts"] = pd.to_datetime(df["ts"], unit="ms")
-    return df.set_index("ts")
-
-
-def compute_indicators(df: pd.DataFrame) -> pd.DataFrame:
-    """Compute trend indicators."""
-    df = df.copy()
-    df["SMMA14"] = df["close"].ewm(alpha=1/14, adjust=False).mean()
-    df["EMA13"] = df["close"].ewm(span=13, adjust=False).mean()
-    df["EMA21"] = df["close"].ewm(span=21, adjust=False).mean()
-    return df
-
-
-def determine_trend(latest: pd.Series) -> str:
+def determine_trend(latest) -> str:
     """Return trend: bullish, bearish, or sideways."""
     close, smma, ema13, ema21 = (
         latest["close"], latest["SMMA14"], latest["EMA13"], latest["EMA21"]
@@ -108,11 +88,16 @@ class TrendBot:
         amount: float,
         interval: int,
         live: bool,
-        logger: logging.Logger
+        logger: logging.Logger,
+        exchange=None
     ):
         load_dotenv()  # Load .env over OS env if present
-        creds = {"apiKey": api_key, "secret": api_secret, "enableRateLimit": True}
-        self.exchange = AsyncBinance(creds)
+        if exchange is None:
+            creds = {"apiKey": api_key, "secret": api_secret, "enableRateLimit": True}
+            # candle requests draw from the machine-wide Binance weight budget
+            exchange = ScheduledExchange(AsyncBinance(creds), priority=LIVE)
+        # any async ccxt-style exchange, e.g. replay.AsyncReplayExchange for offline runs
+        self.exchange = exchange
         self.symbols = symbols
         self.timeframe = timeframe
         self.amount = amount
@@ -120,6 +105,11 @@ class TrendBot:
         self.live = live
         self.logger = logger
         self._stopping = False
+        # local candle store: each cycle only downloads the candles since the last one
+        # (one per exchange, so a replay does not write into the live one)
+        self.store = OHLCVStore.for_exchange(exchange)
+        # per-symbol incremental indicators, seeded on first fetch
+        self._states: dict[str, IndicatorState] = {}
 
     async def start(self) -> None:
         """Begin the main loop."""
@@ -136,9 +126,20 @@ class TrendBot:
     async def _process_symbol(self, symbol: str) -> None:
         """Fetch data, compute trend, optionally trade."""
         try:
-            df = await fetch_ohlcv(self.exchange, symbol, self.timeframe)
-            df = compute_indicators(df)
-            latest = df.iloc[-1]
+            state = self._states.get(symbol)
+            if state is not None:
+                # last closed candle plus the forming one; older bars are already in the state
+                df = await self.store.afetch(self.exchange, symbol, self.timeframe, limit=2)
+                if df.index[0] > state.last_ts:
+                    state = None  # missed candles since the last cycle, reseed
+                else:
+                    for ts, row in df.iterrows():
+                        if ts >= state.last_ts:
+                            state.update(ts, row["high"], row["low"], row["close"])
+            if state is None:
+                df = await self.store.afetch(self.exchange, symbol, self.timeframe)
+                state = self._states[symbol] = IndicatorState.from_frame(df)
+            latest = state.values()
             trend = determine_trend(latest)
             self.logger.info(f"{symbol} trend: {trend}")
 
@@ -162,6 +163,9 @@ def main() -> None:
     parser.add_argument("--amount", type=float, default=0.001)
     parser.add_argument("--interval", type=int, default=3600)
     parser.add_argument("--timeframe", type=str, default="1h")
+    parser.add_argument("--replay", type=str, default=None,
+                        help="serve candles recorded in this OHLCV store instead of Binance")
+    parser.add_argument("--replay-speed", type=float, default=1.0)
     args = parser.parse_args()
 
     symbols = [s.strip().upper() for s in args.symbols.split(",")]
@@ -169,13 +173,17 @@ def main() -> None:
     api_secret = args.secret or os.getenv("BINANCE_SECRET_KEY")
 
     logger = setup_logger()
+    exchange = None
+    if args.replay:
+        exchange = AsyncReplayExchange(OHLCVStore(args.replay), speed=args.replay_speed)
     bot = TrendBot(
         symbols, api_key, api_secret,
         timeframe=args.timeframe,
         amount=args.amount,
         interval=args.interval,
         live=args.live,
-        logger=logger
+        logger=logger,
+        exchange=exchange
     )
 
     loop = asyncio.get_event_loop()
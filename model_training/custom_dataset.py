@@ -2,14 +2,28 @@
 
 import torch
 from torch.utils.data import Dataset
-from PIL import Image
 import os
 
+from chart_to_code.image_format import load_image
+from chart_to_code.packed import PackReader
+
 class MultiImageJSONLDataset(Dataset):
-    def __init__(self, jsonl_path, processor, base_image_dir, max_length=512):
+    """
+    Samples from the generators' training JSONL. Each sample carries either the
+    three panels (image_mode "panels") or one stacked image ("composite"); the
+    prompt holds one <image> tag per image either way.
+
+    Lines of packed shards (chart_to_code.packed) carry "pack"/"pack_index"
+    instead of image paths; their images are read from the pack in
+    `pack_dir` (default: "packs" beside base_image_dir) through mmap.
+    """
+
+    def __init__(self, jsonl_path, processor, base_image_dir, max_length=512, pack_dir=None):
         self.processor = processor
         self.base_image_dir = base_image_dir
         self.max_length = max_length
+        self.pack_dir = pack_dir or os.path.join(os.path.dirname(os.path.normpath(base_image_dir)), "packs")
+        self._packs = {}
 
         # Load all examples
         import jsonlines
@@ -19,23 +33,37 @@ class MultiImageJSONLDataset(Dataset):
     def __len__(self):
         return len(self.data)
 
+    def image_mode(self, idx):
+        """'panels' or 'composite' for sample idx (older JSONL lines have no image_mode)."""
+        item = self.data[idx]
+        return item.get("image_mode", "composite" if len(item["images"]) == 1 else "panels")
+
+    def _pack(self, name):
+        if name not in self._packs:
+            self._packs[name] = PackReader(os.path.join(self.pack_dir, name))
+        return self._packs[name]
+
     def __getitem__(self, idx):
         item = self.data[idx]
 
-        # Resolve image paths
-        image_paths = [
-            os.path.join(self.base_image_dir, os.path.normpath(img.replace("panels/", "")))
-            for img in item["images"]
-        ]
-
-        # Load images and force RGB
-        images = []
-        for img_path in image_paths:
-            try:
-                img = Image.open(img_path).convert("RGB")  # Force 3-channel RGB
-                images.append(img)
-            except Exception as e:
-                raise ValueError(f"Error loading image {img_path}: {e}")
+        if "pack" in item:
+            # one mapped file per shard; RGB for every stored format
+            images = self._pack(item["pack"]).images(item["pack_index"])
+        else:
+            # Resolve image paths
+            image_paths = [
+                os.path.join(self.base_image_dir, os.path.normpath(img.replace("panels/", "")))
+                for img in item["images"]
+            ]
+
+            # Load images and force RGB
+            images = []
+            for img_path in image_paths:
+                try:
+                    img = load_image(img_path)  # 3-channel RGB; .npy arrays need no decode
+                    images.append(img)
+                except Exception as e:
+                    raise ValueError(f"Error loading image {img_path}: {e}")
 
         # Build prompt
         prompt = ""
@@ -45,6 +73,11 @@ class MultiImageJSONLDataset(Dataset):
             else:
                 response = turn["value"]
 
+        if prompt.count("<image>") != len(images):
+            raise ValueError(
+                f"Sample {idx} ({self.image_mode(idx)}): prompt has {prompt.count('<image>')} "
+                f"<image> tags for {len(images)} images"
+            )
 
         encoding = self.processor(
             text=prompt,
@@ -3,62 +3,50 @@
 Automates creation of a labeled chart‑analysis dataset by:
 
 1. Iterating over a list of symbols and timeframes.
-2. Fetching the latest 100 OHLC candles for each combination.
+2. Fetching a long OHLC history (HISTORY_BARS candles) for each combination
+   once, concurrently (chart_to_code.async_fetch; EXCHANGE=stub runs offline),
+   through the local candle store (chart_to_code.ohlcv_store), and sliding
+   the 100-candle chart window across it (chart_to_code.window_sampler).
 3. Generating three chart panels (price, Awesome Oscillator, Stochastic RSI) via:
      - main_plot.plot_main_chart
      - oscillator_plot.plot_oscillator
      - stock_rsi_plot.plot_stock_rsi
+   or, with IMAGE_MODE=composite, one stacked image via composite_plot.plot_composite.
 4. Applying rule_engine.evaluate_chart_logic to each DataFrame to produce:
      - a label
      - explanatory phrases
      - debug metadata (only for sample checking, not for training)
+   Every window is labeled (vectorized) before anything is rendered, and only
+   windows of labels whose quota is still open are drawn and rendered.
 5. Saving each example into a JSON‑lines for training (and per‑sample JSON) with:
      - file paths to the rendered images
      - the generated label and supporting reasons
      - debug information (only in the per-sample JSON for sample checking)
+   The JSON-lines are written in numbered shards (chart_to_code.shards) that
+   keep the quota and fingerprint state on disk: a rerun resumes where the
+   last one stopped, and several runs on one machine fill disjoint shards.
+   data.jsonl is rebuilt from the finished shards.
+
+The steps run concurrently as stages of a streaming pipeline
+(chart_to_code.pipeline), which reports each stage's throughput and queue
+depth so the bottleneck stage can be given more workers.
 
 The result is a large, rule‑annotated corpus of chart snapshots and human‑readable
 commentary for model training.
 """
 
+import asyncio
 import os
-import json
-import time
-import random
 from itertools import product
-import hashlib
-
-import ccxt
-import pandas as pd
-
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'trading_assistant')))
-
-from main_plot import plot_main_chart
-from oscillator_plot import plot_oscillator
-from stock_rsi_plot import plot_stock_rsi
-from rule_engine import evaluate_chart_logic
-
-# Configuration
-BASE_DIR = "data"
-FULL_DIR = os.path.join(BASE_DIR, "full")
-TRAIN_DIR = os.path.join(BASE_DIR, "training")
-IMAGE_DIRS = {
-    "main": os.path.join(BASE_DIR, "panels/main"),
-    "ao": os.path.join(BASE_DIR, "panels/ao"),
-    "rsi": os.path.join(BASE_DIR, "panels/rsi")
-}
 
+from chart_to_code.generation import SYMBOLS, DatasetWriter, GeneratorSettings
+from chart_to_code.pipeline import Pipeline
+from chart_to_code.window_sampler import WindowSampler, window_labels
 
-
-
-SYMBOLS = [
-    "BTC/USDT", "ETH/USDT", "XRP/USDT", "BNB/USDT", "SOL/USDT", "TRX/USDT",
-    "ADA/USDT", "SUI/USDT", "LINK/USDT", "HBAR/USDT", "AVAX/USDT", "LTC/USDT",
-    "DOT/USDT", "NEAR/USDT", "MINA/USDT", "ALGO/USDT", "POL/USDT", "ARB/USDT",
-    "SEI/USDT", "ATOM/USDT", "FIL/USDT", "FET/USDT", "OP/USDT", "TIA/USDT", "MANTA/USDT"
-]
+# Configuration: directories, image mode/format, shards, render pool, pipeline
+# and exchange settings come from the environment (chart_to_code.generation)
+settings = GeneratorSettings("data")
+settings.make_dirs()
 
 TIMEFRAMES = ["1h", "4h", "1d"]
 MAX_EXAMPLES = 250
@@ -71,108 +59,110 @@ LABEL_QUOTA = {
     "Bearish": 50
 }
 
-# Create directories
-os.makedirs(FULL_DIR, exist_ok=True)
-os.makedirs(TRAIN_DIR, exist_ok=True)
-for path in IMAGE_DIRS.values():
-    os.makedirs(path, exist_ok=True)
-
-# Initialize exchange
-exchange = ccxt.binance()
-exchange.load_markets()
-
-# Tracker
-total_count = 0
-collected = {label: 0 for label in LABEL_QUOTA}
-seen_fingerprints = set()
-
-# Main generation loop
-while total_count < MAX_EXAMPLES:
-    for symbol, timeframe in product(SYMBOLS, TIMEFRAMES):
-        if total_count >= MAX_EXAMPLES:
-            break
-
+# Chart windows of WINDOW candles, ending every WINDOW_STRIDE candles of a
+# HISTORY_BARS-candle history per symbol/timeframe; for larger datasets raise
+# HISTORY_BARS (or lower the stride) until every label has enough windows
+WINDOW = 100
+HISTORY_BARS = int(os.getenv("HISTORY_BARS", 1000))
+WINDOW_STRIDE = int(os.getenv("WINDOW_STRIDE", 5))
+SAMPLE_SEED = int(os.getenv("SAMPLE_SEED", 0))
+
+near_duplicates = settings.near_duplicates()
+# Progress (example counts, quotas, fingerprints) lives in the shards; the
+# near-duplicate index is saved as each shard commits
+writer = DatasetWriter(settings, MAX_EXAMPLES, LABEL_QUOTA, near_duplicates)
+# Claim the first shard before syncing anything: once every shard is finished
+# (or taken by other runs) there is nothing to fetch or label
+first_shard = writer.claim()
+if first_shard is None:
+    print(f"Nothing left to generate: {writer.status()}")
+    raise SystemExit
+
+exchange, fetcher, ohlcv_store = settings.open_exchange()
+
+
+# Generation runs as a pipeline of stages connected by bounded queues
+# (chart_to_code.pipeline), each with its own concurrency:
+#   fetch   syncs every history concurrently, passing each on as it arrives
+#   label   labels all windows of a history (vectorized)
+#   sample  collects the labeled windows; once all are in, draws windows of
+#           the labels the claimed shard's quotas still need (windows already
+#           in the dataset or near-duplicates of them are skipped) and claims
+#           the next shard when the current one is fully reserved
+#   render  renders the drawn windows on the process pool
+#   write   writes images, per-sample JSON and shard lines in batches and
+#           commits every shard that fills
+# A slow stage holds back the ones before it; the throughput, busy share and
+# queue depth of every stage are reported every PIPELINE_REPORT seconds
+sampler = WindowSampler(window=WINDOW, stride=WINDOW_STRIDE, seed=SAMPLE_SEED, dedup=near_duplicates)
+
+
+async def fetch_histories(emit):
+    """Sync every pair's history concurrently, emitting (key, DataFrame) as each arrives."""
+    async def fetch(key):
         try:
-            # Fetch candles
-            data = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=100)
-            df = pd.DataFrame(data, columns=["ts", "open", "high", "low", "close", "volume"])
-            df["ts"] = pd.to_datetime(df["ts"], unit="ms")
-            df.set_index("ts", inplace=True)
-
-            # Deduplication fingerprint
-            close_series = df["close"].round(3).astype(str)
-            fingerprint = hashlib.md5(close_series.to_json().encode()).hexdigest()
-            if fingerprint in seen_fingerprints:
-                continue
-            seen_fingerprints.add(fingerprint)
-
-
-            # Generate charts (note unpack of rsi)
-            main_img        = plot_main_chart(df)                # bytes
-            ao_img          = plot_oscillator(df)                # bytes
-            rsi_img, k_last, d_last = plot_stock_rsi(df)         # bytes, float, float
-
-            # Evaluate rule-based logic
-            label, reasoning, debug = evaluate_chart_logic(df)
-
-            # Skip if quota for this label is full
-            if collected[label] >= LABEL_QUOTA[label]:
-                continue
-
-            # Save image files
-            id_str = f"{total_count:04d}"
-            main_path = os.path.join(IMAGE_DIRS["main"], f"{id_str}_main.png")
-            ao_path   = os.path.join(IMAGE_DIRS["ao"],   f"{id_str}_ao.png")
-            rsi_path  = os.path.join(IMAGE_DIRS["rsi"],  f"{id_str}_rsi.png")
-
-            with open(main_path, "wb") as f: f.write(main_img)
-            with open(ao_path, "wb") as f: f.write(ao_img)
-            with open(rsi_path, "wb") as f: f.write(rsi_img)
-
-            # Save full JSON with debug info
-            full_example = {
-                "symbol": symbol,
-                "timeframe": timeframe,
-                "label": label,
-                "reasoning": reasoning,
-                "debug": debug,
-                "images": {
-                    "main": os.path.relpath(main_path, BASE_DIR),
-                    "ao": os.path.relpath(ao_path, BASE_DIR),
-                    "rsi": os.path.relpath(rsi_path, BASE_DIR)
-                }
-            }
-            full_fname = f"{id_str}_{symbol.replace('/', '')}_{timeframe}.json"
-            with open(os.path.join(FULL_DIR, full_fname), 'w') as f:
-                json.dump(full_example, f, indent=2)
-
-            # Save training-ready JSONL
-            training_example = {
-                "images": [
-                    os.path.relpath(main_path, BASE_DIR),
-                    os.path.relpath(ao_path, BASE_DIR),
-                    os.path.relpath(rsi_path, BASE_DIR)
-                ],
-                "conversations": [
-                    {
-                        "from": "human",
-                        "value": "<image>\n<image>\n<image>\nWhat is the signal based on these charts?"
-                    },
-                    {
-                        "from": "gpt",
-                        "value": label + "\n- " + "\n- ".join(reasoning)
-                    }
-                ]
-            }
-            with open(os.path.join(TRAIN_DIR, "data.jsonl"), 'a') as f:
-                f.write(json.dumps(training_example) + "\n")
-
-            collected[label] += 1
-            total_count += 1
-            print(f"Saved [{label}] {total_count}/{MAX_EXAMPLES}: {full_fname}")
-
+            return key, await ohlcv_store.afetch(fetcher, *key, limit=HISTORY_BARS)
         except Exception as e:
-            print(f"Error for {symbol} {timeframe}: {e}")
-            continue
+            return key, e
+
+    try:
+        await exchange.load_markets()
+        for done in asyncio.as_completed([fetch(key) for key in product(SYMBOLS, TIMEFRAMES)]):
+            (symbol, timeframe), df = await done
+            if isinstance(df, Exception):
+                print(f"Error for {symbol} {timeframe}: {df}")
+            else:
+                emit(((symbol, timeframe), df))
+    finally:
+        await exchange.close()
+
+
+def label_history(item, emit):
+    key, df = item
+    emit((key, df, window_labels(df, WINDOW)))
+
 
-print(f"Finished generating {total_count} examples.")
+def add_history(item, emit):
+    sampler.add(*item)
+
+
+def draw_windows(emit):
+    """Once every history is in: draw windows for each claimed shard until none are left."""
+    print(f"Windows by label: {sampler.available()}")
+    shard = first_shard
+    while shard is not None:
+        # (a resumed shard may already be full: its run died before committing it)
+        if shard.remaining <= 0:
+            shard = writer.claim()
+            continue
+        samples = sampler.take(shard.remaining, accept=lambda s: shard.reserve(s.label, s.fingerprint),
+                               seen=shard.seen)
+        if not samples:
+            print(f"Out of windows for shard {shard.index}'s remaining quotas "
+                  f"({dict(shard.collected)} of {shard.quota}); raise HISTORY_BARS or lower WINDOW_STRIDE")
+            break
+        for sample in samples:
+            emit((shard, sample))
+
+
+def render_window(item, emit):
+    shard, sample = item
+    emit((shard, sample, pool.submit(sample.df, sample.timeframe).result()))
+
+
+pipeline = (Pipeline(report_every=settings.pipeline_report)
+            .source("fetch", lambda emit: asyncio.run(fetch_histories(emit)))
+            .stage("label", label_history, workers=settings.label_workers)
+            .stage("sample", add_history, finish=draw_windows)
+            .stage("render", render_window, workers=settings.render_threads)
+            .stage("write", writer.write, batch=settings.write_batch, finish=writer.finish))
+# the render workers fork here, before the pipeline starts its threads
+with settings.render_pool() as pool:
+    try:
+        pipeline.run()
+    finally:
+        print(pipeline.summary())
+
+if near_duplicates is not None:
+    print(f"Skipped {sampler.near_duplicates} near-duplicate windows")
+print(f"Finished: {writer.status()}")
@@ -1,123 +1,132 @@
 # data_generator_fast.py
 
-import os
-import json
-import time
+import asyncio
 import random
-from itertools import product
-import hashlib
-
-import ccxt
-import pandas as pd
-
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'trading_assistant')))
-
-from main_plot import plot_main_chart
-from oscillator_plot import plot_oscillator
-from stock_rsi_plot import plot_stock_rsi
-from rule_engine import evaluate_chart_logic
-
-# Configuration
-BASE_DIR      = "data"
-FULL_DIR      = os.path.join(BASE_DIR, "full")
-TRAIN_DIR     = os.path.join(BASE_DIR, "training")
-IMAGE_DIRS    = {
-    "main": os.path.join(BASE_DIR, "panels/main"),
-    "ao":   os.path.join(BASE_DIR, "panels/ao"),
-    "rsi":  os.path.join(BASE_DIR, "panels/rsi"),
-}
-
-SYMBOLS = [
-    "BTC/USDT", "ETH/USDT", "XRP/USDT", "BNB/USDT", "SOL/USDT", "TRX/USDT",
-    "ADA/USDT", "SUI/USDT", "LINK/USDT", "HBAR/USDT", "AVAX/USDT", "LTC/USDT",
-    "DOT/USDT", "NEAR/USDT", "MINA/USDT", "ALGO/USDT", "POL/USDT", "ARB/USDT",
-    "SEI/USDT", "ATOM/USDT", "FIL/USDT", "FET/USDT", "OP/USDT", "TIA/USDT", "MANTA/USDT"
-]
+
+from chart_to_code.generation import SYMBOLS, DatasetWriter, GeneratorSettings
+from chart_to_code.rule_engine import evaluate_chart_logic
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.resample import base_bars, split_timeframes
+from chart_to_code.dedup import shape_vector
+from chart_to_code.pipeline import Pipeline
+from chart_to_code.window_sampler import window_fingerprint
+
+# Configuration: directories, image mode/format, shards, dedup, render pool,
+# pipeline and exchange settings come from the environment
+# (chart_to_code.generation)
+settings = GeneratorSettings("data")
+settings.make_dirs()
 
 TIMEFRAMES    = ["1h", "2h", "4h", "8h", "12h", "1d"]
 MAX_EXAMPLES  = 250
 
-# Ensure dirs exist
-os.makedirs(FULL_DIR, exist_ok=True)
-os.makedirs(TRAIN_DIR, exist_ok=True)
-for d in IMAGE_DIRS.values(): os.makedirs(d, exist_ok=True)
+near_duplicates = settings.near_duplicates()
+writer = DatasetWriter(settings, MAX_EXAMPLES, near_duplicates=near_duplicates)
+# the shard the select stage is filling (the writer commits it once full),
+# claimed before any fetching: with every shard finished or taken, stop here
+current_shard = writer.claim()
+if current_shard is None:
+    print(f"Nothing left to generate: {writer.status()}")
+    raise SystemExit
 
 # Init exchange
-exchange = ccxt.binance()
-exchange.load_markets()
+exchange, fetcher, ohlcv_store = settings.open_exchange()
+
+# One 1h history per symbol, resampled locally into every timeframe
+# (instead of one fetch_ohlcv call per symbol/timeframe pair)
+BASE_TIMEFRAME = "1h"
 
-# Precompute & shuffle combos
-combos = list(product(SYMBOLS, TIMEFRAMES))
-random.shuffle(combos)
 
-seen_fingerprints = set()
-total_count = 0
+async def fetch_symbol(symbol):
+    """{timeframe: DataFrame} for one symbol, from its synced base-timeframe history."""
+    bars = base_bars(TIMEFRAMES, 100, BASE_TIMEFRAME)
+    base = await ohlcv_store.afetch(fetcher, symbol, BASE_TIMEFRAME, limit=bars)
+    return split_timeframes(base, TIMEFRAMES, 100, BASE_TIMEFRAME)
 
-for symbol, timeframe in combos:
-    if total_count >= MAX_EXAMPLES:
-        break
+
+async def fetch_all(emit):
+    """Fetch every symbol concurrently, emitting (symbol, {timeframe: DataFrame}) as each arrives."""
+    async def fetch(symbol):
+        try:
+            return symbol, await fetch_symbol(symbol)
+        except Exception as e:
+            return symbol, e
 
     try:
-        # 1) Fetch candles
-        data = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=100)
-        df   = pd.DataFrame(data, columns=["ts","open","high","low","close","volume"])
-        df["ts"] = pd.to_datetime(df["ts"], unit="ms")
-        df.set_index("ts", inplace=True)
-
-        # 2) Dedupe
-        fp = hashlib.md5(df["close"].round(3).astype(str).to_json().encode()).hexdigest()
-        if fp in seen_fingerprints:
+        await exchange.load_markets()
+        for done in asyncio.as_completed([fetch(s) for s in SYMBOLS]):
+            symbol, frames = await done
+            if isinstance(frames, Exception):
+                print(f"Error on {symbol}: {frames}")
+            else:
+                emit((symbol, frames))
+    finally:
+        await exchange.close()
+
+
+def label_symbol(item, emit):
+    """1) Fingerprint and 2) label the latest window of each of a symbol's timeframes."""
+    symbol, frames = item
+    for timeframe in random.sample(TIMEFRAMES, len(TIMEFRAMES)):
+        try:
+            df = frames[timeframe]
+            fp = window_fingerprint(df)
+            label, reasoning, debug = evaluate_chart_logic(IndicatorFrame(df))
+        except Exception as e:
+            print(f"Error on {symbol} {timeframe}: {e}")
             continue
-        seen_fingerprints.add(fp)
-
-        # 3) Plot panels
-        main_img = plot_main_chart(df)
-        ao_img   = plot_oscillator(df)
-        rsi_img, k_last, d_last = plot_stock_rsi(df)
-
-        # 4) Label
-        label, reasoning, debug = evaluate_chart_logic(df)
-
-        # 5) Save files
-        idx_str = f"{total_count:04d}"
-        paths = {
-            "main": os.path.join(IMAGE_DIRS["main"], f"{idx_str}_main.png"),
-            "ao":   os.path.join(IMAGE_DIRS["ao"],   f"{idx_str}_ao.png"),
-            "rsi":  os.path.join(IMAGE_DIRS["rsi"],  f"{idx_str}_rsi.png"),
-        }
-        for img, p in zip((main_img, ao_img, rsi_img), paths.values()):
-            with open(p, "wb") as f: f.write(img)
-
-        # 6) Write JSON with debug
-        full = {
-            "symbol": symbol,
-            "timeframe": timeframe,
-            "label": label,
-            "reasoning": reasoning,
-            "debug": debug,
-            "images": {k: os.path.relpath(v, BASE_DIR) for k,v in paths.items()}
-        }
-        with open(os.path.join(FULL_DIR, f"{idx_str}_{symbol.replace('/','')}_{timeframe}.json"), "w") as f:
-            json.dump(full, f, indent=2)
-
-        # 7) Write JSONL for training
-        train_example = {
-            "images": list(os.path.relpath(v, BASE_DIR) for v in paths.values()),
-            "conversations": [
-                {"from":"human", "value":"<image>\n<image>\n<image>\nWhat is the signal based on these charts?"},
-                {"from":"gpt", "value": label + "\n- " + "\n- ".join(reasoning)}
-            ]
-        }
-        with open(os.path.join(TRAIN_DIR, "data.jsonl"), "a") as f:
-            f.write(json.dumps(train_example) + "\n")
-
-        total_count += 1
-        print(f"[{total_count}/{MAX_EXAMPLES}] {symbol} {timeframe} → {label}")
-
-    except Exception as e:
-        print(f"Error on {symbol} {timeframe}: {e}")
-        continue
-
-print(f"Done: generated {total_count} examples.")
+        emit((symbol, timeframe, df, label, reasoning, debug, fp))
+
+
+# windows the select stage skipped as near-duplicates
+skipped_near_duplicates = 0
+
+
+def select_window(candidate, emit):
+    """3) Skip windows already in the dataset (or near-duplicates) and reserve the rest in a shard."""
+    global current_shard, skipped_near_duplicates
+    if current_shard is not None and current_shard.remaining <= 0:
+        current_shard = None
+    if current_shard is None:
+        # claim shards until one has room (a resumed one may be full already)
+        while (current_shard := writer.claim()) is not None and current_shard.remaining <= 0:
+            pass
+        if current_shard is None:
+            return
+    fp = candidate[6]
+    if current_shard.seen(fp):
+        return
+    shape = None if near_duplicates is None else shape_vector(candidate[2], near_duplicates.segments)
+    if shape is not None and near_duplicates.find(shape) is not None:
+        skipped_near_duplicates += 1
+        return
+    if current_shard.reserve(candidate[3], fp):
+        if shape is not None:
+            near_duplicates.add(fp, shape, pending=True)
+        emit((current_shard, candidate))
+
+
+def render_window(item, emit):
+    shard, candidate = item
+    emit((shard, candidate, pool.submit(candidate[2], candidate[1]).result()))
+
+
+# fetch → label → select → render → write, each stage with its own workers and
+# a bounded input queue (chart_to_code.pipeline); throughput, busy share and
+# queue depth per stage are reported every PIPELINE_REPORT seconds
+pipeline = (Pipeline(report_every=settings.pipeline_report)
+            .source("fetch", lambda emit: asyncio.run(fetch_all(emit)))
+            .stage("label", label_symbol, workers=settings.label_workers)
+            .stage("select", select_window)
+            .stage("render", render_window, workers=settings.render_threads)
+            .stage("write", writer.write, batch=settings.write_batch, finish=writer.finish))
+# the render workers fork here, before the pipeline starts its threads
+with settings.render_pool() as pool:
+    try:
+        pipeline.run()
+    finally:
+        print(pipeline.summary())
+
+if near_duplicates is not None:
+    print(f"Skipped {skipped_near_duplicates} near-duplicate windows")
+print(f"Done: {writer.status()}")
@@ -1,20 +1,20 @@
 # train_kfold.py
 
 import os
-import json
 import pandas as pd
 import torch
 from torch.utils.data import DataLoader
 from transformers import AutoProcessor, AutoModelForVision2Seq, TrainingArguments, Trainer
 from peft import LoraConfig, get_peft_model
-from sklearn.model_selection import KFold
+from chart_to_code.dataset_index import DatasetIndex, update_index
 from custom_dataset import MultiImageJSONLDataset
 from evaluate_ import compute_metrics
 
 # Setup
 MODEL_NAME = "/workspace/PDF-AI/hf/hub/models--Qwen--Qwen2.5-VL-7B-Instruct/snapshots/cc594898137f460bfe9f0759e9844b3ce807cfb5"
 BASE_IMAGE_DIR = "./data/panels"
-JSONL_PATH = "./data/training/data.jsonl"
+DATASET_DIR = "./data"
+TRAIN_DIR = "./data/training"
 OUTPUT_DIR = "./results"
 SAVE_MODEL_DIR = "./ctc-crypto-analyst"  # Your final model name
 K_FOLDS = 5
@@ -40,27 +40,17 @@ peft_config = LoraConfig(
     task_type="CAUSAL_LM"
 )
 
-# Load full dataset
-full_dataset = MultiImageJSONLDataset(JSONL_PATH, processor, BASE_IMAGE_DIR, MAX_LENGTH)
-
-# K-Fold setup
-kf = KFold(n_splits=K_FOLDS, shuffle=True, random_state=42)
+# Dataset index (chart_to_code.dataset_index); folds are stratified by label
+update_index(TRAIN_DIR, DATASET_DIR)
+index = DatasetIndex(TRAIN_DIR)
 all_metrics = []
 
-for fold, (train_idx, val_idx) in enumerate(kf.split(full_dataset.data)):
+for fold, (train_index, val_index) in enumerate(index.folds(K_FOLDS, by="label", seed=42)):
     print(f"\n--- Fold {fold + 1} ---")
 
     # Save train/val split to JSONL
-    train_data = [full_dataset.data[i] for i in train_idx]
-    val_data = [full_dataset.data[i] for i in val_idx]
-
-    with open(f"./results/train_fold_{fold}.jsonl", "w") as f:
-        for item in train_data:
-            f.write(json.dumps(item) + "\n")
-
-    with open(f"./results/val_fold_{fold}.jsonl", "w") as f:
-        for item in val_data:
-            f.write(json.dumps(item) + "\n")
+    train_index.write_jsonl(f"./results/train_fold_{fold}.jsonl")
+    val_index.write_jsonl(f"./results/val_fold_{fold}.jsonl")
 
     # Load datasets
     train_dataset = MultiImageJSONLDataset(f"./results/train_fold_{fold}.jsonl", processor, BASE_IMAGE_DIR, MAX_LENGTH)
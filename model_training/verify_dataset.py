@@ -1,22 +1,42 @@
 # verify_dataset.py
 import streamlit as st
-import json
 import os
-from PIL import Image
+
+from chart_to_code.dataset_index import DatasetIndex, update_index
+from chart_to_code.image_format import load_image
+from chart_to_code.packed import PackReader
 
 # Configuration
-EXAMPLES_DIR = "data/examples"
-PANELS_DIR = "data/panels"
+BASE_DIR = "data"
+TRAIN_DIR = os.path.join(BASE_DIR, "training")
+PACK_DIR = os.path.join(BASE_DIR, "packs")
+CAPTIONS = {"main": "Main Chart", "ao": "Awesome Oscillator", "rsi": "Stochastic RSI",
+            "composite": "Composite Chart"}
 
 st.set_page_config(layout="wide")
 st.title("📊 Dataset Verifier for Chart Signals")
 
-# Sidebar
-json_files = sorted(f for f in os.listdir(EXAMPLES_DIR) if f.endswith(".json"))
-selected_file = st.sidebar.selectbox("Select a sample:", json_files)
+# Samples come from the dataset index (chart_to_code.dataset_index)
+update_index(TRAIN_DIR, BASE_DIR)
+index = DatasetIndex(TRAIN_DIR)
+
+# Sidebar: narrow the samples down by symbol, timeframe and label
+filters = {}
+for column in ("symbol", "timeframe", "label"):
+    values = sorted(v for v in index.counts(column) if v is not None)
+    chosen = st.sidebar.multiselect(column.capitalize(), values)
+    if chosen:
+        filters[column] = chosen
+selection = index.select(**filters)
+st.sidebar.caption(f"{len(selection)} of {len(index)} samples")
+if not len(selection):
+    st.stop()
 
-with open(os.path.join(EXAMPLES_DIR, selected_file)) as f:
-    example = json.load(f)
+columns = selection.table.select(["id", "symbol", "timeframe", "label"]).to_pydict()
+names = [f"{i:04d} {s} {tf} — {label}" for i, s, tf, label in
+         zip(columns["id"], columns["symbol"], columns["timeframe"], columns["label"])]
+selected = st.sidebar.selectbox("Select a sample:", range(len(names)), format_func=names.__getitem__)
+example = DatasetIndex(table=selection.table.slice(selected, 1)).records()[0]
 
 # Metadata
 st.subheader(f"{example['symbol']} — {example['timeframe']}")
@@ -24,20 +44,23 @@ st.markdown(f"**Label:** `{example['label']}`")
 
 # Reasoning
 with st.expander("Reasoning", expanded=True):
-    for reason in example["reasoning"]:
+    for reason in example["reasoning"] or []:
         st.markdown(f"- {reason}")
 
 # Debug (if available)
-debug = example.get("debug")
+debug = {k: v for k, v in example["debug"].items() if v is not None}
 if debug:
     with st.expander("Debug Values"):
         st.json(debug, expanded=False)
 
-# Charts
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.image(os.path.join(PANELS_DIR, "main", os.path.basename(example['images']['main'])), caption="Main Chart")
-with col2:
-    st.image(os.path.join(PANELS_DIR, "ao", os.path.basename(example['images']['ao'])), caption="Awesome Oscillator")
-with col3:
-    st.image(os.path.join(PANELS_DIR, "rsi", os.path.basename(example['images']['rsi'])), caption="Stochastic RSI")
+# Charts (three panels, or one composite), loose or from a pack
+if example["pack"] is not None:
+    pack = PackReader(os.path.join(PACK_DIR, example["pack"]))
+    entries = pack[example["pack_index"]]["images"]
+    images = [(entry["name"], pack.image(example["pack_index"], entry["name"])) for entry in entries]
+else:
+    images = [(os.path.basename(rel).rsplit(".", 1)[0].split("_", 1)[-1], load_image(os.path.join(BASE_DIR, rel)))
+              for rel in example["images"]]
+for col, (name, image) in zip(st.columns(len(images)), images):
+    with col:
+        st.image(image, caption=CAPTIONS.get(name, name))
@@ -0,0 +1,261 @@
+# async_fetch.py
+"""
+Concurrent OHLCV fetching on ccxt.async_support.
+
+Fetching candles is almost all network wait, so the dataset generators issue
+their requests concurrently instead of one after another:
+
+  - at most `concurrency` requests are in flight at once
+  - request starts are spaced by the exchange's rateLimit (milliseconds per
+    request); exchanges created with enableRateLimit=True throttle themselves
+    and are left to ccxt
+  - network errors (timeouts, 429 RateLimitExceeded, DDoSProtection, ...) are
+    retried with exponential backoff and jitter; anything else is raised
+
+    exchange = make_exchange("binance")
+    fetcher = OHLCVFetcher(exchange, concurrency=8)
+    frames = await fetcher.fetch_many([("BTC/USDT", "1h"), ("ETH/USDT", "4h")])
+    await exchange.close()
+
+StubExchange serves deterministic candles locally with optional latency and
+injected errors, so the fetch path (and the generators, EXCHANGE=stub) can be
+run offline; EXCHANGE=replay serves recorded candles instead (see replay).
+"""
+import asyncio
+import math
+import random
+import time
+import zlib
+
+import ccxt
+import ccxt.async_support as ccxt_async
+import numpy as np
+
+from chart_to_code.ohlcv_store import OHLCVStore
+from chart_to_code.replay import AsyncReplayExchange
+from chart_to_code.resample import base_bars, ohlcv_frame, split_timeframes, timeframe_seconds
+
+# ccxt's base class for transient failures: RequestTimeout, RateLimitExceeded,
+# DDoSProtection, ExchangeNotAvailable, ...
+RETRYABLE_ERRORS = (ccxt.NetworkError,)
+
+# make_exchange ids that never touch the network
+OFFLINE_EXCHANGES = ("stub", "replay")
+
+# periods (in bars) of the StubExchange price path's noise octaves
+STUB_OCTAVES = (4, 16, 64, 256, 1024)
+
+
+class RateLimiter:
+    """Spaces request starts at least `rate_limit_ms` apart, across all tasks."""
+
+    def __init__(self, rate_limit_ms: float):
+        self.interval = rate_limit_ms / 1000
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class OHLCVFetcher:
+    """
+    Bounded-concurrency, rate-limited, retrying fetch_ohlcv for one
+    ccxt.async_support exchange (or a StubExchange).
+
+    concurrency: most requests in flight at once.
+    retries: attempts after the first one for a retryable error.
+    backoff: first retry delay in seconds, doubled per attempt up to max_backoff.
+    """
+
+    def __init__(self, exchange, concurrency: int = 8, retries: int = 5,
+                 backoff: float = 0.5, max_backoff: float = 30.0):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.exchange = exchange
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retried = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiter = (None if getattr(exchange, "enableRateLimit", False)
+                         else RateLimiter(exchange.rateLimit))
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 100,
+                          since: int | None = None) -> list:
+        """Raw ccxt OHLCV rows, retried on network errors."""
+        for attempt in range(self.retries + 1):
+            async with self._semaphore:
+                if self._limiter is not None:
+                    await self._limiter.wait()
+                try:
+                    return await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe,
+                                                           since=since, limit=limit)
+                except RETRYABLE_ERRORS:
+                    if attempt == self.retries:
+                        raise
+            # back off outside the semaphore so other requests keep going
+            self.retried += 1
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            await asyncio.sleep(delay * (1 + random.random() / 4))
+
+    async def fetch_frame(self, symbol: str, timeframe: str, limit: int = 100):
+        """The newest `limit` candles as a DataFrame indexed by "ts"."""
+        return ohlcv_frame(await self.fetch_ohlcv(symbol, timeframe, limit=limit))
+
+    async def fetch_history(self, symbol: str, timeframe: str, bars: int,
+                            page_limit: int = 1000):
+        """
+        The newest `bars` candles of one timeframe; like
+        resample.fetch_history, but the `since` pages are fetched concurrently.
+        """
+        step_ms = timeframe_seconds(timeframe) * 1000
+        now_ms = self.exchange.milliseconds()
+        start = (now_ms // step_ms - bars + 1) * step_ms
+        pages = await asyncio.gather(*(
+            self.fetch_ohlcv(symbol, timeframe, limit=page_limit, since=start + i * page_limit * step_ms)
+            for i in range(math.ceil(bars / page_limit))
+        ))
+        rows = [row for page in pages for row in page]
+        return ohlcv_frame(rows).sort_index().iloc[-bars:]
+
+    async def fetch_timeframes(self, symbol: str, timeframes: list[str], limit: int = 100,
+                               base_timeframe: str = "1h") -> dict:
+        """Async resample.fetch_timeframes: one base history resampled into every timeframe."""
+        base = await self.fetch_history(symbol, base_timeframe,
+                                        base_bars(timeframes, limit, base_timeframe))
+        return split_timeframes(base, timeframes, limit, base_timeframe)
+
+    async def fetch_many(self, pairs, limit: int = 100) -> dict:
+        """
+        {(symbol, timeframe): DataFrame} for every pair, fetched concurrently.
+        A pair that still fails after the retries maps to its exception, so
+        one bad symbol does not sink the batch.
+        """
+        pairs = list(pairs)
+        frames = await asyncio.gather(*(self.fetch_frame(s, tf, limit) for s, tf in pairs),
+                                      return_exceptions=True)
+        return dict(zip(pairs, frames))
+
+    async def fetch_timeframes_many(self, symbols, timeframes: list[str], limit: int = 100,
+                                    base_timeframe: str = "1h") -> dict:
+        """{symbol: {timeframe: DataFrame}} (or the symbol's exception), fetched concurrently."""
+        symbols = list(symbols)
+        results = await asyncio.gather(*(
+            self.fetch_timeframes(s, timeframes, limit, base_timeframe) for s in symbols
+        ), return_exceptions=True)
+        return dict(zip(symbols, results))
+
+
+class StubExchange:
+    """
+    Offline stand-in for a ccxt.async_support exchange's fetch_ohlcv.
+
+    Candles are a deterministic function of (symbol, timeframe, timestamp),
+    so overlapping pages agree and reruns are reproducible. Every pair and
+    timeframe follows its own seeded path that does not repeat, so their
+    chart windows are as varied as real ones.
+    latency: seconds each request takes.
+    error_rate: fraction of requests that fail with ccxt.RequestTimeout.
+    rateLimit: requests closer together than this (ms) fail with
+        ccxt.RateLimitExceeded, like an exchange answering 429.
+    `calls` records (monotonic start time, symbol, timeframe) per request.
+    """
+
+    id = "stub"
+
+    def __init__(self, rate_limit: float = 50, latency: float = 0.05,
+                 error_rate: float = 0.0, seed: int = 0, now_ms: int | None = None):
+        self.rateLimit = rate_limit
+        self.enableRateLimit = False
+        self.markets = None
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = []
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._now_ms = now_ms
+        self._last_call = None
+
+    def milliseconds(self) -> int:
+        return self._now_ms if self._now_ms is not None else int(time.time() * 1000)
+
+    async def load_markets(self, reload=False, params=None) -> dict:
+        self.markets = {}
+        return self.markets
+
+    async def close(self) -> None:
+        pass
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        started = time.monotonic()
+        self.calls.append((started, symbol, timeframe))
+        # 10% tolerance for timer jitter
+        too_soon = (self._last_call is not None
+                    and started - self._last_call < self.rateLimit / 1000 * 0.9)
+        self._last_call = started
+        await asyncio.sleep(self.latency)
+        if too_soon:
+            raise ccxt.RateLimitExceeded(f"stub {symbol} {timeframe}: too many requests")
+        if self._rng.random() < self.error_rate:
+            raise ccxt.RequestTimeout(f"stub {symbol} {timeframe}: timed out")
+
+        step_ms = timeframe_seconds(timeframe) * 1000
+        limit = limit or 500
+        last = self.milliseconds() // step_ms
+        first = since // step_ms + (since % step_ms > 0) if since is not None else last - limit + 1
+        bars = np.arange(first, min(first + limit - 1, last) + 1)
+        return self._candles(symbol, timeframe, bars, step_ms)
+
+    def _path(self, symbol, timeframe, bars) -> np.ndarray:
+        """
+        Log-price path at `bars`: value noise over STUB_OCTAVES (seeded
+        random knots every `period` bars, cosine-interpolated), each octave
+        swinging with the square root of its period like a random walk.
+        """
+        key = zlib.crc32(f"{symbol} {timeframe}".encode())
+        path = np.zeros(len(bars))
+        for period in STUB_OCTAVES:
+            cell, offset = np.divmod(bars, period)
+            knots = np.arange(cell.min(), cell.max() + 2)
+            values = np.array([np.random.default_rng((self._seed, key, period, int(k))).standard_normal()
+                               for k in knots])
+            left = values[cell - knots[0]]
+            right = values[cell - knots[0] + 1]
+            t = (1 - np.cos(np.pi * offset / period)) / 2
+            path += 0.006 * math.sqrt(period) * (left + (right - left) * t)
+        return path
+
+    def _candles(self, symbol, timeframe, bars, step_ms) -> list:
+        if not len(bars):
+            return []
+        # seeded per bar, so a candle never depends on which page asked for it
+        base = 10 + zlib.crc32(symbol.encode()) % 1000
+        close = base * np.exp(self._path(symbol, timeframe, np.r_[bars[0] - 1, bars]))
+        noise = np.array([np.random.default_rng((self._seed, int(b))).random(3) for b in bars])
+        opens, closes = close[:-1], close[1:] * (1 + (noise[:, 0] - 0.5) * 0.01)
+        highs = np.maximum(opens, closes) * (1 + noise[:, 1] * 0.005)
+        lows = np.minimum(opens, closes) * (1 - noise[:, 2] * 0.005)
+        volume = 100 + noise[:, 0] * 1000
+        return [[int(b) * step_ms, o, h, l, c, v]
+                for b, o, h, l, c, v in zip(bars, opens, highs, lows, closes, volume)]
+
+
+def make_exchange(exchange_id: str = "binance", **config):
+    """
+    A ccxt.async_support exchange by id; "stub" gives a StubExchange and
+    "replay" an AsyncReplayExchange over the OHLCVStore at config["root"]
+    (the other config keys go to the replay exchange).
+    """
+    if exchange_id == "stub":
+        return StubExchange(**config)
+    if exchange_id == "replay":
+        return AsyncReplayExchange(OHLCVStore(config.pop("root", "data/replay")), **config)
+    if exchange_id not in ccxt_async.exchanges:
+        raise ValueError(f"Unknown exchange {exchange_id!r}")
+    return getattr(ccxt_async, exchange_id)(config)
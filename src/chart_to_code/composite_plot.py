@@ -0,0 +1,95 @@
+# composite_plot.py
+"""
+Price, Awesome Oscillator and Stochastic RSI stacked in one image.
+
+The three-panel layout sends three images per sample to the VLM (three
+vision-encoder passes and three image-token blocks). The composite draws the
+same indicators as mplfinance panels of one figure, so they share the x-axis
+and every bar lines up vertically, and the sample becomes a single image.
+"""
+from io import BytesIO
+
+import matplotlib.pyplot as plt
+import mplfinance as mpf
+import numpy as np
+
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.image_format import check_format, encode_rgb, figure_to_rgb
+from chart_to_code.raster import check_backend, raster_composite
+from chart_to_code.vision_budget import check_size, fit_axes_to_figure
+
+# the generators, datasets and the app switch layouts with these names
+IMAGE_MODES = ("panels", "composite")
+
+
+def check_image_mode(mode: str) -> None:
+    if mode not in IMAGE_MODES:
+        raise ValueError(f"Unknown image mode {mode!r}; expected one of {IMAGE_MODES}")
+
+
+def plot_composite(df, style='charles', figsize=(6, 7), dpi=100,
+                   panel_ratios=(3, 1.2, 1.2), ao_fast=5, ao_slow=34,
+                   timeperiod=14, fastk_period=14, fastd_period=3,
+                   backend='matplotlib', size=None, format='png'):
+    """
+    Plot candles with SMMA(14), EMA(13), EMA(21) above the AO histogram and
+    the Stoch RSI %K/%D lines, on one shared x-axis.
+    df: OHLC DataFrame or IndicatorFrame; it is not modified.
+    backend: 'matplotlib' (mplfinance) or 'numpy' (chart_to_code.raster).
+    size: exact (width, height) in pixels, multiples of 28 (see vision_budget);
+        overrides figsize.
+    format: 'png', 'rgb' (uint8 array), 'webp' or 'palette' (see image_format).
+    Returns raw PNG bytes (or the image in `format`).
+    """
+    check_backend(backend)
+    check_format(format)
+    ind = IndicatorFrame.wrap(df)
+    tight = size is None
+    if size is not None:
+        size = check_size(size)
+        figsize = (size[0] / dpi, size[1] / dpi)
+    if backend == 'numpy':
+        size = size or (int(figsize[0] * dpi), int(figsize[1] * dpi))
+        return encode_rgb(raster_composite(ind, size=size, panel_ratios=panel_ratios), format)
+
+    ao = ind.awesome_oscillator(ao_fast, ao_slow, min_periods=1)
+    ao_colors = list(np.where(ao.diff() > 0, '#27c6da', '#9498a1'))
+    fastk, fastd = ind.stoch_rsi(rsi_period=timeperiod, stoch_period=fastk_period,
+                                 smooth_k=fastd_period)
+
+    apds = [
+        mpf.make_addplot(ind.smma14, type="step", color="#00bcd4", width=0.5),
+        mpf.make_addplot(ind.ema13,  type="line", color="#673ab7", width=0.5),
+        mpf.make_addplot(ind.ema21,  type="line", color="#056656", width=0.5),
+        mpf.make_addplot(ao, type="bar", color=ao_colors, width=0.8, panel=1, ylabel="AO"),
+        mpf.make_addplot(fastk, color="C0", panel=2, ylabel="Stoch RSI"),
+        mpf.make_addplot(fastd, color="C1", panel=2),
+    ]
+    fig, axes = mpf.plot(
+        ind.df,
+        type='candle',
+        style=style,
+        addplot=apds,
+        returnfig=True,
+        figsize=figsize,
+        panel_ratios=panel_ratios,
+        volume=False,
+        tight_layout=True
+    )
+
+    # axes come in (primary, secondary) pairs per panel
+    stoch_ax = axes[4]
+    stoch_ax.axhline(80, linestyle='--', color='C0', linewidth=0.8)
+    stoch_ax.axhline(20, linestyle='--', color='C0', linewidth=0.8)
+    axes[2].axhline(0, color='#888eb0', linewidth=0.8, linestyle='--')
+
+    if not tight:
+        fit_axes_to_figure(fig)
+    if format == 'png':
+        buf = BytesIO()
+        fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight' if tight else None)
+        out = buf.getvalue()
+    else:
+        out = encode_rgb(figure_to_rgb(fig, dpi, tight), format)
+    plt.close(fig)
+    return out
@@ -0,0 +1,274 @@
+# dataset_index.py
+"""
+Columnar index of a generated dataset.
+
+Finding "all 4h Sell Signal samples of SOL/USDT" used to mean json.load-ing
+every per-sample file under full/ or parsing all of data.jsonl. The index
+keeps one row per sample in Parquet under <training dir>/index/, with
+
+  id, shard, symbol, timeframe, label, reasoning, the debug values (price,
+  trend, ao, %K, %D) as float columns, image_mode, images (paths relative to
+  the dataset directory) or pack/pack_index (see packed), full (the
+  per-sample JSON), fingerprint, and line (the sample's training JSONL line)
+
+It is built incrementally: a sharded dataset (see shards) gets one part per
+committed shard, written when the shard is first indexed and rewritten only if
+the shard file changes; a dataset without shards gets one part for its
+data.jsonl. update_index brings the parts up to date and is cheap to call
+after every commit. Queries and splits run on the columns:
+
+    update_index("data/training", "data")
+    index = DatasetIndex("data/training")
+    sol = index.select(symbol="SOL/USDT", timeframe="4h", label="Sell Signal")
+    hot = index.where(pc.field("%K") > 80)
+    for train, val in index.folds(5, by="label", seed=42):
+        train.write_jsonl("train.jsonl")
+
+    python -m chart_to_code.dataset_index data        # index an existing dataset
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from chart_to_code.packed import PackReader
+from chart_to_code.shards import SHARD_DIR
+
+INDEX_DIR = "index"
+DEBUG_COLUMNS = ("price", "trend", "ao", "%K", "%D")
+
+SCHEMA = pa.schema(
+    [("id", pa.int64()), ("shard", pa.int32()), ("symbol", pa.string()), ("timeframe", pa.string()),
+     ("label", pa.string()), ("reasoning", pa.list_(pa.string()))]
+    + [(name, pa.float64()) for name in DEBUG_COLUMNS]
+    + [("image_mode", pa.string()), ("images", pa.list_(pa.string())), ("pack", pa.string()),
+       ("pack_index", pa.int32()), ("full", pa.string()), ("fingerprint", pa.string()),
+       ("line", pa.string())]
+)
+
+
+def _full_names(base_dir: str) -> dict:
+    """Per-sample JSON paths (relative to base_dir) by the id prefix they share with their images."""
+    full_dir = os.path.join(base_dir, "full")
+    names = os.listdir(full_dir) if os.path.isdir(full_dir) else []
+    return {name.split("_", 1)[0]: os.path.join("full", name) for name in names if name.endswith(".json")}
+
+
+def index_table(lines, base_dir: str, shard: int | None = None, full_names: dict | None = None) -> pa.Table:
+    """
+    Index rows of training JSONL `lines` of the dataset in `base_dir`.
+    Symbol, timeframe, reasoning and debug come from each sample's pack
+    record or per-sample JSON in base_dir/full; lines without an "id" (from
+    before sharding) take it from their image names.
+    """
+    if full_names is None:
+        full_names = _full_names(base_dir)
+    packs = {}
+    columns = {name: [] for name in SCHEMA.names}
+    for line in lines:
+        images = line.get("images")
+        prefix = os.path.basename(images[0]).split("_", 1)[0] if images else None
+        full = None
+        if "pack" in line:
+            if line["pack"] not in packs:
+                packs[line["pack"]] = PackReader(os.path.join(base_dir, "packs", line["pack"]))
+            meta = packs[line["pack"]][line["pack_index"]]
+        else:
+            full = full_names.get(prefix)
+            meta = {}
+            if full is not None:
+                with open(os.path.join(base_dir, full)) as f:
+                    meta = json.load(f)
+        debug = meta.get("debug") or {}
+        row = {
+            "id": line["id"] if "id" in line else int(prefix) if prefix and prefix.isdigit() else None,
+            "shard": shard,
+            "symbol": meta.get("symbol"),
+            "timeframe": meta.get("timeframe"),
+            "label": line.get("label", meta.get("label")),
+            "reasoning": meta.get("reasoning"),
+            "image_mode": line.get("image_mode", meta.get("image_mode",
+                                   "composite" if images and len(images) == 1 else "panels")),
+            "images": images,
+            "pack": line.get("pack"),
+            "pack_index": line.get("pack_index"),
+            "full": full,
+            "fingerprint": line.get("fingerprint"),
+            "line": json.dumps(line),
+        }
+        row.update({name: debug.get(name) for name in DEBUG_COLUMNS})
+        for name, value in row.items():
+            columns[name].append(value)
+    for pack in packs.values():
+        pack.close()
+    return pa.table(columns, schema=SCHEMA)
+
+
+def _write_part(path: str, table: pa.Table) -> None:
+    # hidden temporary name, so a directory read never picks it up
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    os.close(fd)
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def _read_jsonl(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def update_index(root: str, base_dir: str) -> int:
+    """
+    Bring the index of the dataset whose training files are in `root` (with
+    images and full/ under `base_dir`) up to date: index new or changed
+    shards (or data.jsonl, for a dataset without shards) and drop parts whose
+    source is gone. Returns the number of parts written.
+    """
+    index_dir = os.path.join(root, INDEX_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    shard_dir = os.path.join(root, SHARD_DIR)
+    if os.path.isdir(shard_dir):
+        # only committed shards have their final name
+        sources = {name[:-len(".jsonl")] + ".parquet": os.path.join(shard_dir, name)
+                   for name in os.listdir(shard_dir)
+                   if name.startswith("shard-") and name.endswith(".jsonl")}
+    else:
+        jsonl = os.path.join(root, "data.jsonl")
+        sources = {"data.parquet": jsonl} if os.path.exists(jsonl) else {}
+
+    for name in os.listdir(index_dir):
+        if name.endswith(".parquet") and name not in sources:
+            os.remove(os.path.join(index_dir, name))
+    written = 0
+    full_names = None
+    for name, source in sorted(sources.items()):
+        part = os.path.join(index_dir, name)
+        if os.path.exists(part) and os.path.getmtime(part) >= os.path.getmtime(source):
+            continue
+        if full_names is None:
+            full_names = _full_names(base_dir)
+        shard = int(name[len("shard-"):-len(".parquet")]) if name.startswith("shard-") else None
+        _write_part(part, index_table(_read_jsonl(source), base_dir, shard, full_names))
+        written += 1
+    return written
+
+
+class DatasetIndex:
+    """
+    The indexed samples of a dataset (or a selection of them) as an Arrow
+    table. Built from the parts under root/index by default; selections and
+    splits return new DatasetIndex objects over the same rows.
+    """
+
+    def __init__(self, root: str | None = None, table: pa.Table | None = None):
+        if table is None:
+            if root is None:
+                raise ValueError("pass a dataset root or a table")
+            index_dir = os.path.join(root, INDEX_DIR)
+            parts = sorted(os.path.join(index_dir, name) for name in os.listdir(index_dir)
+                           if name.endswith(".parquet")) if os.path.isdir(index_dir) else []
+            table = pa.concat_tables([pq.read_table(p, schema=SCHEMA) for p in parts]) \
+                if parts else SCHEMA.empty_table()
+            table = table.sort_by("id")
+        self.table = table
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def select(self, **columns) -> "DatasetIndex":
+        """Rows whose columns equal the given values (or are in the given lists/tuples/sets)."""
+        mask = None
+        for name, value in columns.items():
+            if name not in SCHEMA.names:
+                raise ValueError(f"no index column {name!r}")
+            if isinstance(value, (list, tuple, set)):
+                cond = pc.is_in(self.table[name], value_set=pa.array(list(value), SCHEMA.field(name).type))
+            else:
+                cond = pc.equal(self.table[name], pa.scalar(value, SCHEMA.field(name).type))
+            mask = cond if mask is None else pc.and_(mask, cond)
+        return self if mask is None else DatasetIndex(table=self.table.filter(mask))
+
+    def where(self, expression: pc.Expression) -> "DatasetIndex":
+        """Rows matching a pyarrow.compute expression, e.g. pc.field("%K") > 80."""
+        return DatasetIndex(table=self.table.filter(expression))
+
+    def counts(self, by="label") -> dict:
+        """Row counts per value of a column (or per tuple of values of several columns)."""
+        by = [by] if isinstance(by, str) else list(by)
+        grouped = self.table.group_by(by).aggregate([([], "count_all")]).to_pydict()
+        keys = zip(*(grouped[name] for name in by))
+        return {key if len(by) > 1 else key[0]: n for key, n in zip(keys, grouped["count_all"])}
+
+    def _strata(self, by, seed) -> tuple:
+        """(rows shuffled within strata, each row's position in its stratum, its stratum's size)."""
+        by = [by] if isinstance(by, str) else list(by)
+        codes = np.zeros(len(self), dtype=np.int64)
+        for name in by:
+            encoded = pc.dictionary_encode(self.table[name]).combine_chunks()
+            values = encoded.indices.to_numpy(zero_copy_only=False)
+            # nulls form their own stratum
+            values = np.where(encoded.is_null().to_numpy(zero_copy_only=False), -1, values)
+            codes = codes * (len(encoded.dictionary) + 1) + values + 1
+        rows = np.random.default_rng(seed).permutation(len(self))
+        rows = rows[np.argsort(codes[rows], kind="stable")]
+        sorted_codes = codes[rows]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        sizes = np.diff(np.r_[starts, len(rows)])
+        group = np.repeat(np.arange(len(starts)), sizes)
+        return rows, np.arange(len(rows)) - starts[group], sizes[group]
+
+    def _take(self, rows) -> "DatasetIndex":
+        return DatasetIndex(table=self.table.take(pa.array(np.sort(rows))))
+
+    def split(self, test_size: float = 0.2, by="label", seed: int = 0) -> tuple:
+        """(train, test) with about test_size of every stratum (value of `by`) in test."""
+        if not 0 < test_size < 1:
+            raise ValueError("test_size must be in (0, 1)")
+        rows, position, size = self._strata(by, seed)
+        test = position < np.round(size * test_size)
+        return self._take(rows[~test]), self._take(rows[test])
+
+    def folds(self, k: int = 5, by="label", seed: int = 0) -> list:
+        """k (train, validation) pairs; every stratum is spread evenly over the k validation sets."""
+        if k < 2:
+            raise ValueError("k must be at least 2")
+        rows, _, _ = self._strata(by, seed)
+        # dealt out in stratum order, so each stratum's remainder continues
+        # where the previous one's stopped instead of all landing in fold 0
+        fold = np.arange(len(rows)) % k
+        return [(self._take(rows[fold != i]), self._take(rows[fold == i])) for i in range(k)]
+
+    def lines(self) -> list[dict]:
+        """The training JSONL lines of the rows."""
+        return [json.loads(line) for line in self.table["line"].to_pylist()]
+
+    def write_jsonl(self, path: str) -> None:
+        """Write the rows' training lines as a JSONL file (e.g. one fold's train set)."""
+        with open(path, "w") as f:
+            f.writelines(line + "\n" for line in self.table["line"].to_pylist())
+
+    def records(self) -> list[dict]:
+        """The rows as dicts, with the debug columns gathered back into "debug"."""
+        out = []
+        for row in self.table.drop_columns(["line"]).to_pylist():
+            row["debug"] = {name: row.pop(name) for name in DEBUG_COLUMNS}
+            out.append(row)
+        return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the columnar index of a generated dataset")
+    parser.add_argument("base_dir", help="dataset directory holding training/, full/ and panels/ or packs/")
+    args = parser.parse_args()
+
+    root = os.path.join(args.base_dir, "training")
+    written = update_index(root, args.base_dir)
+    index = DatasetIndex(root)
+    print(f"{written} parts written; {len(index)} samples")
+    for label, n in sorted(index.counts("label").items(), key=lambda kv: str(kv[0])):
+        print(f"  {label}: {n}")
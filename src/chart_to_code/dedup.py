@@ -0,0 +1,205 @@
+# dedup.py
+"""
+Near-duplicate detection for chart windows.
+
+An exact hash of the closes only catches identical windows. A window shifted
+by a few bars, or a correlated pair tracing the same shape at another price
+level, renders to a near-identical chart and adds little to training.
+NearDuplicateIndex compares windows by shape instead:
+
+  - shape_vector: high/low/close, shifted and scaled by the closes' mean and
+    standard deviation (so price level and scale drop out), averaged into
+    `segments` bins per series and L2-normalized; the similarity of two
+    windows is the dot product of their vectors
+  - each vector gets a 64-bit SimHash (signs of 64 seeded random
+    projections), split into `bands` bands; a window is only compared with
+    stored windows sharing at least one band value, which finds windows above
+    0.98 similarity with >99.9% probability while touching a small fraction
+    of the index
+  - candidates are confirmed with the exact dot product against `threshold`
+    (0.99 rejects the same window shifted by up to about four bars out of 100)
+
+    index = NearDuplicateIndex(threshold=0.99, path="data/training/dedup.npz")
+    vec = shape_vector(df)
+    if index.find(vec) is None:
+        index.add(key, vec, pending=True)   # reserved, not yet in the dataset
+    ...
+    index.confirm(committed_keys)
+    index.save()
+
+The index persists in an .npz file. Pending entries are matched like any
+other but only saved once confirmed, so a window that never makes it into a
+committed shard (the run dies first) does not block its look-alikes in the
+next run. save() merges what other processes saved in the meantime (under an
+flock), so generators sharing a dataset see each other's windows from their
+last save on. One index may be used from several threads.
+"""
+from contextlib import contextmanager
+import fcntl
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+_BITS = 64
+
+
+def shape_vector(df, segments: int = 32) -> np.ndarray:
+    """Unit-length float32 shape of a window's high/low/close (3 * `segments` values)."""
+    close = df["close"].to_numpy(dtype=np.float64)
+    n = len(close)
+    if n < segments:
+        raise ValueError(f"window of {n} bars is shorter than {segments} segments")
+    scale = close.std() or 1.0
+    starts = np.linspace(0, n, segments + 1).astype(np.int64)
+    widths = np.diff(starts)
+    parts = [np.add.reduceat((df[c].to_numpy(dtype=np.float64) - close.mean()) / scale,
+                             starts[:-1]) / widths
+             for c in ("high", "low", "close")]
+    vec = np.concatenate(parts)
+    norm = np.linalg.norm(vec)
+    return (vec / norm if norm else vec).astype(np.float32)
+
+
+class NearDuplicateIndex:
+    """
+    SimHash/LSH index of window shape vectors with exact confirmation.
+
+    threshold: similarity (dot product of shape vectors) at or above which a
+        window counts as a duplicate.
+    bands: SimHash bands (must divide 64); more bands find more candidates.
+    segments: bins per series in shape_vector.
+    path: .npz file to load from and save to; None keeps the index in memory.
+    The random projections come from `seed`; an index file records it and
+    its segments, and opening it with others raises ValueError.
+    """
+
+    def __init__(self, threshold: float = 0.99, bands: int = 8, segments: int = 32,
+                 seed: int = 0, path: str | None = None):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        if _BITS % bands:
+            raise ValueError(f"bands must divide {_BITS}")
+        self.threshold = threshold
+        self.bands = bands
+        self.segments = segments
+        self.seed = seed
+        self.path = path
+        self._planes = np.random.default_rng(seed).standard_normal((3 * segments, _BITS)).astype(np.float32)
+        self._band_shifts = np.arange(bands, dtype=np.uint64) * np.uint64(_BITS // bands)
+        self._band_mask = np.uint64((1 << (_BITS // bands)) - 1)
+        self.keys = []
+        self._key_set = set()
+        self._vectors = np.empty((0, 3 * segments), dtype=np.float32)
+        self._count = 0
+        self._tables = [{} for _ in range(bands)]
+        self._pending = set()
+        self._lock = threading.RLock()
+        if path is not None and os.path.exists(path):
+            with self._locked():
+                self._merge_file()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key) -> bool:
+        return key in self._key_set
+
+    def signature(self, vec: np.ndarray) -> int:
+        """64-bit SimHash of a shape vector."""
+        bits = (vec @ self._planes) > 0
+        return int(np.packbits(bits, bitorder="little").view(np.uint64)[0])
+
+    def _bands(self, signature: int) -> list:
+        return [int(b) for b in (np.uint64(signature) >> self._band_shifts) & self._band_mask]
+
+    def find(self, vec: np.ndarray):
+        """(key, similarity) of the most similar stored window at or above threshold, or None."""
+        bands = self._bands(self.signature(vec))
+        with self._lock:
+            candidates = set()
+            for table, band in zip(self._tables, bands):
+                candidates.update(table.get(band, ()))
+            if not candidates:
+                return None
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            sims = self._vectors[rows] @ vec
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            return self.keys[rows[best]], float(sims[best])
+
+    def add(self, key, vec: np.ndarray, pending: bool = False) -> None:
+        """
+        Store a window's shape vector under `key`. A pending entry is found
+        like the others but not saved until confirm()ed. Adding a stored key
+        again only confirms it (unless pending).
+        """
+        bands = self._bands(self.signature(vec))
+        with self._lock:
+            if key in self._key_set:
+                if not pending:
+                    self._pending.discard(key)
+                return
+            if pending:
+                self._pending.add(key)
+            self._append(key, vec, bands)
+
+    def confirm(self, keys) -> None:
+        """Make pending entries permanent (e.g. once their windows are committed); unknown keys are ignored."""
+        with self._lock:
+            self._pending.difference_update(keys)
+
+    def _append(self, key, vec, bands) -> None:
+        if self._count == len(self._vectors):
+            grown = np.empty((max(1024, 2 * self._count), self._vectors.shape[1]), dtype=np.float32)
+            grown[:self._count] = self._vectors[:self._count]
+            self._vectors = grown
+        row = self._count
+        self._vectors[row] = vec
+        self._count += 1
+        self.keys.append(key)
+        self._key_set.add(key)
+        for table, band in zip(self._tables, bands):
+            table.setdefault(band, []).append(row)
+
+    # persistence
+
+    @contextmanager
+    def _locked(self):
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _merge_file(self) -> None:
+        try:
+            data = np.load(self.path)
+        except FileNotFoundError:
+            return
+        if int(data["seed"]) != self.seed or int(data["segments"]) != self.segments:
+            raise ValueError(f"{self.path} was built with seed {int(data['seed'])} and "
+                             f"{int(data['segments'])} segments")
+        for key, vec in zip(data["keys"].tolist(), data["vectors"]):
+            self.add(key, vec)
+
+    def save(self, path: str | None = None) -> None:
+        """
+        Write the index's confirmed entries (merged with the file's current
+        contents) with write-then-rename.
+        """
+        self.path = path or self.path
+        if self.path is None:
+            raise ValueError("no path to save the index to")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, self._locked():
+            self._merge_file()
+            keep = np.array([key not in self._pending for key in self.keys], dtype=bool)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, keys=np.array(self.keys, dtype=str)[keep],
+                         vectors=self._vectors[:self._count][keep], seed=self.seed, segments=self.segments)
+            os.replace(tmp, self.path)
@@ -0,0 +1,294 @@
+# generation.py
+"""
+Plumbing shared by the dataset generators (model_training/data_generator.py
+and data_generator_fast.py).
+
+GeneratorSettings reads the environment variables both generators take
+(documented inline below) and opens the exchange, candle store, render pool
+and near-duplicate index they configure. DatasetWriter owns the output side:
+it claims shards, writes each example's images, per-sample JSON and training
+line, and commits (packs, indexes) every shard that fills. Its write and
+finish methods are the generators' pipeline write stage:
+
+    settings = GeneratorSettings()
+    exchange, fetcher, store = settings.open_exchange()
+    writer = DatasetWriter(settings, max_examples=250, quota=LABEL_QUOTA)
+    shard = writer.claim()
+    ...
+    pipeline.stage("write", writer.write, batch=settings.write_batch, finish=writer.finish)
+
+Examples reach write() as (shard, example, images) with example a
+(symbol, timeframe, df, label, reasoning, debug, fingerprint) tuple, e.g. a
+window_sampler.Sample.
+"""
+import glob
+import json
+import os
+
+from chart_to_code.async_fetch import OFFLINE_EXCHANGES, OHLCVFetcher, make_exchange
+from chart_to_code.composite_plot import check_image_mode
+from chart_to_code.dataset_index import update_index
+from chart_to_code.dedup import NearDuplicateIndex
+from chart_to_code.image_format import FILE_EXTENSIONS, check_format, save_image
+from chart_to_code.ohlcv_store import OHLCVStore
+from chart_to_code.packed import loose_files, pack_examples
+from chart_to_code.rate_limit import BULK, ScheduledExchange
+from chart_to_code.render_pool import PanelRenderPool
+from chart_to_code.shards import ShardedDataset
+from chart_to_code.vision_budget import PANEL_SIZES
+
+SYMBOLS = [
+    "BTC/USDT", "ETH/USDT", "XRP/USDT", "BNB/USDT", "SOL/USDT", "TRX/USDT",
+    "ADA/USDT", "SUI/USDT", "LINK/USDT", "HBAR/USDT", "AVAX/USDT", "LTC/USDT",
+    "DOT/USDT", "NEAR/USDT", "MINA/USDT", "ALGO/USDT", "POL/USDT", "ARB/USDT",
+    "SEI/USDT", "ATOM/USDT", "FIL/USDT", "FET/USDT", "OP/USDT", "TIA/USDT", "MANTA/USDT"
+]
+
+# image names per IMAGE_MODE
+IMAGE_NAMES = {"panels": ("main", "ao", "rsi"), "composite": ("composite",)}
+
+
+class GeneratorSettings:
+    """The generators' directories and environment settings, under base_dir."""
+
+    def __init__(self, base_dir: str = "data", env=os.environ):
+        self.base_dir = base_dir
+        self.full_dir = os.path.join(base_dir, "full")
+        self.train_dir = os.path.join(base_dir, "training")
+        self.image_dirs = {name: os.path.join(base_dir, "panels", name)
+                           for name in ("main", "ao", "rsi", "composite")}
+
+        # "panels": three images per sample; "composite": one stacked image
+        self.image_mode = env.get("IMAGE_MODE", "panels")
+        check_image_mode(self.image_mode)
+        # Image file format: png (default), webp (lossless), palette (8-bit PNG) or
+        # rgb (raw .npy arrays, no decode when training); see image_format
+        self.image_format = env.get("IMAGE_FORMAT", "png")
+        check_format(self.image_format)
+        # PIXEL_BUDGET=1 renders every image at its vision_budget.PANEL_SIZES size
+        # (multiples of the model's 28px patch grid, far fewer vision tokens)
+        self.panel_sizes = PANEL_SIZES if env.get("PIXEL_BUDGET") == "1" else None
+
+        # Examples per shard; each shard gets its share of every label quota,
+        # and a rerun resumes the dataset and skips every window already in it
+        self.shard_size = int(env.get("SHARD_SIZE", 50))
+        # PACK=1 moves each finished shard's images and per-sample JSON into one
+        # data/packs/shard-NNNNN.pack (see packed) instead of loose files
+        self.pack = env.get("PACK") == "1"
+        self.pack_dir = os.path.join(base_dir, "packs")
+        # Windows whose shape is at least this similar to one already in the
+        # dataset (same chart shifted a few bars, or another pair at another
+        # price) are skipped; the index persists in data/training/dedup.npz
+        # (see dedup). 0 turns this off
+        self.dedup_similarity = float(env.get("DEDUP_SIMILARITY", 0.99))
+
+        # Worker processes for panel rendering (matplotlib is not thread-safe)
+        self.render_workers = int(env.get("RENDER_WORKERS", os.cpu_count() or 1))
+        # Pipeline stage concurrency: threads labeling histories, threads feeding
+        # the render pool (a few more than its processes keep it busy), and
+        # examples written per dataset lock and fsync; progress report interval
+        # in seconds
+        self.label_workers = int(env.get("LABEL_WORKERS", 2))
+        self.render_threads = int(env.get("RENDER_THREADS", 2 * self.render_workers))
+        self.write_batch = int(env.get("WRITE_BATCH", 16))
+        self.pipeline_report = float(env.get("PIPELINE_REPORT", 10))
+        # Set RENDER_CACHE_DIR to cache rendered images on disk by window content,
+        # so re-running the generator over windows it has seen before skips
+        # drawing them again; the cache is kept under RENDER_CACHE_MB
+        self.render_cache_dir = env.get("RENDER_CACHE_DIR") or None
+        self.render_cache_mb = int(env.get("RENDER_CACHE_MB", 1024))
+
+        # Concurrent async fetching: at most FETCH_CONCURRENCY requests in flight,
+        # paced by the exchange's rate limit. EXCHANGE=stub serves synthetic
+        # candles for offline runs
+        self.exchange = env.get("EXCHANGE", "binance")
+        # EXCHANGE=replay serves the candles recorded in REPLAY_DIR on a clock
+        # running REPLAY_SPEED times real time, with injected latency/errors
+        # (see replay)
+        self.exchange_config = {
+            "root": env.get("REPLAY_DIR", os.path.join(base_dir, "replay")),
+            "speed": float(env.get("REPLAY_SPEED", 1)),
+            "latency": float(env.get("REPLAY_LATENCY", 0)),
+            "error_rate": float(env.get("REPLAY_ERROR_RATE", 0)),
+        } if self.exchange == "replay" else {}
+        self.fetch_concurrency = int(env.get("FETCH_CONCURRENCY", 8))
+        # Local candle store shared with the app and bots, one directory per
+        # exchange under it (see OHLCVStore.for_exchange); each pass only
+        # downloads the candles newer than the stored ones
+        self.ohlcv_store_dir = env.get("OHLCV_STORE_DIR", os.path.join(base_dir, "ohlcv"))
+
+    @property
+    def image_names(self) -> tuple:
+        return IMAGE_NAMES[self.image_mode]
+
+    def make_dirs(self) -> None:
+        for path in (self.full_dir, self.train_dir, *self.image_dirs.values()):
+            os.makedirs(path, exist_ok=True)
+
+    def open_exchange(self) -> tuple:
+        """(async exchange, OHLCVFetcher over it, OHLCVStore) as configured."""
+        exchange = make_exchange(self.exchange, **self.exchange_config)
+        if self.exchange not in OFFLINE_EXCHANGES:
+            # share the machine-wide Binance weight budget, behind the app and bots
+            exchange = ScheduledExchange(exchange, priority=BULK)
+        fetcher = OHLCVFetcher(exchange, concurrency=self.fetch_concurrency)
+        return exchange, fetcher, OHLCVStore.for_exchange(exchange, self.ohlcv_store_dir)
+
+    def near_duplicates(self) -> NearDuplicateIndex | None:
+        """The dataset's persistent near-duplicate index, or None with DEDUP_SIMILARITY=0."""
+        if not self.dedup_similarity:
+            return None
+        return NearDuplicateIndex(self.dedup_similarity, path=os.path.join(self.train_dir, "dedup.npz"))
+
+    def render_pool(self) -> PanelRenderPool:
+        """The render pool; its workers start here, so open it before any pipeline threads."""
+        return PanelRenderPool(workers=self.render_workers, mode=self.image_mode,
+                               cache_dir=self.render_cache_dir, cache_bytes=self.render_cache_mb * 2**20,
+                               sizes=self.panel_sizes, format=self.image_format)
+
+
+class DatasetWriter:
+    """
+    Writes examples into the sharded dataset of `settings` (see shards):
+    max_examples in shards of settings.shard_size, with optional per-label
+    quota. Tracks the shards it claimed until they are committed or closed.
+    near_duplicates: the NearDuplicateIndex the windows are drawn against;
+    the windows of each committed shard are confirmed in it and saved
+    (examples a crashed run left in a shard are not in it, only in the
+    shard's exact fingerprints).
+    """
+
+    def __init__(self, settings: GeneratorSettings, max_examples: int, quota: dict | None = None,
+                 near_duplicates: NearDuplicateIndex | None = None):
+        self.settings = settings
+        self.near_duplicates = near_duplicates
+        # progress (example counts, quotas, fingerprints) lives in the shards
+        self.dataset = ShardedDataset(settings.train_dir, max_examples, settings.shard_size, quota)
+        self.claimed = []
+
+    def claim(self):
+        """The next shard to fill (see ShardedDataset.claim), or None once all are done or taken."""
+        shard = self.dataset.claim()
+        if shard is not None:
+            self._discard_uncommitted(shard)
+            self.claimed.append(shard)
+        return shard
+
+    def _discard_uncommitted(self, shard) -> None:
+        """Remove per-sample JSON left by a crash after the shard's last committed example."""
+        for example_id in range(shard.next_id(), shard.start_id + self.settings.shard_size):
+            for path in glob.glob(os.path.join(self.settings.full_dir, f"{example_id:04d}_*.json")):
+                os.remove(path)
+
+    def save(self, shard, symbol, timeframe, label, reasoning, debug, images, fingerprint) -> str | None:
+        """
+        Write the image(s), the per-sample JSON and the shard's training line;
+        returns the per-sample JSON name, or None if another run kept the window first.
+        """
+        s = self.settings
+        # Save image files (main/ao/rsi panels, or the single composite)
+        id_str = f"{shard.next_id():04d}"
+        paths = {
+            name: os.path.join(s.image_dirs[name], f"{id_str}_{name}{FILE_EXTENSIONS[s.image_format]}")
+            for name in s.image_names
+        }
+        for img, path in zip(images, paths.values()):
+            save_image(img, path)
+
+        # Save full JSON with debug info
+        full_example = {
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "label": label,
+            "reasoning": reasoning,
+            "debug": debug,
+            "images": {name: os.path.relpath(path, s.base_dir) for name, path in paths.items()}
+        }
+        full_fname = f"{id_str}_{symbol.replace('/', '')}_{timeframe}.json"
+        full_path = os.path.join(s.full_dir, full_fname)
+        with open(full_path, 'w') as f:
+            json.dump(full_example, f, indent=2)
+
+        # Save training-ready JSONL (one <image> tag per image)
+        training_example = {
+            "image_mode": s.image_mode,
+            "images": [os.path.relpath(path, s.base_dir) for path in paths.values()],
+            "conversations": [
+                {
+                    "from": "human",
+                    "value": "<image>\n" * len(paths) + "What is the signal based on these charts?"
+                },
+                {
+                    "from": "gpt",
+                    "value": label + "\n- " + "\n- ".join(reasoning)
+                }
+            ]
+        }
+        if not shard.add(training_example, label, fingerprint):
+            os.remove(full_path)  # the images are overwritten by the next example
+            return None
+        return full_fname
+
+    def commit(self, shard) -> None:
+        """
+        Commit a full shard and add it to the dataset index; with PACK=1 its
+        loose files are packed first and then removed.
+        """
+        s = self.settings
+        if not s.pack:
+            shard.commit()
+        else:
+            loose = []
+
+            def pack(lines):
+                if all("pack" in line for line in lines):
+                    return lines  # packed before a crash
+                loose.extend(loose_files(lines, s.base_dir))
+                return pack_examples(lines, s.base_dir, os.path.join(s.pack_dir, f"shard-{shard.index:05d}.pack"))
+
+            shard.commit(transform=pack)
+            for path in loose:
+                os.remove(path)
+        update_index(s.train_dir, s.base_dir)
+        if self.near_duplicates is not None:
+            self.near_duplicates.confirm(shard.fingerprints)
+            self.near_duplicates.save()
+        print(f"Committed shard {shard.index}")
+
+    def write(self, items, emit) -> None:
+        """
+        Pipeline stage: save a batch of (shard, example, images), one dataset
+        lock and fsync per shard, emitting each saved per-sample JSON name;
+        shards that fill are committed.
+        """
+        by_shard = {}
+        for shard, example, images in items:
+            by_shard.setdefault(shard, []).append((example, images))
+        for shard, examples in by_shard.items():
+            with shard.batch():
+                for (symbol, timeframe, df, label, reasoning, debug, fingerprint), images in examples:
+                    full_fname = self.save(shard, symbol, timeframe, label, reasoning, debug, images,
+                                           fingerprint)
+                    if full_fname is None:
+                        print(f"Skipped {symbol} {timeframe}: kept by another run")
+                        continue
+                    print(f"Saved [{label}] shard {shard.index} {shard.count}/{shard.target}: {full_fname}")
+                    emit(full_fname)
+            if shard.full:
+                self.commit(shard)
+                self.claimed.remove(shard)
+
+    def finish(self, emit) -> None:
+        """Pipeline finish: commit the claimed shards that are full and leave the rest for the next run."""
+        for shard in list(self.claimed):
+            if shard.full:
+                self.commit(shard)
+            else:
+                shard.close()
+            self.claimed.remove(shard)
+
+    def status(self) -> str:
+        """One line of finished and unfinished shard counts."""
+        status = self.dataset.status()
+        return (f"{status['examples']} examples in {status['done']} shards"
+                + (f"; {status['claimed']} shards claimed but unfinished" if status["claimed"] else ""))
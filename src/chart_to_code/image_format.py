@@ -0,0 +1,84 @@
+# image_format.py
+"""
+Output formats for the chart images.
+
+The plot functions return PNG bytes by default. The other formats avoid work
+further down the line:
+
+  - "rgb":     uint8 NumPy array (height, width, 3), straight from the Agg
+               buffer; no encode here and no decode in the training loader
+  - "webp":    lossless WebP bytes, smaller than PNG for flat chart graphics
+  - "palette": 8-bit palette PNG; the charts use few colours, so this is a
+               fraction of the RGBA PNG size (anti-aliased edges are quantized)
+
+FILE_EXTENSIONS and MIME_TYPES give the matching file suffix and data-URL
+type for each format.
+"""
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+FORMATS = ("png", "rgb", "webp", "palette")
+FILE_EXTENSIONS = {"png": ".png", "rgb": ".npy", "webp": ".webp", "palette": ".png"}
+MIME_TYPES = {"png": "image/png", "webp": "image/webp", "palette": "image/png"}
+
+
+def check_format(format: str) -> None:
+    if format not in FORMATS:
+        raise ValueError(f"Unknown image format {format!r}; expected one of {FORMATS}")
+
+
+def figure_to_rgb(fig, dpi, tight: bool = False) -> np.ndarray:
+    """
+    Render a matplotlib figure to an RGB array with the same pixels savefig
+    would write to a PNG (bbox_inches='tight' when tight), skipping the encode.
+    """
+    buf = BytesIO()
+    fig.savefig(buf, format='rgba', dpi=dpi, bbox_inches='tight' if tight else None)
+    # savefig leaves the Agg renderer it drew with on the canvas; its size is
+    # the (possibly tight-cropped) output size
+    renderer = fig.canvas.renderer
+    height, width = int(renderer.height), int(renderer.width)
+    rgba = np.frombuffer(buf.getvalue(), dtype=np.uint8).reshape(height, width, 4)
+    return np.ascontiguousarray(rgba[..., :3])
+
+
+def encode_rgb(img: np.ndarray, format: str):
+    """Encode an RGB array as `format`; "rgb" returns the array itself."""
+    check_format(format)
+    if format == "rgb":
+        return img
+    buf = BytesIO()
+    pil = Image.fromarray(img)
+    if format == "webp":
+        pil.save(buf, format="WEBP", lossless=True, method=0)
+    elif format == "palette":
+        pil.quantize(colors=256, method=Image.Quantize.FASTOCTREE,
+                     dither=Image.Dither.NONE).save(buf, format="PNG", compress_level=6)
+    else:
+        pil.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def to_rgb_array(img) -> np.ndarray:
+    """RGB array from any of the formats (array, or PNG/WebP bytes)."""
+    if isinstance(img, np.ndarray):
+        return img
+    return np.asarray(Image.open(BytesIO(img)).convert("RGB"))
+
+
+def save_image(img, path: str) -> None:
+    """Write one image: arrays as .npy, encoded bytes as-is."""
+    if isinstance(img, np.ndarray):
+        np.save(path, img)
+    else:
+        with open(path, "wb") as f:
+            f.write(img)
+
+
+def load_image(path: str) -> Image.Image:
+    """Open a saved image (any format) as an RGB PIL image."""
+    if path.endswith(".npy"):
+        return Image.fromarray(np.load(path))
+    return Image.open(path).convert("RGB")
@@ -0,0 +1,257 @@
+# indicators.py
+"""
+Indicator containers shared by the plotting functions and the rule engine.
+
+IndicatorFrame wraps one OHLC DataFrame and computes each indicator series
+lazily, at most once, so the three chart panels and evaluate_chart_logic can
+share the work of a single analysis pass.
+
+IndicatorState is for long-running processes: it is seeded once from history and then fed one candle at a time.
+Updating with the timestamp of the last candle revises that (still-forming)
+candle in place; a newer timestamp closes it and appends a new one. Every
+update does a fixed amount of work, independent of how much history was seen.
+
+Outputs follow the batch pandas definitions used by the rule engine:
+EMA13/EMA21/SMMA14 via ewm(adjust=False), AO as SMA5 - SMA34 of the median
+price (NaN until 34 bars), and Stoch RSI %K/%D as in compute_stoch_rsi.
+"""
+from collections import deque
+import math
+
+import pandas as pd
+
+
+def _ewm_step(prev: float, cur: float, alpha: float) -> float:
+    """One step of Series.ewm(alpha=alpha, adjust=False).mean()."""
+    if prev is None:
+        return cur
+    if prev == cur:
+        return prev
+    old_wt = 1.0 - alpha
+    return (old_wt * prev + alpha * cur) / (old_wt + alpha)
+
+
+def _nanmin(values) -> float:
+    vals = [v for v in values if not math.isnan(v)]
+    return min(vals) if vals else math.nan
+
+
+def _nanmax(values) -> float:
+    vals = [v for v in values if not math.isnan(v)]
+    return max(vals) if vals else math.nan
+
+
+def _nanmean(values) -> float:
+    vals = [v for v in values if not math.isnan(v)]
+    return sum(vals) / len(vals) if vals else math.nan
+
+
+class IndicatorFrame:
+    """
+    Lazily computed, memoized indicator series over one OHLC DataFrame.
+    The wrapped DataFrame is never modified.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._cache = {}
+
+    @classmethod
+    def wrap(cls, df) -> "IndicatorFrame":
+        """Return df unchanged if it already is an IndicatorFrame, else wrap it."""
+        return df if isinstance(df, cls) else cls(df)
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def index(self) -> pd.Index:
+        return self.df.index
+
+    @property
+    def close(self) -> pd.Series:
+        return self.df['close']
+
+    def ema(self, span: int) -> pd.Series:
+        return self._memo(('ema', span),
+                          lambda: self.close.ewm(span=span, adjust=False).mean())
+
+    def smma(self, period: int) -> pd.Series:
+        return self._memo(('smma', period),
+                          lambda: self.close.ewm(alpha=1/period, adjust=False).mean())
+
+    @property
+    def ema13(self) -> pd.Series:
+        return self.ema(13)
+
+    @property
+    def ema21(self) -> pd.Series:
+        return self.ema(21)
+
+    @property
+    def smma14(self) -> pd.Series:
+        return self.smma(14)
+
+    @property
+    def median_price(self) -> pd.Series:
+        return self._memo('median_price', lambda: (self.df['high'] + self.df['low']) / 2)
+
+    def sma_median(self, window: int, min_periods: int | None = None) -> pd.Series:
+        return self._memo(
+            ('sma_median', window, min_periods),
+            lambda: self.median_price.rolling(window=window, min_periods=min_periods).mean(),
+        )
+
+    def awesome_oscillator(self, fast: int = 5, slow: int = 34,
+                           min_periods: int | None = None) -> pd.Series:
+        """
+        SMA(fast) - SMA(slow) of the median price. The rule engine uses the
+        default min_periods (NaN until `slow` bars); the AO panel uses 1.
+        """
+        return self._memo(
+            ('ao', fast, slow, min_periods),
+            lambda: self.sma_median(fast, min_periods) - self.sma_median(slow, min_periods),
+        )
+
+    def stoch_rsi(self, rsi_period: int = 14, stoch_period: int = 14,
+                  smooth_k: int = 3) -> tuple[pd.Series, pd.Series]:
+        """(%K, %D) as returned by rule_engine.compute_stoch_rsi."""
+        # imported here because rule_engine itself builds on IndicatorFrame
+        from chart_to_code.rule_engine import compute_stoch_rsi
+        return self._memo(
+            ('stoch_rsi', rsi_period, stoch_period, smooth_k),
+            lambda: compute_stoch_rsi(self.close, rsi_period=rsi_period,
+                                      stoch_period=stoch_period, smooth_k=smooth_k),
+        )
+
+
+class IndicatorState:
+    """Constant-work-per-tick EMA13/EMA21/SMMA14, AO and Stoch RSI."""
+
+    def __init__(
+        self,
+        ao_fast: int = 5,
+        ao_slow: int = 34,
+        rsi_period: int = 14,
+        stoch_period: int = 14,
+        smooth_k: int = 3,
+    ):
+        self.ao_fast = ao_fast
+        self.ao_slow = ao_slow
+        self.rsi_period = rsi_period
+        self.stoch_period = stoch_period
+        self.smooth_k = smooth_k
+
+        # committed state: everything up to, but excluding, the last candle
+        self._ema13 = None
+        self._ema21 = None
+        self._smma14 = None
+        self._prev_close = None
+        self._medians = deque(maxlen=ao_slow - 1)
+        self._gains = deque(maxlen=rsi_period - 1)
+        self._losses = deque(maxlen=rsi_period - 1)
+        self._rsis = deque(maxlen=stoch_period - 1)
+        self._ks = deque(maxlen=smooth_k - 1)
+
+        # the last (possibly still-forming) candle and its outputs
+        self.last_ts = None
+        self._last = None
+        # number of distinct candles seen
+        self.count = 0
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> "IndicatorState":
+        """Seed from an OHLC DataFrame with a datetime index (oldest first)."""
+        state = cls(**kwargs)
+        for ts, high, low, close in zip(df.index, df['high'], df['low'], df['close']):
+            state.update(ts, high, low, close)
+        return state
+
+    def update(self, ts, high: float, low: float, close: float) -> dict:
+        """
+        Feed one candle. A timestamp equal to the last one revises that
+        candle in place; a newer one closes it and starts the next.
+        Returns the indicator values for the candle just fed.
+        """
+        if self.last_ts is not None and ts < self.last_ts:
+            raise ValueError(f"Candle at {ts} is older than the last candle at {self.last_ts}")
+        if ts != self.last_ts:
+            if self._last is not None:
+                self._commit()
+            self.count += 1
+            self.last_ts = ts
+        self._last = self._compute(float(high), float(low), float(close))
+        return self.values()
+
+    def values(self) -> dict:
+        """Indicator values for the last candle fed."""
+        if self._last is None:
+            raise ValueError("IndicatorState has not been seeded")
+        return {k: v for k, v in self._last.items() if not k.startswith('_')}
+
+    def _compute(self, high: float, low: float, close: float) -> dict:
+        """Outputs for a candle on top of the committed state, without mutating it."""
+        ema13 = _ewm_step(self._ema13, close, 2 / 14)
+        ema21 = _ewm_step(self._ema21, close, 2 / 22)
+        smma14 = _ewm_step(self._smma14, close, 1 / 14)
+
+        median = (high + low) / 2
+        medians = list(self._medians) + [median]
+        if len(medians) >= self.ao_slow:
+            ao = (sum(medians[-self.ao_fast:]) / self.ao_fast
+                  - sum(medians[-self.ao_slow:]) / self.ao_slow)
+        else:
+            ao = math.nan
+
+        # pandas turns the NaN first delta into a 0.0 gain/loss, so do the same
+        delta = math.nan if self._prev_close is None else close - self._prev_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        gains = list(self._gains) + [gain]
+        losses = list(self._losses) + [loss]
+        rsi = math.nan
+        if len(gains) >= self.rsi_period:
+            avg_gain = sum(gains) / self.rsi_period
+            avg_loss = sum(losses) / self.rsi_period
+            if avg_loss:
+                rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+            elif avg_gain:
+                rsi = 100.0
+
+        rsis = list(self._rsis) + [rsi]
+        rsi_min = _nanmin(rsis)
+        rsi_max = _nanmax(rsis)
+        k = math.nan
+        if not math.isnan(rsi) and rsi_max != rsi_min:
+            k = (rsi - rsi_min) / (rsi_max - rsi_min) * 100
+        d = _nanmean(list(self._ks) + [k])
+
+        return {
+            'close': close,
+            'EMA13': ema13,
+            'EMA21': ema21,
+            'SMMA14': smma14,
+            'trend': (ema13 + ema21 + smma14) / 3,
+            'ao': ao,
+            'rsi': rsi,
+            '%K': k,
+            '%D': d,
+            '_median': median,
+            '_gain': gain,
+            '_loss': loss,
+        }
+
+    def _commit(self) -> None:
+        """Fold the last candle into the committed state."""
+        last = self._last
+        self._ema13 = last['EMA13']
+        self._ema21 = last['EMA21']
+        self._smma14 = last['SMMA14']
+        self._prev_close = last['close']
+        self._medians.append(last['_median'])
+        self._gains.append(last['_gain'])
+        self._losses.append(last['_loss'])
+        self._rsis.append(last['rsi'])
+        self._ks.append(last['%K'])
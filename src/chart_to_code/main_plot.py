@@ -1,22 +1,51 @@
 import mplfinance as mpf
 from io import BytesIO
-import matplotlib.dates as mdates  
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
+import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.ticker import FuncFormatter
 
-def plot_main_chart(df, style='charles', figsize=(6, 4), dpi=100) -> bytes:
-    """
-    Plot main candlestick chart with SMMA(14), EMA(13), EMA(21).
-    Returns raw PNG bytes.
-    """
-    # Calculate moving averages
-    df["SMMA14"] = df["close"].ewm(alpha=1/14, adjust=False).mean()
-    df["EMA13"]  = df["close"].ewm(span=13, adjust=False).mean()
-    df["EMA21"]  = df["close"].ewm(span=21, adjust=False).mean()
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.image_format import check_format, encode_rgb, figure_to_rgb
+from chart_to_code.raster import check_backend, raster_main
+from chart_to_code.vision_budget import check_size, fit_axes_to_figure
+
+def _date_format(dates) -> str:
+    """The tick date format mplfinance picks for these dates (matplotlib date numbers)."""
+    first, last = mdates.num2date(dates[0]).date(), mdates.num2date(dates[-1]).date()
+    if (dates[-1] - dates[0]) / len(dates) < 0.33:  # intraday
+        return '%b %d, %H:%M' if first != last else '%H:%M'
+    return '%Y-%b-%d' if first.year != last.year else '%b %d'
+
+
+def _date_formatter(dates) -> FuncFormatter:
+    """Tick labels for mplfinance's bar-number x axis: the date of the nearest bar."""
+    fmt = _date_format(dates)
+
+    def label(x, pos=None):
+        i = int(np.round(x))
+        return mdates.num2date(dates[i]).strftime(fmt) if 0 <= i < len(dates) else ''
+    return FuncFormatter(label)
+
+
+def _rgba(color, alpha):
+    """matplotlib RGBA of an mplfinance colour, which may be a 0-255 RGB(A) tuple."""
+    if isinstance(color, tuple) and any(c > 1 for c in color[:3]):
+        color = tuple(c / 255 for c in color[:3]) + tuple(color[3:])
+    return mcolors.to_rgba(color, alpha)
+
+
+def _build_main_figure(ind, style, figsize):
+    """Candlestick figure with SMMA(14), EMA(13), EMA(21) overlays."""
+    df = ind.df
 
     # Build addplot objects
     apds = [
-        mpf.make_addplot(df["SMMA14"], type="step",  color="#00bcd4", width=0.5),
-        mpf.make_addplot(df["EMA13"],  type="line",  color="#673ab7", width=0.5),
-        mpf.make_addplot(df["EMA21"],  type="line",  color="#056656", width=0.5),
+        mpf.make_addplot(ind.smma14, type="step",  color="#00bcd4", width=0.5),
+        mpf.make_addplot(ind.ema13,  type="line",  color="#673ab7", width=0.5),
+        mpf.make_addplot(ind.ema21,  type="line",  color="#056656", width=0.5),
     ]
 
     # Render to Figure
@@ -33,15 +62,153 @@ def plot_main_chart(df, style='charles', figsize=(6, 4), dpi=100) -> bytes:
 
     ax = axes[0]
 
+    # our own formatter, so a persistent renderer can point it at new dates
+    ax.xaxis.set_major_formatter(_date_formatter(mdates.date2num(ind.index.to_pydatetime())))
     ax.xaxis.set_tick_params(labelbottom=True)
     #ax.xaxis.set_major_formatter(mdates.DateFormatter('%d'))
 
     # Format grid
     ax.grid(which='major', linestyle='-', linewidth=0.8, alpha=0.7)
     ax.grid(which='minor', linestyle=':', linewidth=0.5, alpha=0.5)
+    return fig, ax
 
-    # Save to buffer
+
+def _save_png(fig, dpi, tight=True) -> bytes:
     buf = BytesIO()
-    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    # a fixed pixel size only holds without the tight bounding box
+    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight' if tight else None)
     buf.seek(0)
     return buf.getvalue()
+
+
+def _save(fig, dpi, tight=True, format='png'):
+    if format == 'png':
+        return _save_png(fig, dpi, tight)
+    return encode_rgb(figure_to_rgb(fig, dpi, tight), format)
+
+
+def plot_main_chart(df, style='charles', figsize=(6, 4), dpi=100, backend='matplotlib',
+                    size=None, format='png'):
+    """
+    Plot main candlestick chart with SMMA(14), EMA(13), EMA(21).
+    df: OHLC DataFrame or IndicatorFrame; it is not modified.
+    backend: 'matplotlib' (mplfinance) or 'numpy' (chart_to_code.raster, no text,
+        figsize*dpi pixels, 'charles' colours).
+    size: exact (width, height) in pixels, multiples of 28 (see vision_budget);
+        overrides figsize.
+    format: 'png', 'rgb' (uint8 array), 'webp' or 'palette' (see image_format).
+    Returns raw PNG bytes (or the image in `format`).
+    """
+    check_backend(backend)
+    check_format(format)
+    ind = IndicatorFrame.wrap(df)
+    if size is not None:
+        size = check_size(size)
+        figsize = (size[0] / dpi, size[1] / dpi)
+    if backend == 'numpy':
+        img = raster_main(ind, size=size or (int(figsize[0] * dpi), int(figsize[1] * dpi)))
+        return encode_rgb(img, format)
+    fig, ax = _build_main_figure(ind, style, figsize)
+    if size is not None:
+        fit_axes_to_figure(fig)
+    out = _save(fig, dpi, tight=size is None, format=format)
+    plt.close(fig)
+    return out
+
+
+class MainChartRenderer:
+    """
+    Persistent main-chart renderer.
+
+    The mplfinance figure is built on the first render; later renders of a
+    frame with the same number of bars only swap the candle geometry and
+    colours, the overlay line data, the y-limits and the tick dates (and, at
+    a fixed size, re-fit the axes) before re-encoding. The PNG is
+    byte-identical to plot_main_chart for the same frame. A different bar
+    count triggers a full rebuild.
+    size, format: as for plot_main_chart.
+    """
+
+    def __init__(self, style='charles', figsize=(6, 4), dpi=100, size=None, format='png'):
+        check_format(format)
+        self.format = format
+        self.style = style
+        self.dpi = dpi
+        self.tight = size is None
+        if size is not None:
+            size = check_size(size)
+            figsize = (size[0] / dpi, size[1] / dpi)
+        self.figsize = figsize
+        self.marketcolors = mpf.make_mpf_style(base_mpf_style=style)['marketcolors']
+        self.fig = None
+        self._bars = None
+
+    def render(self, df):
+        """Same contract as plot_main_chart: returns raw PNG bytes (or `format`)."""
+        ind = IndicatorFrame.wrap(df)
+        if self.fig is None or len(ind.df) != self._bars:
+            self.close()
+            self.fig, self.ax = _build_main_figure(ind, self.style, self.figsize)
+            self._bars = len(ind.df)
+            # the artists updated in place: mplfinance draws the wicks as the
+            # candle LineCollection, the bodies as its PolyCollection, and the
+            # overlays as lines in addplot order
+            self._wicks = next(c for c in self.ax.collections if isinstance(c, LineCollection))
+            self._bodies = next(c for c in self.ax.collections if isinstance(c, PolyCollection))
+            self._overlays = self.ax.get_lines()[:3]
+            # fit_axes_to_figure starts from mplfinance's axes positions
+            self._positions = [ax.get_position().frozen() for ax in self.fig.axes]
+        else:
+            self._update(ind)
+        if not self.tight:
+            fit_axes_to_figure(self.fig)
+        return _save(self.fig, self.dpi, self.tight, self.format)
+
+    def close(self) -> None:
+        if self.fig is not None:
+            plt.close(self.fig)
+            self.fig = None
+
+    def _update(self, ind) -> None:
+        df = ind.df
+        ax = self.ax
+        opens, highs = df['open'].to_numpy(), df['high'].to_numpy()
+        lows, closes = df['low'].to_numpy(), df['close'].to_numpy()
+        xs = np.arange(len(df))
+
+        wicks, bodies = self._wicks, self._bodies
+        # candle width is fixed by the bar count, so read it off the current bodies
+        delta = (bodies.get_paths()[0].vertices[:, 0].max()
+                 - bodies.get_paths()[0].vertices[:, 0].min()) / 2
+        bodies.set_verts([
+            ((x - delta, o), (x - delta, c), (x + delta, c), (x + delta, o))
+            for x, o, c in zip(xs, opens, closes)
+        ])
+        lo_body = np.minimum(opens, closes)
+        hi_body = np.maximum(opens, closes)
+        wicks.set_segments(
+            [((x, l), (x, b)) for x, l, b in zip(xs, lows, lo_body)]
+            + [((x, h), (x, b)) for x, h, b in zip(xs, highs, hi_body)]
+        )
+
+        # same up/down rule as mplfinance: up only when open < close
+        up = opens < closes
+        mc = self.marketcolors
+        pick = lambda key: [mc[key]['up'] if u else mc[key]['down'] for u in up]
+        bodies.set_facecolor([_rgba(c, mc['alpha']) for c in pick('candle')])
+        bodies.set_edgecolor(pick('edge'))
+        wicks.set_color(pick('wick') * 2)
+
+        for line, series in zip(self._overlays, (ind.smma14, ind.ema13, ind.ema21)):
+            line.set_ydata(series.to_numpy())
+
+        # mplfinance's tight_layout y-limits
+        miny, maxy = np.nanmin(lows), np.nanmax(highs)
+        ydelta = 0.01 * (maxy - miny)
+        setminy = max(0.9 * miny, miny - ydelta) if miny > 0.0 else miny - ydelta
+        ax.set_ylim(setminy, maxy + ydelta)
+
+        ax.xaxis.set_major_formatter(_date_formatter(mdates.date2num(ind.index.to_pydatetime())))
+        if not self.tight:
+            for axes, position in zip(self.fig.axes, self._positions):
+                axes.set_position(position)
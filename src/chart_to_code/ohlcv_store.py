@@ -0,0 +1,214 @@
+# ohlcv_store.py
+"""
+Local columnar candle store with incremental sync.
+
+One Parquet file per (symbol, timeframe) under `root`, holding ts (Unix ms)
+and open/high/low/close/volume. A sync asks the exchange only for candles from
+the last stored timestamp on (the stored last candle may still have been
+forming, so it is fetched again and replaced), which is usually one small
+request instead of the full 100-500 candle window. Windows are served from a
+memory-mapped read of the file; the decoded table is kept per process until
+the file changes, so repeated reads of an unchanged series do no I/O.
+
+    store = OHLCVStore.for_exchange(exchange)                              # data/ohlcv/binance
+    df = store.fetch(exchange, "BTC/USDT", "1h", limit=100)                # ccxt
+    df = await store.afetch(exchange_or_fetcher, "BTC/USDT", "1h", 100)    # async_support
+
+Frames have the same shape as resample.ohlcv_frame: a datetime index "ts"
+and float open/high/low/close/volume columns. Writes are write-then-rename,
+so several processes (app, bots, generators) can share one store. The files
+do not record where their candles came from, so each exchange gets its own
+directory (for_exchange): synthetic (EXCHANGE=stub) or replayed candles
+never end up in the live store.
+"""
+import asyncio
+import math
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from chart_to_code.resample import OHLCV_COLUMNS, frame_from_arrays, ohlcv_arrays, timeframe_seconds
+
+_SCHEMA = pa.schema([("ts", pa.int64())] + [(c, pa.float64()) for c in OHLCV_COLUMNS[1:]])
+
+
+def _rows_table(rows) -> pa.Table:
+    ts, values = ohlcv_arrays(rows)
+    return pa.table([pa.array(ts)] + [pa.array(col) for col in values], schema=_SCHEMA)
+
+
+class OHLCVStore:
+    """
+    Parquet candle store keyed by (symbol, timeframe).
+
+    root: directory for the files (created if missing).
+    page_limit: candles per exchange request when syncing.
+    """
+
+    def __init__(self, root: str = "data/ohlcv", page_limit: int = 1000):
+        self.root = root
+        self.page_limit = page_limit
+        os.makedirs(root, exist_ok=True)
+        # path -> (inode, mtime_ns, size, table, ts array)
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    @classmethod
+    def for_exchange(cls, exchange, root: str = "data/ohlcv", **kwargs) -> "OHLCVStore":
+        """
+        The store of `exchange`'s candles under `root`: one directory per
+        exchange id (a replay exchange's store_key names its recording too).
+        """
+        return cls(os.path.join(root, getattr(exchange, "store_key", None) or exchange.id), **kwargs)
+
+    def path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, f"{symbol.replace('/', '_')}_{timeframe}.parquet")
+
+    def series(self) -> list[tuple[str, str]]:
+        """Every stored (symbol, timeframe)."""
+        out = []
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith(".parquet"):
+                stem, timeframe = name[:-len(".parquet")].rsplit("_", 1)
+                out.append((stem.replace("_", "/", 1), timeframe))
+        return out
+
+    # reading
+
+    def table(self, symbol: str, timeframe: str) -> pa.Table:
+        """The stored series as an Arrow table (empty if nothing is stored)."""
+        return self._load(self.path(symbol, timeframe))[0]
+
+    def timestamps(self, symbol: str, timeframe: str) -> np.ndarray:
+        """Stored candle timestamps (Unix ms, ascending) as an int64 array."""
+        return self._load(self.path(symbol, timeframe))[1]
+
+    def last_ts(self, symbol: str, timeframe: str) -> int | None:
+        """Timestamp (ms) of the newest stored candle, or None."""
+        ts = self._load(self.path(symbol, timeframe))[1]
+        return int(ts[-1]) if len(ts) else None
+
+    def get(self, symbol: str, timeframe: str, limit: int = 100, end=None) -> pd.DataFrame:
+        """
+        The newest `limit` stored candles, or those up to and including `end`
+        (a Timestamp or Unix ms) when given.
+        """
+        table, ts = self._load(self.path(symbol, timeframe))
+        stop = len(ts)
+        if end is not None:
+            end_ms = end if isinstance(end, (int, np.integer)) else pd.Timestamp(end).value // 1_000_000
+            stop = int(np.searchsorted(ts, end_ms, side="right"))
+        start = max(0, stop - limit)
+        window = table.slice(start, stop - start)
+        # one copy out of Arrow into the (5, n) block the frame then views
+        values = np.empty((5, stop - start))
+        for row, c in zip(values, OHLCV_COLUMNS[1:]):
+            row[:] = window.column(c).to_numpy()
+        return frame_from_arrays(ts[start:stop], values)
+
+    def _load(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            empty = _SCHEMA.empty_table()
+            return empty, np.empty(0, dtype=np.int64)
+        with self._lock:
+            cached = self._tables.get(path)
+            if cached is not None and cached[:3] == (st.st_ino, st.st_mtime_ns, st.st_size):
+                return cached[3:]
+        table = pq.read_table(path, memory_map=True, schema=_SCHEMA)
+        ts = table.column("ts").to_numpy()
+        with self._lock:
+            self._tables[path] = (st.st_ino, st.st_mtime_ns, st.st_size, table, ts)
+        return table, ts
+
+    # syncing
+
+    def _plan(self, symbol: str, timeframe: str, bars: int, now_ms: int) -> tuple[int, bool, list[int]]:
+        """
+        (since, replace, page starts) for bringing the series up to date with
+        at least `bars` contiguous candles. A stored series is extended from
+        its last candle, however old, so its history is kept (a long gap only
+        costs more pages). Only a series that cannot be joined to the needed
+        range is refetched in full: an empty one, one starting after the range
+        (the full fetch covers all of it) and one running ahead of the
+        exchange's clock (a replay of an earlier period).
+        """
+        step_ms = timeframe_seconds(timeframe) * 1000
+        current = now_ms // step_ms * step_ms
+        start = current - (bars - 1) * step_ms
+        ts = self._load(self.path(symbol, timeframe))[1]
+        replace = not len(ts) or ts[0] > start or ts[-1] > current
+        since = start if replace else int(ts[-1])
+        pages = math.ceil(((current - since) // step_ms + 1) / self.page_limit)
+        return since, replace, [since + i * self.page_limit * step_ms for i in range(pages)]
+
+    def _merge(self, symbol: str, timeframe: str, rows, since: int, replace: bool) -> None:
+        if not rows:
+            # an empty answer is no reason to drop what is stored (an
+            # incremental merge would cut the series at `since`)
+            return
+        path = self.path(symbol, timeframe)
+        new = _rows_table(sorted({r[0]: r for r in rows}.values()))
+        if not replace:
+            old, ts = self._load(path)
+            keep = int(np.searchsorted(ts, since, side="left"))
+            new = pa.concat_tables([old.slice(0, keep), new])
+        # write-then-rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        os.close(fd)
+        pq.write_table(new, tmp)
+        os.replace(tmp, path)
+
+    def sync(self, exchange, symbol: str, timeframe: str, bars: int = 100) -> None:
+        """Bring the stored series up to date through a synchronous ccxt exchange."""
+        since, replace, pages = self._plan(symbol, timeframe, bars, exchange.milliseconds())
+        rows = []
+        for page_since in pages:
+            self.requests += 1
+            page = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=page_since,
+                                        limit=self.page_limit)
+            if not page:
+                break
+            rows.extend(page)
+        self._merge(symbol, timeframe, rows, since, replace)
+
+    async def async_sync(self, source, symbol: str, timeframe: str, bars: int = 100) -> None:
+        """
+        sync for a ccxt.async_support exchange or an async_fetch.OHLCVFetcher
+        (anything with an async fetch_ohlcv); the pages are fetched concurrently.
+        """
+        exchange = getattr(source, "exchange", source)
+        since, replace, pages = self._plan(symbol, timeframe, bars, exchange.milliseconds())
+        self.requests += len(pages)
+        results = await asyncio.gather(*(
+            source.fetch_ohlcv(symbol, timeframe=timeframe, since=s, limit=self.page_limit)
+            for s in pages
+        ))
+        self._merge(symbol, timeframe, [r for page in results for r in page], since, replace)
+
+    def fetch(self, exchange, symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
+        """Sync, then return the newest `limit` candles; the store's exchange.fetch_ohlcv."""
+        self.sync(exchange, symbol, timeframe, limit)
+        return self.get(symbol, timeframe, limit)
+
+    async def afetch(self, source, symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
+        """Async fetch (see async_sync for `source`)."""
+        await self.async_sync(source, symbol, timeframe, limit)
+        return self.get(symbol, timeframe, limit)
+
+    async def afetch_many(self, source, pairs, limit: int = 100) -> dict:
+        """
+        {(symbol, timeframe): DataFrame} for every pair, synced concurrently;
+        a pair that fails maps to its exception, as in OHLCVFetcher.fetch_many.
+        """
+        pairs = list(pairs)
+        frames = await asyncio.gather(*(self.afetch(source, s, tf, limit) for s, tf in pairs),
+                                      return_exceptions=True)
+        return dict(zip(pairs, frames))
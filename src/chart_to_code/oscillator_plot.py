@@ -1,21 +1,22 @@
 # oscillator_plot.py
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from io import BytesIO
 
-def plot_oscillator(df, ao_fast=5, ao_slow=34) -> bytes:
-    """
-    Generate Awesome Oscillator histogram as PNG bytes.
-    df: DataFrame with 'high' and 'low' columns and datetime index.
-    ao_fast, ao_slow: window lengths for the fast and slow SMAs.
-    Returns raw PNG bytes.
-    """
-    # Compute median price and moving averages
-    hl2 = (df['high'] + df['low']) / 2
-    sma_fast = hl2.rolling(window=ao_fast, min_periods=1).mean()
-    sma_slow = hl2.rolling(window=ao_slow, min_periods=1).mean()
-    ao = sma_fast - sma_slow
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.image_format import check_format, encode_rgb, figure_to_rgb
+from chart_to_code.raster import check_backend, raster_oscillator
+from chart_to_code.vision_budget import check_size
+
+def _ao_bars(df, ao_fast, ao_slow):
+    """AO values, bar colours, bar width and y-limits for the histogram."""
+    ind = IndicatorFrame.wrap(df)
+    df = ind.df
+
+    # Median-price SMAs over whatever history is available
+    ao = ind.awesome_oscillator(ao_fast, ao_slow, min_periods=1)
 
     # Difference for coloring
     diff = ao.diff()
@@ -26,12 +27,32 @@ def plot_oscillator(df, ao_fast=5, ao_slow=34) -> bytes:
     interval = df.index.to_series().diff().median()
     width = (interval / pd.Timedelta(days=1)) * 0.8
 
+    # Label and limits, with extra room below zero
+    y_max = ao.max()
+    y_min = ao.min()
+    span = y_max - y_min
+    pad = span * 0.05
+    bottom = y_min - pad * 2    # extra space below
+    top = y_max + pad
+    return df, ao, colors, width, (bottom, top)
+
+
+_DPI = 150
+
+
+def _figsize(size):
+    if size is None:
+        return (8, 3)
+    width, height = check_size(size)
+    return (width / _DPI, height / _DPI)
+
+
+def _build_oscillator_figure(df, ao, colors, width, ylim, figsize=(8, 3)):
     # Create figure and axis
-    buf = BytesIO()
-    fig, ax = plt.subplots(figsize=(8, 3), constrained_layout=True)
+    fig, ax = plt.subplots(figsize=figsize, constrained_layout=True)
 
     # Plot histogram bars
-    ax.bar(
+    bars = ax.bar(
         df.index,
         ao,
         color=colors,
@@ -60,19 +81,101 @@ def plot_oscillator(df, ao_fast=5, ao_slow=34) -> bytes:
     # Remove x-axis label/title
     ax.xaxis.label.set_visible(False)
 
-    # Label and limits, with extra room below zero
     ax.set_ylabel('AO', color='#888eb0', labelpad=8)
-    y_max = ao.max()
-    y_min = ao.min()
-    span = y_max - y_min
-    pad = span * 0.05
-    bottom = y_min - pad * 2    # extra space below
-    top = y_max + pad
-    ax.set_ylim(bottom, top)
+    ax.set_ylim(*ylim)
+    return fig, ax, bars
 
-    # Save to buffer
-    fig.savefig(buf, format='png', dpi=150)
+
+def _save_png(fig) -> bytes:
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=_DPI)
     buf.seek(0)
+    return buf.getvalue()
+
+
+def _save(fig, format='png'):
+    if format == 'png':
+        return _save_png(fig)
+    return encode_rgb(figure_to_rgb(fig, _DPI), format)
+
+
+def plot_oscillator(df, ao_fast=5, ao_slow=34, backend='matplotlib', size=None, format='png'):
+    """
+    Generate Awesome Oscillator histogram as PNG bytes.
+    df: DataFrame with 'high' and 'low' columns and datetime index,
+        or an IndicatorFrame over one.
+    ao_fast, ao_slow: window lengths for the fast and slow SMAs.
+    backend: 'matplotlib' or 'numpy' (chart_to_code.raster, no axis label).
+    size: exact (width, height) in pixels, multiples of 28 (see vision_budget).
+    format: 'png', 'rgb' (uint8 array), 'webp' or 'palette' (see image_format).
+    Returns raw PNG bytes (or the image in `format`).
+    """
+    check_backend(backend)
+    check_format(format)
+    figsize = _figsize(size)
+    if backend == 'numpy':
+        img = raster_oscillator(df, ao_fast, ao_slow,
+                                size=(round(figsize[0] * _DPI), round(figsize[1] * _DPI)))
+        return encode_rgb(img, format)
+
+    fig, ax, _ = _build_oscillator_figure(*_ao_bars(df, ao_fast, ao_slow), figsize=figsize)
+
+    # Save to buffer
+    out = _save(fig, format)
     plt.close(fig)
 
-    return buf.getvalue()
+    return out
+
+
+class OscillatorRenderer:
+    """
+    Persistent AO-panel renderer.
+
+    The figure is built on the first render; later renders with the same bar
+    count and bar width only move and recolour the existing bars, re-derive the
+    data limits and set the y-limits before re-encoding. The PNG is
+    byte-identical to plot_oscillator for the same frame.
+    size, format: as for plot_oscillator.
+    """
+
+    def __init__(self, ao_fast=5, ao_slow=34, size=None, format='png'):
+        check_format(format)
+        self.format = format
+        self.ao_fast = ao_fast
+        self.ao_slow = ao_slow
+        self.figsize = _figsize(size)
+        self.fig = None
+        self._key = None
+
+    def render(self, df):
+        """Same contract as plot_oscillator: returns raw PNG bytes (or `format`)."""
+        df, ao, colors, width, ylim = _ao_bars(df, self.ao_fast, self.ao_slow)
+        key = (len(df), width)
+        if self.fig is None or key != self._key:
+            self.close()
+            self.fig, self.ax, self._bars = _build_oscillator_figure(
+                df, ao, colors, width, ylim, figsize=self.figsize)
+            self._key = key
+            # constrained_layout starts from the current axes and y-label
+            # positions, so each render restarts it from the fresh-figure ones
+            self._pos0 = self.ax.get_position(original=True).frozen()
+            self._label_pos0 = self.ax.yaxis.label.get_position()
+        else:
+            xs = mdates.date2num(df.index.to_pydatetime())
+            for bar, x, h, c in zip(self._bars, xs, ao.to_numpy(), colors):
+                bar.set_x(x - width / 2)
+                bar.set_height(h)
+                bar.set_facecolor(c)
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.ax.set_ylim(*ylim)
+            # set_position also takes the axes out of the layout; put it back
+            self.ax.set_position(self._pos0, which='both')
+            self.ax.set_in_layout(True)
+            self.ax.yaxis.label.set_position(self._label_pos0)
+        return _save(self.fig, self.format)
+
+    def close(self) -> None:
+        if self.fig is not None:
+            plt.close(self.fig)
+            self.fig = None
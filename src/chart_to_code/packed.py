@@ -0,0 +1,244 @@
+# packed.py
+"""
+Packed dataset shards: many samples per file, read through mmap.
+
+A generated dataset is thousands of small files (three panel images and a
+per-sample JSON per example, plus the JSONL), which is slow to read cold and
+costly in inodes on network storage. A pack holds a run of samples in one
+file: the image bytes of every sample, then a JSON index with each sample's
+metadata (label, reasoning, debug, symbol/timeframe, conversations) and the
+offset and size of each of its images.
+
+    with PackWriter("data/packs/shard-00000.pack") as pack:
+        pack.add({"label": label, "reasoning": reasoning, ...}, {"main": png, "ao": png, "rsi": png})
+
+    pack = PackReader("data/packs/shard-00000.pack")
+    pack[3]["label"], pack.images(3)                # metadata, RGB PIL images
+
+Images keep the format they were rendered in (see image_format): PNG/WebP
+bytes are stored as-is, "rgb" arrays raw with their shape, so
+PackReader.image_data returns them as zero-copy NumPy views of the mapping.
+Blobs are 64-byte aligned. A pack is written to a temporary file and renamed
+into place when closed, so readers never see a partial one.
+
+    python -m chart_to_code.packed generated_dataset   # pack an existing dataset
+"""
+import argparse
+from io import BytesIO
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+MAGIC = b"C2CPACK1"
+# index offset, index size, magic
+_FOOTER = struct.Struct("<QQ8s")
+_ALIGN = 64
+
+
+class PackWriter:
+    """Writes samples to a new pack at `path`; use as a context manager or call close()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(MAGIC)
+        self._records = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _write_blob(self, data) -> int:
+        offset = self._file.tell()
+        pad = -offset % _ALIGN
+        self._file.write(b"\0" * pad)
+        self._file.write(data)
+        return offset + pad
+
+    def add(self, record: dict, images: dict) -> int:
+        """
+        Append one sample: `record` (JSON-serializable metadata) and its
+        images {name: PNG/WebP bytes or RGB array}, in order. Returns its index.
+        """
+        entries = []
+        for name, img in images.items():
+            if isinstance(img, np.ndarray):
+                img = np.ascontiguousarray(img, dtype=np.uint8)
+                entry = {"name": name, "format": "rgb", "shape": list(img.shape), "size": img.nbytes}
+                entry["offset"] = self._write_blob(memoryview(img).cast("B"))
+            else:
+                fmt = "webp" if bytes(img[8:12]) == b"WEBP" else "png"
+                entry = {"name": name, "format": fmt, "size": len(img)}
+                entry["offset"] = self._write_blob(img)
+            entries.append(entry)
+        self._records.append(dict(record, images=entries))
+        return len(self._records) - 1
+
+    def close(self) -> None:
+        index = json.dumps(self._records).encode()
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(_FOOTER.pack(offset, len(index), MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+
+class PackReader:
+    """
+    Random access to a pack through a read-only memory map. Picklable (it
+    reopens the file), so it can go to DataLoader worker processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self) -> None:
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < len(MAGIC) + _FOOTER.size or self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a pack")
+        offset, size, magic = _FOOTER.unpack_from(self._map, len(self._map) - _FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is truncated")
+        self.records = json.loads(self._map[offset:offset + size])
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, i: int) -> dict:
+        """Sample i's metadata; its "images" list names, formats and locates each image."""
+        return self.records[i]
+
+    def _entry(self, i: int, name):
+        entries = self.records[i]["images"]
+        if isinstance(name, int):
+            return entries[name]
+        for entry in entries:
+            if entry["name"] == name:
+                return entry
+        raise KeyError(f"sample {i} has no image {name!r}")
+
+    def image_data(self, i: int, name=0):
+        """
+        Image `name` (or position) of sample i as stored: an RGB array view
+        for "rgb", a memoryview of the encoded bytes otherwise. Both point
+        into the mapping and stay valid while the reader is open.
+        """
+        entry = self._entry(i, name)
+        if entry["format"] == "rgb":
+            return np.frombuffer(self._map, dtype=np.uint8, count=entry["size"],
+                                 offset=entry["offset"]).reshape(entry["shape"])
+        return memoryview(self._map)[entry["offset"]:entry["offset"] + entry["size"]]
+
+    def image(self, i: int, name=0) -> Image.Image:
+        """Image `name` (or position) of sample i as an RGB PIL image."""
+        data = self.image_data(i, name)
+        if isinstance(data, np.ndarray):
+            return Image.fromarray(data)
+        return Image.open(BytesIO(data)).convert("RGB")
+
+    def images(self, i: int) -> list:
+        """Every image of sample i, in order, as RGB PIL images."""
+        return [self.image(i, k) for k in range(len(self.records[i]["images"]))]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def pack_examples(examples, base_dir: str, path: str) -> list[dict]:
+    """
+    Pack generator output: `examples` are training JSONL lines whose "images"
+    are paths relative to `base_dir`; symbol, timeframe, reasoning and debug
+    come from the matching per-sample JSON in base_dir/full and go into the
+    pack index. Returns the lines with the image paths replaced by
+    {"pack": file name, "pack_index": i}.
+    """
+    # per-sample JSON by the id prefix it shares with its images ("0042_...")
+    full_dir = os.path.join(base_dir, "full")
+    full_names = {name.split("_", 1)[0]: name for name in
+                  (os.listdir(full_dir) if os.path.isdir(full_dir) else []) if name.endswith(".json")}
+
+    out = []
+    with PackWriter(path) as pack:
+        for line in examples:
+            images = {}
+            for rel in line["images"]:
+                file = os.path.join(base_dir, rel)
+                name = os.path.basename(rel).rsplit(".", 1)[0].split("_", 1)[-1]
+                if file.endswith(".npy"):
+                    images[name] = np.load(file)
+                else:
+                    with open(file, "rb") as f:
+                        images[name] = f.read()
+            meta = {k: v for k, v in line.items() if k != "images"}
+            ex = {}
+            full_name = full_names.get(os.path.basename(line["images"][0]).split("_", 1)[0])
+            if full_name is not None:
+                with open(os.path.join(full_dir, full_name)) as f:
+                    ex = json.load(f)
+            for key in ("symbol", "timeframe", "label", "reasoning", "debug"):
+                if key in ex:
+                    meta.setdefault(key, ex[key])
+            meta.setdefault("image_mode", "composite" if len(images) == 1 else "panels")
+            index = pack.add(meta, images)
+            out.append({k: v for k, v in line.items() if k != "images"}
+                       | {"image_mode": meta["image_mode"], "pack": os.path.basename(path),
+                          "pack_index": index})
+    return out
+
+
+def loose_files(lines, base_dir: str) -> list[str]:
+    """The image files and per-sample JSON that training `lines` were packed from."""
+    full_dir = os.path.join(base_dir, "full")
+    full_names = {}
+    for name in os.listdir(full_dir) if os.path.isdir(full_dir) else []:
+        full_names.setdefault(name.split("_", 1)[0], []).append(os.path.join(full_dir, name))
+    paths = []
+    for line in lines:
+        images = [os.path.join(base_dir, rel) for rel in line.get("images", [])]
+        if images:
+            paths += images + full_names.get(os.path.basename(images[0]).split("_", 1)[0], [])
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a generated dataset into .pack shards")
+    parser.add_argument("base_dir", help="dataset directory holding training/data.jsonl, full/ and panels/")
+    parser.add_argument("--per-pack", type=int, default=1000, help="samples per pack")
+    args = parser.parse_args()
+
+    with open(os.path.join(args.base_dir, "training", "data.jsonl")) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    pack_dir = os.path.join(args.base_dir, "packs")
+    packed = []
+    for start in range(0, len(lines), args.per_pack):
+        path = os.path.join(pack_dir, f"pack-{start // args.per_pack:05d}.pack")
+        packed += pack_examples(lines[start:start + args.per_pack], args.base_dir, path)
+        print(f"{path}: {len(packed) - start} samples, {os.path.getsize(path) / 1e6:.1f} MB")
+    with open(os.path.join(args.base_dir, "training", "packed.jsonl"), "w") as f:
+        f.writelines(json.dumps(line) + "\n" for line in packed)
@@ -0,0 +1,325 @@
+# pipeline.py
+"""
+Streaming stage pipeline with bounded queues.
+
+A generator that fetches, labels, renders and writes one step after the
+other leaves every resource idle while another step runs. Pipeline connects
+stages by bounded queues instead, each stage run by its own worker threads:
+
+    pipe = Pipeline(report_every=10)
+    pipe.source("fetch", fetch_all)                          # fetch_all(emit)
+    pipe.stage("label", label, workers=2, maxsize=8)         # label(item, emit)
+    pipe.stage("render", render, workers=8, maxsize=16)
+    pipe.stage("write", write, batch=16, maxsize=64)         # write(items, emit)
+    pipe.run()
+    print(pipe.summary())
+
+  - emit(item) hands an item to the next stage and blocks while its queue is
+    full, so a slow stage holds back the ones before it (backpressure)
+    instead of letting items pile up in memory
+  - a stage with batch > 1 gets lists of up to `batch` items, waiting at most
+    `linger` seconds for a batch to fill
+  - finish(emit), if given, runs once after the stage's last item (e.g. to
+    flush what it gathered)
+  - the first error in any stage stops the pipeline and is raised by run()
+
+Threads suit stages that wait on I/O, on NumPy or on a process pool (see
+render_pool); pure-Python work in several workers of one stage shares the GIL.
+
+Every stage counts its items and the time its workers spent busy, blocked on
+a full downstream queue and starved on an empty input queue; queue depths are
+sampled while running. stats() and summary() (and a line every `report_every`
+seconds) show the bottleneck: the stage that is busy nearly all the time,
+with full queues before it and starving stages after it.
+"""
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """Raised inside a stage's emit when another stage failed."""
+
+
+class _Stage:
+    def __init__(self, name, fn, workers, maxsize, batch, linger, finish, source=False):
+        if workers < 1 or batch < 1:
+            raise ValueError("workers and batch must be at least 1")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch = batch
+        self.linger = linger
+        self.finish = finish
+        self.source = source
+        self.maxsize = maxsize
+        self.queue = None if source else queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.items = 0
+        self.emitted = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.starved = 0.0
+        self.depth_sum = 0
+        self.depth_max = 0
+        self.samples = 0
+        self.running = workers
+        self.started = None
+        self.stopped = None
+
+    def add_times(self, busy=0.0, blocked=0.0, starved=0.0, items=0, emitted=0):
+        with self.lock:
+            self.busy += busy
+            self.blocked += blocked
+            self.starved += starved
+            self.items += items
+            self.emitted += emitted
+
+
+class Pipeline:
+    """
+    A source stage followed by processing stages, each with its own worker
+    threads, connected by bounded queues. Build it with source() and stage(),
+    then run() it once.
+
+    report_every: seconds between progress lines printed while running
+        (None for none).
+    sample_every: seconds between queue depth samples.
+    """
+
+    def __init__(self, report_every: float | None = None, sample_every: float = 0.2, log=print):
+        self.report_every = report_every
+        self.sample_every = sample_every
+        self.log = log
+        self._stages = []
+        self._error = None
+        self._stop = threading.Event()
+        # each worker's own time blocked in emit, kept out of its busy time
+        self._local = threading.local()
+        self._started = None
+        self._finished = None
+
+    def source(self, name: str, fn, workers: int = 1) -> "Pipeline":
+        """First stage: fn(emit) produces the items (called once per worker)."""
+        if self._stages:
+            raise ValueError("the source must be the first stage")
+        self._stages.append(_Stage(name, fn, workers, 0, 1, 0, None, source=True))
+        return self
+
+    def stage(self, name: str, fn, workers: int = 1, maxsize: int = 0, batch: int = 1,
+              linger: float = 0.5, finish=None) -> "Pipeline":
+        """
+        Next stage: fn(item, emit), or fn(items, emit) with batch > 1, for
+        every item the previous stage emits; its input queue holds at most
+        `maxsize` items (default: 2 per worker, or 2 batches). finish(emit)
+        runs after the last item.
+        """
+        if not self._stages:
+            raise ValueError("add a source first")
+        maxsize = maxsize or 2 * max(workers, batch)
+        self._stages.append(_Stage(name, fn, workers, maxsize, batch, linger, finish))
+        return self
+
+    # running
+
+    def _emitter(self, index):
+        if index + 1 == len(self._stages):
+            stage = self._stages[index]
+
+            def emit(item):
+                stage.add_times(emitted=1)
+            return emit
+        stage, target = self._stages[index], self._stages[index + 1]
+
+        def emit(item):
+            start = time.perf_counter()
+            self._put(target.queue, item)
+            blocked = time.perf_counter() - start
+            self._local.blocked += blocked
+            stage.add_times(blocked=blocked, emitted=1)
+        return emit
+
+    def _put(self, q, item) -> None:
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, stage, timeout=None):
+        """Next input item (or _DONE); None if `timeout` ran out first."""
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        try:
+            while True:
+                if self._stop.is_set():
+                    raise PipelineStopped
+                wait = 0.1 if deadline is None else max(0.0, min(0.1, deadline - time.perf_counter()))
+                try:
+                    item = stage.queue.get(timeout=wait)
+                except queue.Empty:
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        return None
+                    continue
+                if item is _DONE:
+                    self._put(stage.queue, _DONE)  # for the stage's other workers
+                return item
+        finally:
+            stage.add_times(starved=time.perf_counter() - start)
+
+    def _call(self, stage, fn, *args):
+        """fn(*args), adding its run time minus the time it spent blocked in emit to stage.busy."""
+        blocked = self._local.blocked
+        start = time.perf_counter()
+        try:
+            fn(*args)
+        finally:
+            stage.add_times(busy=time.perf_counter() - start - (self._local.blocked - blocked))
+
+    def _work(self, index):
+        stage = self._stages[index]
+        emit = self._emitter(index)
+        self._local.blocked = 0.0
+        try:
+            if stage.source:
+                self._call(stage, stage.fn, emit)
+            else:
+                done = False
+                while not done:
+                    item = self._get(stage)
+                    if item is _DONE:
+                        break
+                    items = [item]
+                    if stage.batch > 1:
+                        deadline = time.perf_counter() + stage.linger
+                        while len(items) < stage.batch:
+                            item = self._get(stage, deadline - time.perf_counter())
+                            if item is None:
+                                break
+                            if item is _DONE:
+                                done = True
+                                break
+                            items.append(item)
+                    self._call(stage, stage.fn, items if stage.batch > 1 else items[0], emit)
+                    stage.add_times(items=len(items))
+            with stage.lock:
+                stage.running -= 1
+                last = stage.running == 0
+            if last:
+                if stage.finish is not None:
+                    self._call(stage, stage.finish, emit)
+                stage.stopped = time.perf_counter()
+                if index + 1 < len(self._stages):
+                    self._put(self._stages[index + 1].queue, _DONE)
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    def _monitor(self):
+        last_report = time.perf_counter()
+        while not self._stop.wait(self.sample_every):
+            for stage in self._stages[1:]:
+                depth = stage.queue.qsize()
+                with stage.lock:
+                    stage.depth_sum += depth
+                    stage.depth_max = max(stage.depth_max, depth)
+                    stage.samples += 1
+            if self.report_every and time.perf_counter() - last_report >= self.report_every:
+                last_report = time.perf_counter()
+                self.log(self.progress())
+
+    def run(self) -> dict:
+        """Run every stage to completion; returns stats(). Raises the first stage error."""
+        if not self._stages:
+            raise ValueError("the pipeline has no stages")
+        if self._started is not None:
+            raise ValueError("a pipeline runs once")
+        self._started = time.perf_counter()
+        for stage in self._stages:
+            stage.started = self._started
+        threads = [threading.Thread(target=self._work, args=(i,), name=f"{stage.name}-{w}", daemon=True)
+                   for i, stage in enumerate(self._stages) for w in range(stage.workers)]
+        monitor = threading.Thread(target=self._monitor, name="pipeline-monitor", daemon=True)
+        for t in threads:
+            t.start()
+        monitor.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.5)
+        except BaseException as e:  # KeyboardInterrupt: stop the workers too
+            self._error = self._error or e
+        finally:
+            self._stop.set()
+            monitor.join()
+            self._finished = time.perf_counter()
+        if self._error is not None:
+            raise self._error
+        return self.stats()
+
+    # reporting
+
+    def stats(self) -> dict:
+        """
+        Per stage: items taken in (produced, for the source), items emitted,
+        items/s and the share of worker time spent busy, blocked on a full
+        output queue and starved on an empty input queue, all while the stage
+        was running; "load", its busy time per worker over the whole run (the
+        bottleneck has the highest); mean and max depth of its input queue.
+        """
+        now = self._finished or time.perf_counter()
+        total = max(now - (self._started or now), 1e-9)
+        out = {}
+        for stage in self._stages:
+            with stage.lock:
+                elapsed = max((stage.stopped or now) - (stage.started or now), 1e-9)
+                worker_time = elapsed * stage.workers
+                items = stage.emitted if stage.source else stage.items
+                out[stage.name] = {
+                    "items": items,
+                    "emitted": stage.emitted,
+                    "seconds": elapsed,
+                    "rate": items / elapsed,
+                    "load": min(stage.busy / stage.workers / total, 1.0),
+                    "busy": min(stage.busy / worker_time, 1.0),
+                    "blocked": min(stage.blocked / worker_time, 1.0),
+                    "starved": min(stage.starved / worker_time, 1.0),
+                    "workers": stage.workers,
+                    "queue": None if stage.source else stage.queue.qsize(),
+                    "queue_max": stage.maxsize,
+                    "queue_mean": stage.depth_sum / stage.samples if stage.samples else 0.0,
+                    "queue_peak": stage.depth_max,
+                }
+        return out
+
+    def progress(self) -> str:
+        """One line: items, rate, busy share and input queue depth per stage."""
+        elapsed = (self._finished or time.perf_counter()) - (self._started or time.perf_counter())
+        parts = []
+        for name, s in self.stats().items():
+            queued = "" if s["queue"] is None else f" q {s['queue']}/{s['queue_max']}"
+            parts.append(f"{name}{queued} {s['items']}→{s['emitted']} ({s['rate']:.1f}/s, busy {s['busy']:.0%})")
+        return f"[{elapsed:.0f}s] " + " | ".join(parts)
+
+    def summary(self) -> str:
+        """A table of stats(); the stage with the highest load is marked as the bottleneck."""
+        stats = self.stats()
+        bottleneck = max(stats, key=lambda name: stats[name]["load"]) if stats else None
+        lines = [f"{'stage':<10} {'workers':>7} {'in':>7} {'out':>7} {'seconds':>8} {'items/s':>8} {'busy':>5} "
+                 f"{'blocked':>7} {'starved':>7} {'load':>5} {'queue mean/peak/max':>20}"]
+        for name, s in stats.items():
+            queue_text = "-" if s["queue"] is None else \
+                f"{s['queue_mean']:.1f}/{s['queue_peak']}/{s['queue_max']}"
+            lines.append(f"{name:<10} {s['workers']:>7} {s['items']:>7} {s['emitted']:>7} {s['seconds']:>8.1f} "
+                         f"{s['rate']:>8.1f} {s['busy']:>5.0%} {s['blocked']:>7.0%} {s['starved']:>7.0%} "
+                         f"{s['load']:>5.0%} {queue_text:>20}"
+                         + ("  <- bottleneck" if name == bottleneck else ""))
+        return "\n".join(lines)
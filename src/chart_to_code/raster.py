@@ -0,0 +1,258 @@
+# raster.py
+"""
+Direct NumPy rasterizer for the three chart panels.
+
+The matplotlib/mplfinance panels are general-purpose and cost tens of
+milliseconds each. For fixed-size panels with a known style, this module
+draws the same elements straight into a uint8 RGB array of shape
+(height, width, 3):
+
+  - main:  candles, the SMMA(14) step line and the EMA(13)/EMA(21) lines
+  - ao:    Awesome Oscillator histogram with a dashed zero line
+  - stoch: %K/%D lines with dashed 80/20 guides
+  - composite: the three panels stacked on a shared x-axis
+
+Colours and data limits follow the matplotlib panels. There is no text
+(tick labels, axis labels, legend), so the images are not pixel-identical
+to the matplotlib backend; grid lines sit at the same tick values. The plot
+modules expose this path through backend="numpy".
+"""
+from io import BytesIO
+
+import numpy as np
+from matplotlib.colors import to_rgb
+from matplotlib.ticker import MaxNLocator
+from PIL import Image
+
+from chart_to_code.indicators import IndicatorFrame
+
+# default sizes match the matplotlib panels at their save dpi
+MAIN_SIZE = (600, 400)
+AO_SIZE = (1200, 450)
+STOCH_SIZE = (600, 300)
+COMPOSITE_SIZE = (600, 700)
+
+BACKENDS = ("matplotlib", "numpy")
+
+# padding between the image border and the plot area, in pixels
+_PAD = 4
+
+
+def check_backend(backend: str) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+
+
+def _rgb(color) -> np.ndarray:
+    return np.round(np.asarray(to_rgb(color)) * 255).astype(np.uint8)
+
+
+def _canvas(size, background) -> np.ndarray:
+    width, height = size
+    # one filled row repeated down the image; much faster than a broadcast fill
+    row = np.tile(_rgb(background), (1, width, 1))
+    return np.repeat(row, height, axis=0)
+
+
+class _Axes:
+    """Maps data coordinates onto the padded plot area of a canvas."""
+
+    def __init__(self, img, xlim, ylim):
+        self.img = img
+        height, width = img.shape[:2]
+        self.x0, self.x1 = _PAD, width - 1 - _PAD
+        self.y0, self.y1 = _PAD, height - 1 - _PAD
+        self.xlim, self.ylim = xlim, ylim
+
+    def px(self, x):
+        lo, hi = self.xlim
+        return self.x0 + (np.asarray(x, dtype=float) - lo) / (hi - lo) * (self.x1 - self.x0)
+
+    def py(self, y):
+        lo, hi = self.ylim
+        return self.y1 - (np.asarray(y, dtype=float) - lo) / (hi - lo) * (self.y1 - self.y0)
+
+    def fill_rects(self, left, right, bottom, top, colors) -> None:
+        """
+        Fill data-space rectangles (each at least one pixel in each direction).
+        colors: one RGB triple per rectangle, as an (n, 3) array.
+        """
+        c0 = np.clip(np.floor(self.px(left)), self.x0, self.x1).astype(int).tolist()
+        c1 = np.clip(np.ceil(self.px(right)), self.x0, self.x1).astype(int).tolist()
+        r0 = np.clip(np.floor(self.py(top)), self.y0, self.y1).astype(int).tolist()
+        r1 = np.clip(np.ceil(self.py(bottom)), self.y0, self.y1).astype(int).tolist()
+        img = self.img
+        for a, b, c, d, color in zip(r0, r1, c0, c1, colors):
+            img[a:max(b, a + 1), c:max(d, c + 1)] = color
+
+    def hline(self, y, color, dash: int = 0) -> None:
+        """Full-width horizontal line; dash > 0 draws dash-length on/off runs."""
+        row = int(round(float(self.py(y))))
+        if not self.y0 <= row <= self.y1:
+            return
+        cols = np.arange(self.x0, self.x1 + 1)
+        if dash:
+            cols = cols[((cols - self.x0) // dash) % 2 == 0]
+        self.img[row, cols] = color
+
+    def grid(self, color, nbins: int = 6) -> None:
+        lo, hi = self.ylim
+        for tick in MaxNLocator(nbins).tick_values(lo, hi):
+            if lo <= tick <= hi:
+                self.hline(tick, color)
+
+    def polyline(self, x, y, color, width: int = 1) -> None:
+        """
+        Draw connected segments through (x, y). Segments touching a NaN are
+        skipped, like matplotlib does. Every segment is sampled once per pixel
+        of its longer side and stamped with a width x width square brush.
+        """
+        xs, ys = self.px(x), self.py(y)
+        ok = ~(np.isnan(ys[:-1]) | np.isnan(ys[1:]))
+        ax0, ay0 = xs[:-1][ok], ys[:-1][ok]
+        dx, dy = xs[1:][ok] - ax0, ys[1:][ok] - ay0
+        if not len(dx):
+            return
+        steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64) + 1
+        seg = np.repeat(np.arange(len(steps)), steps)
+        # position of each sample within its segment, 0..steps-1
+        t = np.arange(len(seg)) - np.repeat(np.cumsum(steps) - steps, steps)
+        t = t / np.maximum(steps[seg] - 1, 1)
+        cols = np.rint(ax0[seg] + t * dx[seg]).astype(np.int64)
+        rows = np.rint(ay0[seg] + t * dy[seg]).astype(np.int64)
+
+        offsets = np.arange(width) - (width - 1) // 2
+        for oy in offsets:
+            for ox in offsets:
+                r = np.clip(rows + oy, self.y0, self.y1)
+                c = np.clip(cols + ox, self.x0, self.x1)
+                self.img[r, c] = color
+
+
+def _step_points(x, y):
+    """Vertices of a 'steps-pre' line through (x, y), as mplfinance draws type='step'."""
+    sx = np.repeat(x, 2)[:-1]
+    sy = np.repeat(y, 2)[1:]
+    return sx, sy
+
+
+def _date_positions(index) -> np.ndarray:
+    """Index timestamps as float days, the unit matplotlib uses for dates."""
+    return index.asi8 / 86_400e9 if hasattr(index, "asi8") else np.arange(len(index), dtype=float)
+
+
+def raster_main(df, size=MAIN_SIZE, style_colors=("#006340", "#a02128")) -> np.ndarray:
+    """
+    Candlestick panel with SMMA(14), EMA(13), EMA(21) as an RGB array.
+    style_colors: (up, down) candle colours; the default is mplfinance 'charles'.
+    """
+    ind = IndicatorFrame.wrap(df)
+    d = ind.df
+    opens, highs = d["open"].to_numpy(float), d["high"].to_numpy(float)
+    lows, closes = d["low"].to_numpy(float), d["close"].to_numpy(float)
+    n = len(d)
+    xs = np.arange(n)
+
+    # mplfinance's tight_layout y-limits
+    miny, maxy = np.nanmin(lows), np.nanmax(highs)
+    ydelta = 0.01 * (maxy - miny)
+    setminy = max(0.9 * miny, miny - ydelta) if miny > 0.0 else miny - ydelta
+
+    img = _canvas(size, "white")
+    ax = _Axes(img, (-1, n), (setminy, maxy + ydelta))
+    ax.grid(_rgb("#a0a0a0"))
+
+    up, down = _rgb(style_colors[0]), _rgb(style_colors[1])
+    colors = np.where((opens < closes)[:, None], up, down)
+    half = 0.35
+    ax.fill_rects(xs, xs, lows, highs, colors)                       # wicks
+    ax.fill_rects(xs - half, xs + half, np.minimum(opens, closes),
+                  np.maximum(opens, closes), colors)                 # bodies
+
+    ax.polyline(*_step_points(xs, ind.smma14.to_numpy(float)), _rgb("#00bcd4"))
+    ax.polyline(xs, ind.ema13.to_numpy(float), _rgb("#673ab7"))
+    ax.polyline(xs, ind.ema21.to_numpy(float), _rgb("#056656"))
+    return img
+
+
+def raster_oscillator(df, ao_fast=5, ao_slow=34, size=AO_SIZE,
+                      shared_x: bool = False) -> np.ndarray:
+    """
+    Awesome Oscillator histogram (dark theme) as an RGB array.
+    shared_x: place bars by bar number on the main panel's x-range instead of
+        by timestamp, so the panel lines up under raster_main.
+    """
+    ind = IndicatorFrame.wrap(df)
+    ao = ind.awesome_oscillator(ao_fast, ao_slow, min_periods=1).to_numpy(float)
+    rising = np.diff(ao, prepend=np.nan) > 0
+    xs = np.arange(len(ao), dtype=float) if shared_x else _date_positions(ind.index)
+    width = np.median(np.diff(xs)) * 0.8 if len(xs) > 1 else 0.8
+    xlim = (-1, len(xs)) if shared_x else (xs[0] - width, xs[-1] + width)
+
+    y_max, y_min = np.nanmax(ao), np.nanmin(ao)
+    pad = (y_max - y_min) * 0.05
+    bottom, top = y_min - pad * 2, y_max + pad
+    if bottom == top:
+        bottom, top = bottom - 1, top + 1
+
+    img = _canvas(size, "#131722")
+    ax = _Axes(img, xlim, (bottom, top))
+    ax.grid(_rgb("#2a2a2a"))
+    ax.hline(0, _rgb("#888eb0"), dash=6)
+
+    up, down = _rgb("#27c6da"), _rgb("#9498a1")
+    ok = ~np.isnan(ao)
+    colors = np.where(rising[ok][:, None], up, down)
+    ax.fill_rects(xs[ok] - width / 2, xs[ok] + width / 2,
+                  np.minimum(ao[ok], 0.0), np.maximum(ao[ok], 0.0), colors)
+    return img
+
+
+def raster_stoch(df, timeperiod=14, fastk_period=14, fastd_period=3,
+                 size=STOCH_SIZE, shared_x: bool = False) -> np.ndarray:
+    """%K/%D lines with 80/20 guides as an RGB array; shared_x as for raster_oscillator."""
+    ind = IndicatorFrame.wrap(df)
+    fastk, fastd = ind.stoch_rsi(rsi_period=timeperiod, stoch_period=fastk_period,
+                                 smooth_k=fastd_period)
+    k, d = fastk.to_numpy(float), fastd.to_numpy(float)
+    xs = np.arange(len(k), dtype=float) if shared_x else _date_positions(ind.index)
+
+    # matplotlib autoscale: data and guides, with 5% margins
+    lo = np.nanmin(np.r_[k, d, 20.0])
+    hi = np.nanmax(np.r_[k, d, 80.0])
+    margin = (hi - lo) * 0.05
+    span = (xs[-1] - xs[0]) if len(xs) > 1 else 1.0
+    xlim = (-1, len(xs)) if shared_x else (xs[0] - span * 0.05, xs[-1] + span * 0.05)
+
+    img = _canvas(size, "white")
+    ax = _Axes(img, xlim, (lo - margin, hi + margin))
+    guide = _rgb("C0")
+    ax.hline(80, guide, dash=6)
+    ax.hline(20, guide, dash=6)
+    ax.polyline(xs, k, _rgb("C0"), width=2)
+    ax.polyline(xs, d, _rgb("C1"), width=2)
+    return img
+
+
+def raster_composite(df, size=COMPOSITE_SIZE, panel_ratios=(3, 1.2, 1.2)) -> np.ndarray:
+    """
+    Main, AO and Stoch RSI panels stacked top to bottom in one RGB array,
+    all on the main panel's bar-number x-axis so every bar lines up.
+    panel_ratios: relative panel heights.
+    """
+    ind = IndicatorFrame.wrap(df)
+    width, height = size
+    heights = np.floor(np.asarray(panel_ratios) / sum(panel_ratios) * height).astype(int)
+    heights[0] += height - heights.sum()
+    return np.concatenate([
+        raster_main(ind, size=(width, heights[0])),
+        raster_oscillator(ind, size=(width, heights[1]), shared_x=True),
+        raster_stoch(ind, size=(width, heights[2]), shared_x=True),
+    ])
+
+
+def encode_png(img: np.ndarray) -> bytes:
+    """PNG bytes for an RGB array."""
+    buf = BytesIO()
+    Image.fromarray(img).save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
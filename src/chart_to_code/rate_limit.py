@@ -0,0 +1,227 @@
+# rate_limit.py
+"""
+One request-weight budget for everything that talks to Binance.
+
+Binance limits request weight per IP (REQUEST_WEIGHT per minute), not per
+process, and a klines request costs more the more candles it asks for. The
+app, the bots and the dataset generators each throttling on their own still
+add up to a ban. WeightScheduler is a token bucket over request weight whose
+state lives in a small file guarded by flock, so every process on the machine
+draws from the same bucket.
+
+Priorities: LIVE requests (app, bots) may use the whole bucket; BULK requests
+(dataset generation) leave `bulk_reserve` of it untouched, and hold back
+entirely while a LIVE request is waiting for weight. A 429/418 answer empties
+the bucket for everyone, and Binance's X-MBX-USED-WEIGHT-1M header caps it at
+what the server says is left.
+
+Wrap an exchange to put its fetch_ohlcv (and load_markets) behind the
+scheduler; sync and ccxt.async_support exchanges both work:
+
+    exchange = ScheduledExchange(ccxt.binance(), priority=LIVE)
+    exchange.fetch_ohlcv("BTC/USDT", "1h", limit=100)   # waits for 2 weight first
+"""
+import asyncio
+from contextlib import contextmanager
+import fcntl
+import inspect
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import ccxt
+
+LIVE, BULK = 0, 1
+
+# Binance's REQUEST_WEIGHT limit has been 1200 and 6000 per minute; the lower
+# figure leaves headroom for anything else sharing the IP
+WEIGHT_PER_MINUTE = 1200
+DEFAULT_STATE_PATH = os.path.join(tempfile.gettempdir(), "chart_to_code_binance_weight")
+
+# GET /api/v3/klines weight by `limit` (Binance's default limit is 500)
+_KLINES_WEIGHTS = ((99, 1), (499, 2), (1000, 5))
+_EXCHANGE_INFO_WEIGHT = 20
+
+_RATE_LIMITED = (ccxt.RateLimitExceeded, ccxt.DDoSProtection)
+
+# tokens, last update (Unix s), LIVE waiter deadline (Unix s)
+_STATE = struct.Struct("<ddd")
+
+
+def ohlcv_weight(limit: int | None) -> int:
+    """Request weight of one fetch_ohlcv (klines) call."""
+    limit = 500 if limit is None else limit
+    for max_limit, weight in _KLINES_WEIGHTS:
+        if limit <= max_limit:
+            return weight
+    return 10
+
+
+class WeightScheduler:
+    """
+    Token bucket over Binance request weight, optionally shared across processes.
+
+    weight_per_minute: refill rate; also the bucket size unless `burst` is given.
+    state_path: file holding the bucket state for all processes using it;
+        None keeps the state in this process only.
+    bulk_reserve: fraction of the bucket BULK requests leave for LIVE ones.
+    """
+
+    def __init__(self, weight_per_minute: float = WEIGHT_PER_MINUTE, burst: float | None = None,
+                 state_path: str | None = DEFAULT_STATE_PATH, bulk_reserve: float = 0.25):
+        if weight_per_minute <= 0:
+            raise ValueError("weight_per_minute must be positive")
+        if not 0 <= bulk_reserve < 1:
+            raise ValueError("bulk_reserve must be in [0, 1)")
+        self.rate = weight_per_minute / 60
+        self.capacity = burst or weight_per_minute
+        self.bulk_reserve = bulk_reserve * self.capacity
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._local = [self.capacity, time.time(), 0.0]
+        self.granted = 0
+        self.waited = 0.0
+
+    @contextmanager
+    def _state(self):
+        """The bucket state as a mutable [tokens, updated, live_until], locked."""
+        with self._lock:
+            if self.state_path is None:
+                yield self._local
+                return
+            # opened per use: flock locks belong to the open file, which a
+            # forked child would otherwise share with its parent
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.pread(fd, _STATE.size, 0)
+                state = list(_STATE.unpack(raw)) if len(raw) == _STATE.size \
+                    else [self.capacity, time.time(), 0.0]
+                yield state
+                os.pwrite(fd, _STATE.pack(*state), 0)
+            finally:
+                os.close(fd)
+
+    def _try_acquire(self, cost: float, priority: int) -> float:
+        """Take `cost` weight if allowed; returns 0, or the seconds to wait before retrying."""
+        with self._state() as state:
+            now = time.time()
+            tokens = min(self.capacity, state[0] + max(0.0, now - state[1]) * self.rate)
+            live_until = state[2]
+            reserve = 0.0 if priority == LIVE else self.bulk_reserve
+            # a request larger than the bucket waits for a full bucket instead of forever
+            cost = min(cost, self.capacity - reserve)
+            if priority != LIVE and now < live_until:
+                wait = live_until - now
+            elif tokens - cost >= reserve:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost + reserve - tokens) / self.rate
+                if priority == LIVE:
+                    live_until = max(live_until, now + wait)
+            state[:] = [tokens, now, live_until]
+        return wait
+
+    def acquire(self, cost: float = 1, priority: int = BULK) -> None:
+        """Block until `cost` weight is available at `priority`, then take it."""
+        while (wait := self._try_acquire(cost, priority)) > 0:
+            self.waited += wait
+            time.sleep(min(wait, 1.0))
+        self.granted += 1
+
+    async def acquire_async(self, cost: float = 1, priority: int = BULK) -> None:
+        """acquire for coroutines: waits with asyncio.sleep."""
+        while (wait := self._try_acquire(cost, priority)) > 0:
+            self.waited += wait
+            await asyncio.sleep(min(wait, 1.0))
+        self.granted += 1
+
+    def penalize(self) -> None:
+        """Empty the bucket after a 429/418, so every process backs off."""
+        with self._state() as state:
+            state[:2] = [0.0, time.time()]
+
+    def observe_used_weight(self, used: float) -> None:
+        """Cap the bucket at what the server reports is left of the minute's weight."""
+        with self._state() as state:
+            now = time.time()
+            tokens = min(self.capacity, state[0] + max(0.0, now - state[1]) * self.rate)
+            state[:2] = [min(tokens, max(0.0, self.capacity - used)), now]
+
+    def tokens(self) -> float:
+        """Weight currently available (before any reserve)."""
+        with self._state() as state:
+            return min(self.capacity, state[0] + max(0.0, time.time() - state[1]) * self.rate)
+
+
+_default = None
+
+
+def default_scheduler() -> WeightScheduler:
+    """The process's scheduler on the machine-wide state file."""
+    global _default
+    if _default is None:
+        _default = WeightScheduler()
+    return _default
+
+
+class ScheduledExchange:
+    """
+    A ccxt exchange (sync or async_support) whose fetch_ohlcv and
+    load_markets wait for request weight from `scheduler` first. Every
+    other attribute is the wrapped exchange's.
+    """
+
+    def __init__(self, exchange, scheduler: WeightScheduler | None = None, priority: int = BULK):
+        self._exchange = exchange
+        self.scheduler = scheduler or default_scheduler()
+        self.priority = priority
+        self._async = inspect.iscoroutinefunction(exchange.fetch_ohlcv)
+
+    def __getattr__(self, name):
+        return getattr(self._exchange, name)
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        args = (symbol, timeframe, since, limit, params or {})
+        if self._async:
+            return self._call_async(self._exchange.fetch_ohlcv, ohlcv_weight(limit), args)
+        return self._call(self._exchange.fetch_ohlcv, ohlcv_weight(limit), args)
+
+    def load_markets(self, reload=False, params=None):
+        cost = _EXCHANGE_INFO_WEIGHT if reload or not self._exchange.markets else 0
+        args = (reload, params or {})
+        if self._async:
+            return self._call_async(self._exchange.load_markets, cost, args)
+        return self._call(self._exchange.load_markets, cost, args)
+
+    def _call(self, method, cost, args):
+        if cost:
+            self.scheduler.acquire(cost, self.priority)
+        try:
+            return method(*args)
+        except _RATE_LIMITED:
+            self.scheduler.penalize()
+            raise
+        finally:
+            self._observe()
+
+    async def _call_async(self, method, cost, args):
+        if cost:
+            await self.scheduler.acquire_async(cost, self.priority)
+        try:
+            return await method(*args)
+        except _RATE_LIMITED:
+            self.scheduler.penalize()
+            raise
+        finally:
+            self._observe()
+
+    def _observe(self) -> None:
+        headers = getattr(self._exchange, "last_response_headers", None) or {}
+        for key, value in headers.items():
+            if key.lower() == "x-mbx-used-weight-1m":
+                self.scheduler.observe_used_weight(float(value))
+                return
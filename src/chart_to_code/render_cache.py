@@ -0,0 +1,299 @@
+# render_cache.py
+"""
+Content-addressed cache for rendered chart images.
+
+Entries are keyed by a hash of the OHLC window (timestamps and prices) plus
+the name of the render function and its parameters, so the same candles
+rendered the same way are only drawn once. The in-memory tier is a bounded
+LRU. An optional on-disk tier persists entries across processes and runs; a
+memory miss falls through to it before rendering. It stores images (bytes or
+uint8 arrays, alone or in tuples) as raw bytes behind a short JSON header,
+and drops its least recently used files once it outgrows `disk_bytes`.
+
+    cache = RenderCache(maxsize=256, disk_dir="data/.render_cache", disk_bytes=2**30)
+    plot_main = cache.wrap(plot_main_chart)
+    png = plot_main(df)          # rendered
+    png = plot_main(df.copy())   # hit: same content, same parameters
+    cache.stats()                # {'hits': 1, 'misses': 1, 'hit_rate': 0.5, ...}
+"""
+from collections import OrderedDict
+import functools
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+_KEY_COLUMNS = ["open", "high", "low", "close"]
+_DISK_SUFFIX = ".img"
+# attribute types of a renderer that count as its settings (see RenderCache.wrap)
+_SETTING_TYPES = (str, int, float, bool)
+
+
+def fingerprint(df) -> str:
+    """Hash of the window's timestamps and OHLC values (an IndicatorFrame is unwrapped)."""
+    df = getattr(df, "df", df)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(df.index.asi8).tobytes())
+    h.update(np.ascontiguousarray(df[_KEY_COLUMNS].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+
+def render_key(df, name: str, **params) -> str:
+    """Cache key for rendering `df` with render function `name` and `params`."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(fingerprint(df).encode())
+    h.update(name.encode())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+def _encode(value) -> bytes | None:
+    """
+    Disk form of a render result: a JSON header line describing the parts,
+    then their raw bytes. None for values that are not images or tuples of
+    images (those stay in memory only).
+    """
+    parts = value if isinstance(value, tuple) else (value,)
+    header, payload = [], []
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            header.append({"bytes": len(part)})
+            payload.append(bytes(part))
+        elif isinstance(part, np.ndarray) and part.dtype != object:
+            header.append({"dtype": part.dtype.str, "shape": part.shape})
+            payload.append(np.ascontiguousarray(part).tobytes())
+        else:
+            return None
+    head = json.dumps({"tuple": isinstance(value, tuple), "parts": header}).encode()
+    return b"".join([head, b"\n"] + payload)
+
+
+def _decode(data: bytes):
+    head, _, body = data.partition(b"\n")
+    meta = json.loads(head)
+    parts, offset = [], 0
+    for part in meta["parts"]:
+        if "bytes" in part:
+            n = part["bytes"]
+            parts.append(body[offset:offset + n])
+        else:
+            dtype = np.dtype(part["dtype"])
+            n = dtype.itemsize * int(np.prod(part["shape"]))
+            parts.append(np.frombuffer(body, dtype, offset=offset, count=n // dtype.itemsize)
+                         .reshape(part["shape"]).copy())
+        offset += n
+    if offset != len(body):
+        raise ValueError("truncated cache entry")
+    return tuple(parts) if meta["tuple"] else parts[0]
+
+
+def _settings(fn) -> dict:
+    """
+    Plain public attributes (size, format, style...) of the object whose bound
+    method `fn` is, e.g. a panel renderer; empty for plain functions.
+    """
+    owner = getattr(fn, "__self__", None)
+    if owner is None or inspect.ismodule(owner) or not hasattr(owner, "__dict__"):
+        return {}
+    plain = lambda v: isinstance(v, _SETTING_TYPES) or (
+        isinstance(v, tuple) and all(isinstance(x, _SETTING_TYPES) for x in v))
+    return {k: v for k, v in sorted(vars(owner).items()) if not k.startswith("_") and plain(v)}
+
+
+class RenderCache:
+    """
+    LRU cache of render results with an optional disk tier.
+
+    maxsize: most entries kept in memory.
+    disk_dir: directory for the disk tier (created if missing); None disables it.
+    disk_bytes: size bound of the disk tier. The directory is measured on
+        start and after every 5% of the bound written by this instance; if it
+        is over, the least recently used files are deleted until it is 10%
+        below, so processes sharing disk_dir keep it near the bound together.
+    Thread-safe, so one instance can be shared by the Streamlit sessions.
+    """
+
+    def __init__(self, maxsize: int = 256, disk_dir: str | None = None, disk_bytes: int = 2**30):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if disk_bytes < 1:
+            raise ValueError("disk_bytes must be at least 1")
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._disk_written = 0  # bytes written since the directory was last measured
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries or (self.disk_dir is not None
+                                        and os.path.exists(self._disk_path(key)))
+
+    def get(self, key, default=None):
+        """Cached value for `key` (memory first, then disk), or `default`."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._remember(key, value)
+        self._disk_put(key, value)
+
+    def get_or_render(self, key, render):
+        """Return the cached value for `key`, calling `render()` and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.put(key, value)
+        return value
+
+    def wrap(self, fn, name: str | None = None):
+        """
+        Put a render function (or a renderer's bound .render) behind the cache.
+        The first argument is the OHLC frame; all other arguments, defaults
+        included, become part of the key, and so do a renderer's settings
+        (its plain public attributes: size, format, style...), so renderers
+        built differently never share entries. `name` defaults to the
+        function's qualified name.
+        """
+        name = name or f"{fn.__module__}.{fn.__qualname__}"
+        settings = _settings(fn)
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def cached(df, *args, **kwargs):
+            bound = sig.bind(df, *args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            params.pop(next(iter(sig.parameters)))
+            key = render_key(df, name, settings=settings, **params)
+            return self.get_or_render(key, lambda: fn(df, *args, **kwargs))
+
+        cached.cache = self
+        return cached
+
+    def clear(self) -> None:
+        """Drop the in-memory tier and reset the counters (the disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counts, hit rate and current size, for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "bytes": sum(_nbytes(v) for v in self._entries.values()),
+            }
+        if self.disk_dir is not None:
+            files = self._disk_files()
+            stats["disk_entries"] = len(files)
+            stats["disk_bytes"] = sum(e.stat().st_size for e in files)
+            stats["disk_max_bytes"] = self.disk_bytes
+        return stats
+
+    def _remember(self, key, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key) -> str:
+        return os.path.join(self.disk_dir, key + _DISK_SUFFIX)
+
+    def _disk_files(self) -> list:
+        return [e for e in os.scandir(self.disk_dir) if e.name.endswith(_DISK_SUFFIX)]
+
+    def _disk_get(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = _decode(f.read())
+            os.utime(path)  # recently used: evicted last
+            return value
+        except (FileNotFoundError, ValueError, KeyError):  # gone, cut short or not an entry
+            return None
+
+    def _disk_put(self, key, value) -> None:
+        if self.disk_dir is None:
+            return
+        data = _encode(value)
+        if data is None:
+            return
+        # write-then-rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._disk_path(key))
+        with self._lock:
+            self._disk_written += len(data)
+            check = self._disk_written >= self.disk_bytes // 20
+            if check:
+                self._disk_written = 0
+        if check:
+            self._evict()
+
+    def _evict(self) -> None:
+        """If the disk tier is over disk_bytes, delete its least recently used files until 10% below."""
+        files = []
+        for entry in self._disk_files():
+            try:
+                st = entry.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            files.append((st.st_mtime, st.st_size, entry.path))
+        used = sum(size for _, size, _ in files)
+        if used <= self.disk_bytes:
+            return
+        target = int(self.disk_bytes * 0.9)
+        for _, size, path in sorted(files):
+            if used <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            used -= size
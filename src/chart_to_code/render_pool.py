@@ -0,0 +1,170 @@
+# render_pool.py
+"""
+Render main/AO/RSI panels (or the composite image) for many OHLCV windows
+on a pool of worker processes.
+
+Matplotlib is not thread-safe, so parallelism comes from processes. Every
+worker selects the Agg backend, renders a warm-up frame once and then keeps
+persistent panel renderers (one set per layout key, e.g. timeframe), so the
+per-sample cost is only the data update and PNG encode. The workers start
+when the pool is created, so create it before starting threads that use it.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from chart_to_code.composite_plot import check_image_mode, plot_composite
+from chart_to_code.image_format import check_format
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.main_plot import MainChartRenderer
+from chart_to_code.render_cache import RenderCache, render_key
+from chart_to_code.oscillator_plot import OscillatorRenderer
+from chart_to_code.stock_rsi_plot import StochRSIRenderer
+
+# per-process renderer sets, keyed by the caller's layout key
+_worker_renderers = {}
+# per-process render cache; its disk tier is shared by all workers
+_worker_cache = None
+# per-process exact pixel sizes by image name (see vision_budget.PANEL_SIZES)
+_worker_sizes = {}
+# per-process output format (see image_format)
+_worker_format = "png"
+
+
+def _renderers_for(key):
+    if key not in _worker_renderers:
+        _worker_renderers[key] = (
+            MainChartRenderer(size=_worker_sizes.get("main"), format=_worker_format),
+            OscillatorRenderer(size=_worker_sizes.get("ao"), format=_worker_format),
+            StochRSIRenderer(size=_worker_sizes.get("rsi"), format=_worker_format),
+        )
+    return _worker_renderers[key]
+
+
+def _warmup_frame(n: int = 100) -> pd.DataFrame:
+    close = 100 + np.cumsum(np.sin(np.arange(n) / 5))
+    return pd.DataFrame(
+        {"open": close, "high": close + 1, "low": close - 1, "close": close, "volume": 1.0},
+        index=pd.date_range("2024-01-01", periods=n, freq="h"),
+    )
+
+
+def _init_worker(cache_dir=None, sizes=None, format="png", cache_bytes=2**30) -> None:
+    global _worker_cache, _worker_sizes, _worker_format
+    _worker_sizes = dict(sizes or {})
+    _worker_format = format
+    if cache_dir is not None:
+        _worker_cache = RenderCache(maxsize=64, disk_dir=cache_dir, disk_bytes=cache_bytes)
+    matplotlib.use("Agg")
+    # first figure in a process pays for font and backend setup; do it up front
+    render_panels(_warmup_frame(), key=None)
+
+
+def render_panels(df, key=None) -> tuple:
+    """Render (main, ao, rsi) images for one window with this process's renderers."""
+    ind = IndicatorFrame.wrap(df)
+    main_r, ao_r, rsi_r = _renderers_for(key)
+    main_img = main_r.render(ind)
+    ao_img = ao_r.render(ind)
+    rsi_img, _, _ = rsi_r.render(ind)
+    return main_img, ao_img, rsi_img
+
+
+def render_images(df, key=None, mode="panels") -> tuple:
+    """Images for one sample: (main, ao, rsi) for "panels", (composite,) for "composite"."""
+    if _worker_cache is not None:
+        return _worker_cache.get_or_render(
+            render_key(df, f"render_pool.{mode}", sizes=sorted(_worker_sizes.items()),
+                       format=_worker_format), lambda: _render_uncached(df, key, mode))
+    return _render_uncached(df, key, mode)
+
+
+def _render_uncached(df, key, mode):
+    if mode == "composite":
+        return (plot_composite(df, size=_worker_sizes.get("composite"), format=_worker_format),)
+    return render_panels(df, key)
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _render_job(job):
+    df, key, mode = job
+    return render_images(df, key, mode)
+
+
+class PanelRenderPool:
+    """
+    Process pool that turns OHLCV windows into images: (main, ao, rsi) per
+    window, or a 1-tuple with the stacked image when mode="composite".
+
+    workers: number of processes (default: os.cpu_count()).
+    chunksize: windows sent to a worker per task; larger amortizes pickling.
+    cache_dir: optional on-disk render cache shared by the workers, so windows
+        rendered by an earlier run are read back instead of drawn again.
+    cache_bytes: size bound of that cache (see RenderCache's disk_bytes).
+    sizes: exact pixel sizes by image name ("main", "ao", "rsi", "composite"),
+        e.g. vision_budget.PANEL_SIZES; images not listed keep their native size.
+    format: image format, see image_format.FORMATS (default PNG bytes).
+    mp_context: multiprocessing context; defaults to fork where available, since
+        the generator scripts run at import time and have no __main__ guard.
+        Every worker is started (and warmed up) in the constructor, so the
+        forks happen in the thread that creates the pool, not in whichever
+        thread submits first.
+    """
+
+    def __init__(self, workers: int | None = None, chunksize: int = 4, mp_context=None,
+                 mode: str = "panels", cache_dir: str | None = None, sizes: dict | None = None,
+                 format: str = "png", cache_bytes: int = 2**30):
+        check_image_mode(mode)
+        check_format(format)
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        if mp_context is None and "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker,
+            initargs=(cache_dir, sizes, format, cache_bytes), mp_context=mp_context,
+        )
+        # a fork from a thread running next to others (e.g. a pipeline render
+        # stage) copies whatever locks those threads hold at that moment
+        for future in [self._executor.submit(_worker_pid) for _ in range(self.workers)]:
+            future.result()
+
+    def imap(self, frames, keys=None):
+        """Yield image tuples for `frames` in input order."""
+        frames = list(frames)
+        keys = [None] * len(frames) if keys is None else list(keys)
+        if len(keys) != len(frames):
+            raise ValueError("keys must have one entry per frame")
+        # only the OHLC columns travel to the workers
+        jobs = [(_plain_frame(df), key, self.mode) for df, key in zip(frames, keys)]
+        return self._executor.map(_render_job, jobs, chunksize=self.chunksize)
+
+    def submit(self, df, key=None):
+        """Future of one frame's image tuple (for callers feeding the pool from several threads)."""
+        return self._executor.submit(_render_job, (_plain_frame(df), key, self.mode))
+
+    def render(self, frames, keys=None) -> list[tuple]:
+        """Render all frames and return the image tuples in input order."""
+        return list(self.imap(frames, keys))
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _plain_frame(df) -> pd.DataFrame:
+    df = getattr(df, "df", df)  # unwrap an IndicatorFrame; its cache stays local
+    return df[["open", "high", "low", "close"]]
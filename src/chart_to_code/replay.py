@@ -0,0 +1,285 @@
+# replay.py
+"""
+Recorded candles served over the ccxt exchange interface.
+
+ReplayExchange (sync, like ccxt.binance) and AsyncReplayExchange (like
+ccxt.async_support.binance) answer load_markets, fetch_ohlcv, market orders
+and fetch_balance from an OHLCVStore instead of Binance, so the generators,
+TrendBot and the app run, and can be load-tested, with no network:
+
+  - time comes from a ReplayClock: it starts at `start_ms` (by default
+    halfway through the period every recorded series covers, leaving history
+    behind it and candles ahead of it) and runs `speed` times faster than the
+    wall clock; speed=0 freezes it, and advance() steps it, for fully
+    deterministic runs
+  - fetch_ohlcv returns only candles that have opened by the replay time;
+    the candle still forming then is served with its recorded final values
+  - latency (seconds, or a (low, high) range) and error_rate (fraction of
+    requests failing with ccxt.RequestTimeout) are injected per request,
+    drawn from a seeded RNG
+  - market orders fill at once at the last close and move a paper balance
+
+Record a store to replay by running anything that syncs one (the app, the
+bots and the generators fill data/ohlcv/<exchange id>), or with
+
+    python -m chart_to_code.replay data/replay --symbols BTC/USDT,ETH/USDT --timeframes 1h --bars 5000
+
+(--stub records StubExchange candles, for machines with no network at all).
+A replayed component's own candle store (OHLCVStore.for_exchange) is kept
+apart from its live one, per recording, so replayed history never
+overwrites live candles.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import ccxt
+import numpy as np
+
+from chart_to_code.ohlcv_store import OHLCVStore
+from chart_to_code.rate_limit import BULK, ScheduledExchange
+from chart_to_code.resample import OHLCV_COLUMNS, timeframe_seconds
+
+
+class ReplayClock:
+    """Exchange time running `speed` times faster than the wall clock from `start_ms`."""
+
+    def __init__(self, start_ms: int, speed: float = 1.0):
+        if speed < 0:
+            raise ValueError("speed must not be negative")
+        self.start_ms = int(start_ms)
+        self.speed = speed
+        self._t0 = time.monotonic()
+        self._offset = 0
+
+    def milliseconds(self) -> int:
+        return self.start_ms + self._offset + int((time.monotonic() - self._t0) * self.speed * 1000)
+
+    def advance(self, ms: int) -> None:
+        """Step the clock forward by `ms` on top of its running time."""
+        self._offset += int(ms)
+
+
+class _ReplayBase:
+    """
+    Store access, clock, fault injection and paper fills shared by both variants.
+
+    store: OHLCVStore the candles are served from.
+    clock: a ReplayClock; by default one from the default start running at `speed`.
+    latency: seconds per request, or a (low, high) range drawn per request.
+    error_rate: fraction of requests that fail with ccxt.RequestTimeout.
+    seed: seeds the latency and error draws.
+    balance: starting paper balance, {currency: amount}.
+    """
+
+    id = "replay"
+
+    def __init__(self, store: OHLCVStore, clock: ReplayClock | None = None, speed: float = 1.0,
+                 latency=0.0, error_rate: float = 0.0, seed: int = 0, rate_limit: float = 50,
+                 balance: dict | None = None):
+        self.store = store
+        self.clock = clock or ReplayClock(self._default_start(), speed)
+        self.rateLimit = rate_limit
+        self.enableRateLimit = False
+        self.latency = latency
+        self.error_rate = error_rate
+        self.markets = None
+        self.symbols = []
+        self.last_response_headers = {}
+        self.balance = dict(balance or {"USDT": 10_000.0})
+        self.orders = []
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    @property
+    def store_key(self) -> str:
+        """Directory name for OHLCVStore.for_exchange: the exchange id and the recording's name."""
+        return f"{self.id}-{os.path.basename(os.path.normpath(self.store.root))}"
+
+    def _default_start(self) -> int:
+        spans = [self.store.timestamps(s, tf) for s, tf in self.store.series()]
+        spans = [ts for ts in spans if len(ts)]
+        if not spans:
+            raise ValueError(f"No candles recorded in {self.store.root}")
+        first, last = max(int(ts[0]) for ts in spans), min(int(ts[-1]) for ts in spans)
+        return (first + last) // 2 if first < last else last
+
+    def milliseconds(self) -> int:
+        return self.clock.milliseconds()
+
+    def parse_timeframe(self, timeframe: str) -> int:
+        return timeframe_seconds(timeframe)
+
+    def _load_markets(self) -> dict:
+        markets = {}
+        for symbol, timeframe in self.store.series():
+            base, quote = symbol.split("/")
+            market = markets.setdefault(symbol, {
+                "id": base + quote, "symbol": symbol, "base": base, "quote": quote,
+                "active": True, "timeframes": [],
+            })
+            market["timeframes"].append(timeframe)
+        self.markets = markets
+        self.symbols = sorted(markets)
+        return markets
+
+    def _delay(self) -> float:
+        if isinstance(self.latency, (tuple, list)):
+            return self._rng.uniform(*self.latency)
+        return self.latency
+
+    def _begin(self) -> tuple[float, bool]:
+        """Count a request; returns (delay, fail) drawn for it."""
+        self.calls += 1
+        return self._delay(), self._rng.random() < self.error_rate
+
+    def _ohlcv(self, symbol, timeframe, since, limit) -> list:
+        ts = self.store.timestamps(symbol, timeframe)
+        if not len(ts):
+            raise ccxt.BadSymbol(f"replay: no {symbol} {timeframe} candles recorded")
+        limit = limit or 500
+        stop = int(np.searchsorted(ts, self.milliseconds(), side="right"))
+        if since is None:
+            start = max(0, stop - limit)
+        else:
+            start = int(np.searchsorted(ts, since, side="left"))
+            stop = max(start, min(stop, start + limit))
+        window = self.store.table(symbol, timeframe).slice(start, stop - start)
+        return [list(row) for row in zip(*(window.column(c).to_pylist() for c in OHLCV_COLUMNS))]
+
+    def _last_price(self, symbol) -> float:
+        # the shortest recorded timeframe has the most recent close
+        timeframes = sorted((tf for s, tf in self.store.series() if s == symbol), key=timeframe_seconds)
+        if not timeframes:
+            raise ccxt.BadSymbol(f"replay: no {symbol} candles recorded")
+        return self._ohlcv(symbol, timeframes[0], None, 1)[-1][4]
+
+    def _fill(self, symbol, type, side, amount) -> dict:
+        if type != "market":
+            raise ccxt.NotSupported("replay: only market orders are supported")
+        price = self._last_price(symbol)
+        base, quote = symbol.split("/")
+        sign = 1 if side == "buy" else -1
+        self.balance[base] = self.balance.get(base, 0.0) + sign * amount
+        self.balance[quote] = self.balance.get(quote, 0.0) - sign * amount * price
+        now = self.milliseconds()
+        order = {
+            "id": str(len(self.orders) + 1), "symbol": symbol, "type": type, "side": side,
+            "amount": amount, "filled": amount, "remaining": 0.0, "price": price,
+            "average": price, "cost": amount * price, "status": "closed",
+            "timestamp": now, "datetime": ccxt.Exchange.iso8601(now),
+        }
+        self.orders.append(order)
+        return order
+
+    def _balance(self) -> dict:
+        out = {"free": dict(self.balance), "used": {c: 0.0 for c in self.balance},
+               "total": dict(self.balance)}
+        out.update({c: {"free": v, "used": 0.0, "total": v} for c, v in self.balance.items()})
+        return out
+
+
+class ReplayExchange(_ReplayBase):
+    """Synchronous replay exchange (ccxt.binance's interface)."""
+
+    def _request(self, what: str) -> None:
+        delay, fail = self._begin()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ccxt.RequestTimeout(f"replay {what}: injected timeout")
+
+    def load_markets(self, reload=False, params=None) -> dict:
+        if self.markets is None or reload:
+            self._load_markets()
+        return self.markets
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None) -> list:
+        self._request(f"{symbol} {timeframe}")
+        return self._ohlcv(symbol, timeframe, since, limit)
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None) -> dict:
+        self._request(f"{side} {symbol}")
+        return self._fill(symbol, type, side, amount)
+
+    def create_market_buy_order(self, symbol, amount, params=None) -> dict:
+        return self.create_order(symbol, "market", "buy", amount)
+
+    def create_market_sell_order(self, symbol, amount, params=None) -> dict:
+        return self.create_order(symbol, "market", "sell", amount)
+
+    def fetch_balance(self, params=None) -> dict:
+        self._request("balance")
+        return self._balance()
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncReplayExchange(_ReplayBase):
+    """Async replay exchange (ccxt.async_support.binance's interface)."""
+
+    async def _request(self, what: str) -> None:
+        delay, fail = self._begin()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise ccxt.RequestTimeout(f"replay {what}: injected timeout")
+
+    async def load_markets(self, reload=False, params=None) -> dict:
+        if self.markets is None or reload:
+            self._load_markets()
+        return self.markets
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None) -> list:
+        await self._request(f"{symbol} {timeframe}")
+        return self._ohlcv(symbol, timeframe, since, limit)
+
+    async def create_order(self, symbol, type, side, amount, price=None, params=None) -> dict:
+        await self._request(f"{side} {symbol}")
+        return self._fill(symbol, type, side, amount)
+
+    async def create_market_buy_order(self, symbol, amount, params=None) -> dict:
+        return await self.create_order(symbol, "market", "buy", amount)
+
+    async def create_market_sell_order(self, symbol, amount, params=None) -> dict:
+        return await self.create_order(symbol, "market", "sell", amount)
+
+    async def fetch_balance(self, params=None) -> dict:
+        await self._request("balance")
+        return self._balance()
+
+    async def close(self) -> None:
+        pass
+
+
+def _record(root, symbols, timeframes, bars, stub=False) -> None:
+    store = OHLCVStore(root)
+    if stub:
+        from chart_to_code.async_fetch import StubExchange
+
+        async def record():
+            exchange = StubExchange(rate_limit=0, latency=0.0)
+            await asyncio.gather(*(store.async_sync(exchange, s, tf, bars)
+                                   for s in symbols for tf in timeframes))
+        asyncio.run(record())
+    else:
+        exchange = ScheduledExchange(ccxt.binance(), priority=BULK)
+        for symbol in symbols:
+            for timeframe in timeframes:
+                store.sync(exchange, symbol, timeframe, bars)
+    for symbol, timeframe in store.series():
+        print(f"{symbol:12s} {timeframe:4s} {len(store.timestamps(symbol, timeframe)):7d} candles")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record candles into a store for ReplayExchange")
+    parser.add_argument("root")
+    parser.add_argument("--symbols", default="BTC/USDT,ETH/USDT")
+    parser.add_argument("--timeframes", default="1h")
+    parser.add_argument("--bars", type=int, default=5000)
+    parser.add_argument("--stub", action="store_true", help="record synthetic StubExchange candles")
+    args = parser.parse_args()
+    _record(args.root, args.symbols.split(","), args.timeframes.split(","), args.bars, args.stub)
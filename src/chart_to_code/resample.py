@@ -0,0 +1,185 @@
+# resample.py
+"""
+Build higher-timeframe candles locally from one base-timeframe history.
+
+Buckets are aligned the way Binance aligns its klines: intraday and daily
+intervals are counted from the Unix epoch (UTC), weeks start on Monday and
+months on the 1st. The output has the same shape as the DataFrames built from
+exchange.fetch_ohlcv everywhere else in the repo: a datetime index named "ts"
+and open/high/low/close/volume columns.
+
+ccxt rows enter through ohlcv_arrays/ohlcv_frame: one pass into int64
+timestamps and a single (5, n) float block that the DataFrame's columns view
+without a further copy.
+"""
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ["ts", "open", "high", "low", "close", "volume"]
+
+_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# Binance weeks open on Monday 00:00 UTC; the epoch was a Thursday
+_WEEK_ORIGIN = pd.Timestamp("1970-01-05")
+
+
+def timeframe_seconds(timeframe: str) -> int:
+    """Length of a ccxt timeframe string such as '4h' or '1d', in seconds."""
+    amount, unit = int(timeframe[:-1]), timeframe[-1]
+    if unit == "M":
+        return amount * 30 * 86400  # nominal; month buckets are calendar based
+    if unit not in _UNIT_SECONDS:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return amount * _UNIT_SECONDS[unit]
+
+
+def candle_close(timeframe: str, ts_ms: int) -> int:
+    """Close time (Unix ms) of the `timeframe` candle containing `ts_ms`, Binance-aligned."""
+    amount, unit = int(timeframe[:-1]), timeframe[-1]
+    if unit == "M":
+        period = pd.Timestamp(ts_ms, unit="ms").to_period("M")
+        return int((period + amount).start_time.value // 1_000_000)
+    step = timeframe_seconds(timeframe) * 1000
+    origin = _WEEK_ORIGIN.value // 1_000_000 if unit == "w" else 0
+    return (ts_ms - origin) // step * step + step + origin
+
+
+def ohlcv_arrays(rows, dtype=np.float64) -> tuple[np.ndarray, np.ndarray]:
+    """
+    ccxt fetch_ohlcv rows as (ts, values): int64 Unix-ms timestamps and a
+    (5, n) open/high/low/close/volume block of `dtype` (float64, or float32
+    for half the memory), one contiguous row per column. The rows are parsed
+    in a single pass; duplicate timestamps keep their first row, and None
+    values (ccxt's volume on some markets and forming candles) become NaN.
+    """
+    n = len(rows)
+    try:
+        flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.float64, count=n * 6)
+    except TypeError:
+        flat = np.fromiter((math.nan if v is None else v for v in itertools.chain.from_iterable(rows)),
+                           dtype=np.float64, count=n * 6)
+    flat = flat.reshape(n, 6)
+    ts = flat[:, 0].astype(np.int64)
+    values = np.empty((5, n), dtype=dtype)
+    values[...] = flat[:, 1:].T
+    if n > 1 and not (np.diff(ts) > 0).all():
+        keep = np.sort(np.unique(ts, return_index=True)[1])
+        ts, values = ts[keep], np.ascontiguousarray(values[:, keep])
+    return ts, values
+
+
+def frame_from_arrays(ts: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+    """
+    The ohlcv_frame DataFrame over `ts` and a (5, n) `values` block from
+    ohlcv_arrays, without copying either: the columns are views of `values`,
+    so the indicator and plot code read the same memory.
+    """
+    index = pd.DatetimeIndex(np.asarray(ts, dtype=np.int64).view("datetime64[ms]"),
+                             name="ts", copy=False)
+    return pd.DataFrame(values.T, index=index, columns=OHLCV_COLUMNS[1:], copy=False)
+
+
+def ohlcv_frame(rows, dtype=np.float64) -> pd.DataFrame:
+    """DataFrame indexed by "ts" from ccxt fetch_ohlcv rows (duplicate timestamps dropped)."""
+    return frame_from_arrays(*ohlcv_arrays(rows, dtype))
+
+
+def _resample_kwargs(timeframe: str) -> dict:
+    amount, unit = int(timeframe[:-1]), timeframe[-1]
+    if unit == "M":
+        return {"rule": f"{amount}MS"}
+    origin = _WEEK_ORIGIN if unit == "w" else "epoch"
+    return {"rule": f"{timeframe_seconds(timeframe)}s", "origin": origin}
+
+
+def resample_ohlcv(
+    df: pd.DataFrame,
+    timeframe: str,
+    base_timeframe: str = "1h",
+    limit: int | None = None,
+) -> pd.DataFrame:
+    """
+    Aggregate a base-timeframe OHLCV frame into `timeframe` candles.
+
+    A leading bucket that the base history only partly covers is dropped, since
+    its open/high/low would differ from the exchange's. The trailing bucket is
+    kept even if incomplete, like the still-forming candle fetch_ohlcv returns.
+    limit keeps only the newest `limit` candles.
+    """
+    if timeframe_seconds(timeframe) < timeframe_seconds(base_timeframe):
+        raise ValueError(f"Cannot build {timeframe} candles from {base_timeframe} candles")
+    if df.empty:
+        return df.iloc[:0]
+
+    resampler = df.resample(**_resample_kwargs(timeframe), label="left", closed="left")
+    out = resampler.agg({
+        "open": "first",
+        "high": "max",
+        "low": "min",
+        "close": "last",
+        "volume": "sum",
+    })
+    # buckets with no base candles at all (exchange downtime) don't exist upstream
+    counts = resampler["close"].count()
+    out = out[counts > 0]
+
+    first_bucket = out.index[0]
+    if df.index[0] > first_bucket:
+        out = out.iloc[1:]
+
+    out.index.name = "ts"
+    if limit is not None:
+        out = out.iloc[-limit:]
+    return out
+
+
+def fetch_history(exchange, symbol: str, timeframe: str, bars: int,
+                  page_limit: int = 1000) -> pd.DataFrame:
+    """
+    Fetch the newest `bars` candles of one timeframe, paging backwards
+    with `since` when more than one request is needed.
+    """
+    step_ms = timeframe_seconds(timeframe) * 1000
+    now_ms = exchange.milliseconds()
+    since = (now_ms // step_ms - bars + 1) * step_ms
+
+    rows = []
+    while since <= now_ms and len(rows) < bars:
+        page = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=page_limit)
+        if not page:
+            break
+        rows.extend(page)
+        since = page[-1][0] + step_ms
+
+    return ohlcv_frame(rows).iloc[-bars:]
+
+
+def fetch_timeframes(exchange, symbol: str, timeframes: list[str], limit: int = 100,
+                     base_timeframe: str = "1h") -> dict[str, pd.DataFrame]:
+    """
+    One base-timeframe history for a symbol, resampled into every requested
+    timeframe. Returns {timeframe: DataFrame of the newest `limit` candles}.
+    """
+    bars = base_bars(timeframes, limit, base_timeframe)
+    base = fetch_history(exchange, symbol, base_timeframe, bars)
+    return split_timeframes(base, timeframes, limit, base_timeframe)
+
+
+def base_bars(timeframes: list[str], limit: int, base_timeframe: str = "1h") -> int:
+    """Base candles needed for `limit` candles of the longest of `timeframes`."""
+    # plus one bucket of slack for the partial leading bucket that gets dropped
+    longest = max(timeframe_seconds(tf) for tf in timeframes)
+    return (limit + 1) * longest // timeframe_seconds(base_timeframe)
+
+
+def split_timeframes(base: pd.DataFrame, timeframes: list[str], limit: int,
+                     base_timeframe: str = "1h") -> dict[str, pd.DataFrame]:
+    """{timeframe: newest `limit` candles} resampled from one base history."""
+    return {
+        tf: base.iloc[-limit:] if tf == base_timeframe
+        else resample_ohlcv(base, tf, base_timeframe, limit=limit)
+        for tf in timeframes
+    }
@@ -0,0 +1,119 @@
+# rolling.py
+"""
+Rolling-window kernels on float arrays.
+
+These mirror the pandas Series.rolling(...).mean()/min()/max() and
+Series.ewm(alpha=..., adjust=False).mean() calls used by the rule engine,
+including NaN handling and min_periods, without building intermediate
+Series. They work along the last axis, so a (symbols, bars) array is
+handled in one call.
+"""
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def rolling_mean(x, window: int, min_periods: int | None = None) -> np.ndarray:
+    """
+    Rolling mean along the last axis from a running sum, skipping NaNs like
+    pandas. min_periods defaults to window.
+    """
+    x = np.asarray(x, dtype=float)
+    min_periods = window if min_periods is None else min_periods
+    valid = ~np.isnan(x)
+
+    # running sums of values and of valid-value counts, windowed by differencing
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=-1)
+    ccount = np.cumsum(valid, axis=-1)
+    total = csum.copy()
+    count = ccount.copy()
+    total[..., window:] -= csum[..., :-window]
+    count[..., window:] -= ccount[..., :-window]
+
+    out = np.full(x.shape, np.nan)
+    ok = (count >= max(min_periods, 1))
+    out[ok] = total[ok] / count[ok]
+    return out
+
+
+def _rolling_extreme(x, window: int, min_periods: int | None, sign: float) -> np.ndarray:
+    """
+    Monotonic-deque rolling minimum of sign * x (so sign=-1 gives the maximum).
+    Each value enters and leaves the deque once, so this is O(n) in the array
+    length regardless of window.
+    """
+    arr = np.asarray(x, dtype=float)
+    values = (arr if sign > 0 else -arr).tolist()
+    min_periods = max(window if min_periods is None else min_periods, 1)
+    out = [np.nan] * len(values)
+    dq = deque()  # indices of candidate minima, values increasing front to back
+    count = 0     # non-NaN values inside the window
+
+    for i, v in enumerate(values):
+        j = i - window
+        if j >= 0:
+            if values[j] == values[j]:
+                count -= 1
+            if dq and dq[0] == j:
+                dq.popleft()
+        if v == v:
+            count += 1
+            while dq and values[dq[-1]] >= v:
+                dq.pop()
+            dq.append(i)
+            if count >= min_periods:
+                out[i] = values[dq[0]]
+        elif dq and count >= min_periods:
+            out[i] = values[dq[0]]
+    result = np.array(out)
+    return result if sign > 0 else -result
+
+
+def _rolling_extreme_nd(x: np.ndarray, window: int, min_periods: int | None, reduce) -> np.ndarray:
+    """
+    Rolling fmin/fmax over NaN-padded trailing windows along the last axis,
+    for arrays with leading axes (the deque runs one row at a time).
+    """
+    min_periods = max(window if min_periods is None else min_periods, 1)
+    pad = np.full(x.shape[:-1] + (window - 1,), np.nan)
+    views = sliding_window_view(np.concatenate([pad, x], axis=-1), window, axis=-1)
+    # fmin/fmax skip NaN; all-NaN windows stay NaN
+    out = reduce.reduce(views, axis=-1)
+    out[(~np.isnan(views)).sum(axis=-1) < min_periods] = np.nan
+    return out
+
+
+def rolling_min(x, window: int, min_periods: int | None = None) -> np.ndarray:
+    """Rolling minimum along the last axis, skipping NaNs like pandas. min_periods defaults to window."""
+    x = np.asarray(x, dtype=float)
+    if x.ndim > 1:
+        return _rolling_extreme_nd(x, window, min_periods, np.fmin)
+    return _rolling_extreme(x, window, min_periods, 1.0)
+
+
+def rolling_max(x, window: int, min_periods: int | None = None) -> np.ndarray:
+    """Rolling maximum along the last axis, skipping NaNs like pandas. min_periods defaults to window."""
+    x = np.asarray(x, dtype=float)
+    if x.ndim > 1:
+        return _rolling_extreme_nd(x, window, min_periods, np.fmax)
+    return _rolling_extreme(x, window, min_periods, -1.0)
+
+
+def ewm_mean(x, alpha: float) -> np.ndarray:
+    """
+    Exponential mean along the last axis, matching
+    Series.ewm(alpha=alpha, adjust=False).mean() bit for bit on NaN-free input.
+    """
+    x = np.asarray(x, dtype=float)
+    out = np.empty_like(x)
+    w = x[..., 0].copy()
+    out[..., 0] = w
+    old_wt = 1.0 - alpha
+    # pandas divides by (old_wt + new_wt), which is not always exactly 1.0
+    denom = old_wt + alpha
+    for t in range(1, x.shape[-1]):
+        cur = x[..., t]
+        w = np.where(w != cur, (old_wt * w + alpha * cur) / denom, w)
+        out[..., t] = w
+    return out
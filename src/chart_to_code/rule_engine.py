@@ -1,6 +1,11 @@
 # rule_engine.py
 import random
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.rolling import ewm_mean, rolling_mean, rolling_min, rolling_max
 
 def compute_rsi(series: pd.Series, period: int) -> pd.Series:
     delta = series.diff()
@@ -28,6 +33,59 @@ def compute_stoch_rsi(
     fastd = fastk.rolling(window=smooth_k, min_periods=1).mean()
     return fastk, fastd
 
+def _rsi_array(close: np.ndarray, period: int) -> np.ndarray:
+    """compute_rsi along the last axis of a float array."""
+    delta = np.diff(close, axis=-1, prepend=np.nan)
+    # NaN first delta becomes a 0.0 gain/loss, as with Series.where
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = rolling_mean(gain, period) / rolling_mean(loss, period)
+        return 100 - (100 / (1 + rs))
+
+
+def _stoch_rsi_arrays(
+    close: np.ndarray,
+    rsi_period: int = 14,
+    stoch_period: int = 14,
+    smooth_k: int = 3,
+) -> tuple[np.ndarray, np.ndarray]:
+    """compute_stoch_rsi along the last axis of a float array."""
+    rsi = _rsi_array(close, rsi_period)
+    rsi_min = rolling_min(rsi, stoch_period, min_periods=1)
+    rsi_max = rolling_max(rsi, stoch_period, min_periods=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fastk = (rsi - rsi_min) / (rsi_max - rsi_min) * 100
+    fastd = rolling_mean(fastk, smooth_k, min_periods=1)
+    return fastk, fastd
+
+
+def compute_rsi_fast(series, period: int):
+    """
+    Drop-in for compute_rsi built on the NumPy rolling kernels.
+    Accepts a Series (returns a Series with the same index) or an array.
+    """
+    rsi = _rsi_array(np.asarray(series, dtype=float), period)
+    if isinstance(series, pd.Series):
+        return pd.Series(rsi, index=series.index)
+    return rsi
+
+
+def compute_stoch_rsi_fast(
+    close,
+    rsi_period: int = 14,
+    stoch_period: int = 14,
+    smooth_k: int = 3,
+):
+    """
+    Drop-in for compute_stoch_rsi built on the NumPy rolling kernels.
+    Accepts a Series (returns two Series with the same index) or an array.
+    """
+    fastk, fastd = _stoch_rsi_arrays(np.asarray(close, dtype=float), rsi_period, stoch_period, smooth_k)
+    if isinstance(close, pd.Series):
+        return pd.Series(fastk, index=close.index), pd.Series(fastd, index=close.index)
+    return fastk, fastd
+
 # Templates for phrasing
 trend_positive = [
     "Price is above the moving averages (bullish trend).",
@@ -122,26 +180,27 @@ rsi_high = [
 ]
 
 def evaluate_chart_logic(df):
-    close = df['close']
+    """
+    Label the last bar of df, a DataFrame or an IndicatorFrame whose
+    cached indicators are reused.
+    """
+    ind = IndicatorFrame.wrap(df)
+    close = ind.close
     latest_close = close.iloc[-1]
 
     # moving averages / trend (unchanged)
-    ema13 = close.ewm(span=13, adjust=False).mean()
-    ema21 = close.ewm(span=21, adjust=False).mean()
-    smma14 = close.ewm(alpha=1/14, adjust=False).mean()
-    trend = (ema13.iloc[-1] + ema21.iloc[-1] + smma14.iloc[-1]) / 3
+    trend = (ind.ema13.iloc[-1] + ind.ema21.iloc[-1] + ind.smma14.iloc[-1]) / 3
 
     price_above_trend = latest_close > trend
     price_above_trend_by_3 = (latest_close - trend) / trend >= 0.03
 
     # Awesome Oscillator (unchanged)
-    median_price = (df['high'] + df['low']) / 2
-    ao_series = median_price.rolling(window=5).mean() - median_price.rolling(window=34).mean()
+    ao_series = ind.awesome_oscillator(5, 34)
     ao_latest = ao_series.iloc[-1]
     ao_positive_flag = ao_latest > 0
 
     # *** Stoch RSI ***
-    fastk, fastd = compute_stoch_rsi(close, rsi_period=14, stoch_period=14, smooth_k=3)
+    fastk, fastd = ind.stoch_rsi(rsi_period=14, stoch_period=14, smooth_k=3)
     k = fastk.iloc[-1]
     d = fastd.iloc[-1]
 
@@ -194,3 +253,184 @@ def evaluate_chart_logic(df):
     }
 
     return label, reasons, debug
+
+
+# ─── Batch evaluation (symbols × bars) ────────────────────────────────────────
+# The batch API returns integer reason indices instead of strings, so every
+# phrase the rule engine can emit lives in one flat table.
+_FIXED_REASONS = [
+    'Price is significantly extended above trend (>3%).',
+    'Both trend and momentum indicate weakness.',
+    'Only partial alignment between price and momentum.',
+    'Unclear signal based on chart data.',
+]
+REASON_TEXTS = (
+    trend_positive + trend_negative + ao_positive_texts + ao_negative_texts
+    + rsi_reset + rsi_normal + rsi_high + _FIXED_REASONS
+)
+
+# (offset, size) of each phrase pool inside REASON_TEXTS; size 0 = unused slot
+_POOLS = {}
+_offset = 0
+for _name, _pool in [
+    ('trend_positive', trend_positive), ('trend_negative', trend_negative),
+    ('ao_positive', ao_positive_texts), ('ao_negative', ao_negative_texts),
+    ('rsi_reset', rsi_reset), ('rsi_normal', rsi_normal), ('rsi_high', rsi_high),
+    ('extended', _FIXED_REASONS[:1]), ('weakness', _FIXED_REASONS[1:2]),
+    ('partial', _FIXED_REASONS[2:3]), ('unclear', _FIXED_REASONS[3:4]),
+]:
+    _POOLS[_name] = (_offset, len(_pool))
+    _offset += len(_pool)
+_POOLS['none'] = (-1, 0)
+del _offset, _name, _pool
+
+# label per rule branch, in the order evaluate_chart_logic tests them
+_BRANCH_LABELS = np.array([
+    'Sell Signal', 'Possible Buy Entry', 'Bullish', 'Bearish',
+    'Inconclusive', 'Inconclusive',
+])
+
+
+def _last_bar_inputs(high, low, close):
+    """
+    Rule-engine inputs for the last bar of each row of (..., bars) arrays:
+    close, trend, AO, %K and %D, each with the leading shape.
+    """
+    latest_close = close[..., -1]
+
+    # moving averages / trend
+    ema13 = ewm_mean(close, 2 / 14)[..., -1]
+    ema21 = ewm_mean(close, 2 / 22)[..., -1]
+    smma14 = ewm_mean(close, 1 / 14)[..., -1]
+    trend = (ema13 + ema21 + smma14) / 3
+
+    # Awesome Oscillator
+    median_price = (high + low) / 2
+    ao_latest = rolling_mean(median_price, 5)[..., -1] - rolling_mean(median_price, 34)[..., -1]
+
+    # Stoch RSI
+    fastk, fastd = _stoch_rsi_arrays(close, rsi_period=14, stoch_period=14, smooth_k=3)
+    return latest_close, trend, ao_latest, fastk[..., -1], fastd[..., -1]
+
+
+def _rule_branch(latest_close, trend, ao_latest, k, d):
+    """
+    Index of the evaluate_chart_logic branch taken for each element
+    (see _BRANCH_LABELS), plus the price-above-trend and AO-positive flags.
+    """
+    above = latest_close > trend
+    above_by_3 = (latest_close - trend) / trend >= 0.03
+    ao_pos = ao_latest > 0
+
+    with np.errstate(invalid='ignore'):
+        branch = np.select(
+            [
+                above & above_by_3 & (k > 80) & (d > 80),
+                above & ao_pos & (k <= 25) & (d <= 25),
+                above & ao_pos & (k < 75) & (d < 75),
+                ~above & ~ao_pos,
+                ~above | ~ao_pos,
+            ],
+            [0, 1, 2, 3, 4],
+            default=5,
+        )
+    return branch, above, ao_pos
+
+
+def evaluate_chart_logic_batch(high, low, close, rng=None):
+    """
+    Vectorized evaluate_chart_logic for many symbols at once.
+
+    high, low, close: 2-D float arrays shaped (symbols, bars), one row per
+    symbol, oldest bar first (e.g. np.stack([df['close'].to_numpy() for df in frames])).
+    rng: optional np.random.Generator used to pick the reason phrases.
+
+    Returns:
+      - labels: array of label strings, one per symbol,
+      - reason_idx: int array (symbols, 3) indexing REASON_TEXTS, -1 for unused slots,
+      - debug: dict of float arrays with the same keys as evaluate_chart_logic.
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    if close.ndim != 2 or high.shape != close.shape or low.shape != close.shape:
+        raise ValueError("high, low and close must be 2-D arrays of the same shape")
+    rng = np.random.default_rng() if rng is None else rng
+
+    latest_close, trend, ao_latest, k, d = _last_bar_inputs(high, low, close)
+    branch, above, ao_pos = _rule_branch(latest_close, trend, ao_latest, k, d)
+    labels = _BRANCH_LABELS[branch]
+
+    # phrase pool per (branch, slot); branch 4 depends on the trend/AO flags
+    trend_pool = np.where(above, 'trend_positive', 'trend_negative')
+    ao_pool = np.where(ao_pos, 'ao_positive', 'ao_negative')
+    slot_pools = [
+        np.choose(branch, ['trend_positive', 'trend_positive', 'trend_positive',
+                           'trend_negative', trend_pool, 'unclear']),
+        np.choose(branch, ['rsi_high', 'ao_positive', 'ao_positive',
+                           'ao_negative', ao_pool, 'none']),
+        np.choose(branch, ['extended', 'rsi_reset', 'rsi_normal',
+                           'weakness', 'partial', 'none']),
+    ]
+    reason_idx = np.full((close.shape[0], 3), -1, dtype=np.int64)
+    for slot, pools in enumerate(slot_pools):
+        offset = np.array([_POOLS[p][0] for p in pools], dtype=np.int64)
+        size = np.array([_POOLS[p][1] for p in pools], dtype=np.int64)
+        used = size > 0
+        reason_idx[used, slot] = offset[used] + rng.integers(0, size[used])
+
+    debug = {
+        'price': np.round(latest_close, 2),
+        'trend': np.round(trend, 2),
+        'ao': np.round(ao_latest, 2),
+        '%K': np.round(k, 2),
+        '%D': np.round(d, 2),
+    }
+
+    return labels, reason_idx, debug
+
+
+def reasons_from_indices(reason_idx) -> list[str]:
+    """Turn one row of reason indices from evaluate_chart_logic_batch into phrases."""
+    return [REASON_TEXTS[i] for i in reason_idx if i >= 0]
+
+
+def evaluate_chart_logic_series(df: pd.DataFrame, window: int = 100,
+                                chunk_size: int = 4096) -> pd.DataFrame:
+    """
+    Label every bar of an OHLC frame in one vectorized pass.
+
+    Row i holds what evaluate_chart_logic(df.iloc[i - window + 1 : i + 1])
+    returns, i.e. the label a `window`-bar chart ending at that bar gets.
+    Bars with less than `window` bars of history get no label (NaN).
+    Windows are processed `chunk_size` at a time to bound memory.
+
+    Returns a DataFrame indexed like df with columns
+    label, price, trend, ao, %K, %D (debug values rounded to 2 decimals).
+    """
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+    n = len(close)
+
+    out = pd.DataFrame(
+        np.nan, index=df.index, columns=['label', 'price', 'trend', 'ao', '%K', '%D'],
+    )
+    out['label'] = out['label'].astype(object)
+    if n < window:
+        return out
+
+    # one row per chart window, ending at bars window-1 .. n-1 (views, no copy)
+    windows = [sliding_window_view(a, window) for a in (high, low, close)]
+    labels = np.empty(n - window + 1, dtype=object)
+    debug = np.empty((n - window + 1, 5))
+    for start in range(0, n - window + 1, chunk_size):
+        stop = start + chunk_size
+        inputs = _last_bar_inputs(*(w[start:stop] for w in windows))
+        branch, _, _ = _rule_branch(*inputs)
+        labels[start:stop] = _BRANCH_LABELS[branch]
+        debug[start:stop] = np.column_stack(inputs)
+
+    out.iloc[window - 1:, 0] = labels
+    out.iloc[window - 1:, 1:] = np.round(debug, 2)
+    return out
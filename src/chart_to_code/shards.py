@@ -0,0 +1,414 @@
+# shards.py
+"""
+Sharded, resumable dataset output.
+
+The generators used to keep their example count, label quotas and seen
+fingerprints only in memory and append straight to data.jsonl, so a crash
+meant starting over. ShardedDataset splits the run's `max_examples` into
+numbered shards of `shard_size` examples:
+
+  - shard k owns example ids k * shard_size onwards, so images and per-sample
+    JSON written by different processes never collide
+  - each label quota is split evenly across the shards, so a shard fills on
+    its own and the shards together meet the run's quotas
+  - a shard is written to shards/shard-0000k.jsonl.partial, one flushed and
+    fsynced line per example (carrying its id, label and fingerprint), then
+    renamed to shard-0000k.jsonl when full
+  - manifest.json (written with write-then-rename) records every shard's
+    status, owner and label counts; data.jsonl is rebuilt from the finished
+    shards each time one is committed
+
+A restarted generator claims the first shard that is not finished and not
+held by a live process, so it picks up its own crashed shard where its
+.partial stopped (a torn last line is dropped). Several generator processes
+on one dataset claim disjoint shards; all claims and example commits happen
+under an flock on manifest.lock, and fingerprints are checked against every
+other shard's lines at commit, so no window is kept twice.
+
+    dataset = ShardedDataset("data/training", max_examples=250, quota=LABEL_QUOTA)
+    while (shard := dataset.claim()) is not None:
+        ...
+        if shard.reserve(label, fingerprint):
+            ...  # render and save the images under shard.next_id()
+            shard.add(example, label, fingerprint)
+        ...
+        if shard.full:
+            shard.commit()
+"""
+from collections import Counter
+from contextlib import contextmanager
+import fcntl
+import json
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+
+MANIFEST = "manifest.json"
+SHARD_DIR = "shards"
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_lines(path: str, truncate: bool = False) -> list[dict]:
+    """Complete JSON lines of a shard file; with truncate, a torn tail is cut off the file."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return []
+    lines, good = [], 0
+    for line in raw.splitlines(keepends=True):
+        if not line.endswith(b"\n"):
+            break
+        try:
+            lines.append(json.loads(line))
+        except ValueError:
+            break
+        good += len(line)
+    if truncate and good < len(raw):
+        os.truncate(path, good)
+    return lines
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Shard:
+    """
+    One claimed shard: its quota, the examples written so far, and the
+    append-only .partial file they go to. Obtained from ShardedDataset.claim.
+    reserve/release and add may be called from different threads (e.g. the
+    sampling and writing stages of a pipeline).
+    """
+
+    def __init__(self, dataset: "ShardedDataset", index: int):
+        self.dataset = dataset
+        self.index = index
+        self.start_id = index * dataset.shard_size
+        self.target = dataset.shard_target(index)
+        self.quota = dataset.shard_quota(index)
+        self.partial_path = dataset.shard_path(index) + ".partial"
+        lines = _read_lines(self.partial_path, truncate=True)
+        self.count = len(lines)
+        self.collected = Counter(line["label"] for line in lines)
+        self._reserved = Counter()
+        self._seen = {line["fingerprint"] for line in lines}
+        # fingerprints of this shard's own examples, in order
+        self.fingerprints = [line["fingerprint"] for line in lines]
+        self._others = set()
+        self._offsets = {}
+        self._file = open(self.partial_path, "a")
+        self._lock = threading.Lock()
+        self._batch = False
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.target
+
+    @property
+    def remaining(self) -> int:
+        """Examples still to add, not counting reserved ones."""
+        return self.target - self.count - sum(self._reserved.values())
+
+    def next_id(self) -> int:
+        """Dataset-wide id of the next example to add."""
+        return self.start_id + self.count
+
+    def seen(self, fingerprint: str) -> bool:
+        """Whether a window with this fingerprint is in any shard (as of the last commit)."""
+        return fingerprint in self._seen
+
+    def reserve(self, label: str, fingerprint: str) -> bool:
+        """
+        Claim room for a labeled window before rendering it; False if the
+        window was seen before, the label's quota is used up or the shard is
+        full. Every successful reserve must be followed by add or release.
+        """
+        with self._lock:
+            if fingerprint in self._seen or self.remaining <= 0:
+                return False
+            if self.quota is not None and \
+                    self.collected[label] + self._reserved[label] >= self.quota.get(label, 0):
+                return False
+            self._reserved[label] += 1
+            self._seen.add(fingerprint)
+            return True
+
+    def release(self, label: str, fingerprint: str) -> None:
+        """Give back a reservation that is not going to be added."""
+        with self._lock:
+            self._reserved[label] -= 1
+            self._seen.discard(fingerprint)
+
+    def add(self, example: dict, label: str, fingerprint: str) -> bool:
+        """
+        Commit one reserved example (its files already written under next_id())
+        as a line of the shard. Returns False, and writes nothing, if another
+        process kept the same window in the meantime.
+        """
+        if self._batch:
+            return self._append(example, label, fingerprint)
+        with self.dataset._locked():
+            self._refresh_seen()
+            added = self._append(example, label, fingerprint)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return added
+
+    def _append(self, example, label, fingerprint) -> bool:
+        with self._lock:
+            self._reserved[label] -= 1
+        if fingerprint in self._others:
+            return False
+        line = dict(example, id=self.next_id(), label=label, fingerprint=fingerprint)
+        self._file.write(json.dumps(line) + "\n")
+        with self._lock:
+            self.count += 1
+            self.collected[label] += 1
+            self.fingerprints.append(fingerprint)
+        return True
+
+    @contextmanager
+    def batch(self):
+        """
+        Add several examples under one hold of the dataset lock and one fsync:
+
+            with shard.batch():
+                for ...:
+                    ...  # write the files under shard.next_id()
+                    shard.add(example, label, fingerprint)
+
+        Other processes wait for the lock meanwhile, so keep batches short.
+        """
+        with self.dataset._locked():
+            self._refresh_seen()
+            self._batch = True
+            try:
+                yield self
+            finally:
+                self._batch = False
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def _refresh_seen(self) -> None:
+        """Read the lines other shards appended since the last call."""
+        shard_dir = self.dataset.shard_dir
+        for name in os.listdir(shard_dir):
+            path = os.path.join(shard_dir, name)
+            if path == self.partial_path or not name.startswith("shard-"):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    f.seek(self._offsets.get(path, 0))
+                    raw = f.read()
+            except FileNotFoundError:
+                continue  # renamed by its owner since listdir
+            end = raw.rfind(b"\n") + 1
+            self._offsets[path] = self._offsets.get(path, 0) + end
+            for line in raw[:end].splitlines():
+                fp = json.loads(line)["fingerprint"]
+                self._others.add(fp)
+                self._seen.add(fp)
+
+    def commit(self, transform=None) -> None:
+        """
+        Finish the shard: move it into place, record it in the manifest and
+        rebuild data.jsonl. transform(lines) -> lines, if given, rewrites the
+        shard's lines on the way (e.g. to point them at a pack, see packed).
+        """
+        self._file.close()
+        self.dataset._held.discard(self.index)
+        final = self.dataset.shard_path(self.index)
+        tmp = None
+        if transform is not None:
+            # written beside the .partial, which other processes may be reading
+            lines = transform(_read_lines(self.partial_path))
+            fd, tmp = tempfile.mkstemp(dir=self.dataset.shard_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.writelines(json.dumps(line) + "\n" for line in lines)
+                f.flush()
+                os.fsync(f.fileno())
+        with self.dataset._locked():
+            if tmp is None:
+                os.replace(self.partial_path, final)
+            else:
+                os.replace(tmp, final)
+                os.remove(self.partial_path)
+            manifest = self.dataset._load_manifest()
+            self.dataset._mark_done(manifest, self.index, self.count, self.collected)
+            self.dataset._save_manifest(manifest)
+            self.dataset._rebuild_jsonl(manifest)
+
+    def close(self) -> None:
+        """Stop writing without committing; the shard is resumed by the next claim."""
+        self._file.close()
+        self.dataset._held.discard(self.index)
+
+
+class ShardedDataset:
+    """
+    The shards of one dataset directory (normally data/training).
+
+    max_examples: examples in the whole dataset.
+    shard_size: examples per shard (the last one may hold fewer).
+    quota: {label: examples} for the whole dataset, split across the shards;
+        None for no quotas.
+    claim_timeout: seconds after which a shard claimed from another host
+        whose .partial has not changed is considered abandoned.
+    The settings are stored in the manifest; reopening a dataset with
+    different ones raises ValueError.
+    """
+
+    def __init__(self, root: str, max_examples: int, shard_size: int = 50,
+                 quota: dict | None = None, claim_timeout: float = 600.0):
+        if max_examples < 1 or shard_size < 1:
+            raise ValueError("max_examples and shard_size must be at least 1")
+        self.root = root
+        self.max_examples = max_examples
+        self.shard_size = shard_size
+        self.quota = dict(quota) if quota is not None else None
+        self.claim_timeout = claim_timeout
+        self.num_shards = math.ceil(max_examples / shard_size)
+        self.shard_dir = os.path.join(root, SHARD_DIR)
+        self.manifest_path = os.path.join(root, MANIFEST)
+        self.jsonl_path = os.path.join(root, "data.jsonl")
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._held = set()
+        os.makedirs(self.shard_dir, exist_ok=True)
+        with self._locked():
+            manifest = self._load_manifest()
+            settings = self._settings()
+            if manifest["settings"] is None:
+                manifest["settings"] = settings
+                self._save_manifest(manifest)
+            elif manifest["settings"] != settings:
+                raise ValueError(f"{self.manifest_path} was created with {manifest['settings']}, "
+                                 f"not {settings}")
+
+    def _settings(self) -> dict:
+        return {"max_examples": self.max_examples, "shard_size": self.shard_size,
+                "quota": self.quota}
+
+    def shard_path(self, index: int) -> str:
+        return os.path.join(self.shard_dir, f"shard-{index:05d}.jsonl")
+
+    def shard_quota(self, index: int) -> dict | None:
+        """Shard `index`'s share of every label quota."""
+        if self.quota is None:
+            return None
+        n = self.num_shards
+        return {label: q // n + (index < q % n) for label, q in self.quota.items()}
+
+    def shard_target(self, index: int) -> int:
+        """Examples shard `index` holds when full."""
+        size = min(self.shard_size, self.max_examples - index * self.shard_size)
+        if self.quota is None:
+            return size
+        return min(size, sum(self.shard_quota(index).values()))
+
+    # manifest
+
+    @contextmanager
+    def _locked(self):
+        # opened per use, as in rate_limit: flock belongs to the open file
+        fd = os.open(os.path.join(self.root, "manifest.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {"settings": None, "shards": {}}
+        # a shard renamed into place by a process that died before recording it
+        for index in range(self.num_shards):
+            entry = manifest["shards"].get(str(index), {})
+            if entry.get("status") != "done" and os.path.exists(self.shard_path(index)):
+                if os.path.exists(self.shard_path(index) + ".partial"):
+                    os.remove(self.shard_path(index) + ".partial")
+                lines = _read_lines(self.shard_path(index))
+                self._mark_done(manifest, index, len(lines), Counter(l["label"] for l in lines))
+        return manifest
+
+    def _save_manifest(self, manifest: dict) -> None:
+        manifest["updated"] = time.time()
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=2).encode())
+
+    def _mark_done(self, manifest, index, count, labels) -> None:
+        manifest["shards"][str(index)] = {"status": "done", "count": count, "labels": dict(labels)}
+
+    def _rebuild_jsonl(self, manifest: dict) -> None:
+        parts = []
+        for index in range(self.num_shards):
+            if manifest["shards"].get(str(index), {}).get("status") == "done":
+                with open(self.shard_path(index), "rb") as f:
+                    parts.append(f.read())
+        _write_atomic(self.jsonl_path, b"".join(parts))
+
+    def _claim_alive(self, index: int, entry: dict) -> bool:
+        host, _, pid = entry["owner"].rpartition(":")
+        if host == socket.gethostname():
+            return _pid_alive(int(pid))
+        try:
+            touched = os.path.getmtime(self.shard_path(index) + ".partial")
+        except FileNotFoundError:
+            touched = entry.get("claimed_at", 0)
+        return time.time() - touched < self.claim_timeout
+
+    # claiming
+
+    def claim(self) -> Shard | None:
+        """
+        The lowest-numbered shard that is neither finished nor held by a live
+        process, claimed for this process; None once every shard is done or taken.
+        """
+        with self._locked():
+            manifest = self._load_manifest()
+            for index in range(self.num_shards):
+                entry = manifest["shards"].get(str(index))
+                if index in self._held or entry is not None and (
+                        entry["status"] == "done" or
+                        entry["owner"] != self.owner and self._claim_alive(index, entry)):
+                    continue
+                manifest["shards"][str(index)] = {"status": "claimed", "owner": self.owner,
+                                                  "claimed_at": time.time()}
+                self._save_manifest(manifest)
+                shard = Shard(self, index)
+                shard._refresh_seen()
+                self._held.add(index)
+                return shard
+        return None
+
+    def status(self) -> dict:
+        """Shard and example counts: done, claimed, pending, examples, labels."""
+        with self._locked():
+            manifest = self._load_manifest()
+        done = [e for e in manifest["shards"].values() if e["status"] == "done"]
+        labels = Counter()
+        for e in done:
+            labels.update(e["labels"])
+        claimed = sum(e["status"] == "claimed" for e in manifest["shards"].values())
+        return {"done": len(done), "claimed": claimed,
+                "pending": self.num_shards - len(done) - claimed,
+                "examples": sum(e["count"] for e in done), "labels": dict(labels)}
@@ -0,0 +1,109 @@
+# single_flight.py
+"""
+Coalescing of identical concurrent work.
+
+Every browser session of the app runs its own script thread. Without
+coordination, five sessions watching BTC/USDT make five identical candle
+fetches, five sets of renders and five model calls per refresh. SingleFlight
+runs one call per key: the first caller executes it, callers arriving while
+it is in flight wait for and share its result, and later callers get the
+stored result. Keys that include the candle-close boundary
+(resample.candle_close) therefore hold a result until the next candle.
+
+    flights = SingleFlight(maxsize=512)
+    close = candle_close("1h", exchange.milliseconds())
+    df = flights.do(("ohlcv", symbol, "1h", close), lambda: store.fetch(exchange, symbol, "1h"))
+
+Results are shared between threads as-is and must be treated as read-only.
+Errors are not stored: every caller waiting on a failed call sees its
+exception and the next call tries again.
+"""
+from collections import OrderedDict
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "abandoned")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """
+    One execution per key across threads, with the results of the last
+    `maxsize` keys kept (LRU). Thread-safe; share one instance per process.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def do(self, key, fn):
+        """fn() for the first caller of `key`; everyone else gets its result."""
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    self.hits += 1
+                    return self._results[key]
+                call = self._inflight.get(key)
+                leader = call is None
+                if leader:
+                    call = self._inflight[key] = _Call()
+                    self.misses += 1
+                else:
+                    self.shared += 1
+            if leader:
+                return self._lead(key, call, fn)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            if not call.abandoned:
+                return call.result
+            # the leader was interrupted (e.g. its Streamlit session reran); retry
+
+    def _lead(self, key, call, fn):
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # not an error of fn (a rerun/stop of the leader's own thread):
+            # don't hand it to the waiters, let one of them run fn instead
+            call.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None and not call.abandoned:
+                    self._results[key] = call.result
+                    while len(self._results) > self.maxsize:
+                        self._results.popitem(last=False)
+            call.done.set()
+        return call.result
+
+    def forget(self, key) -> None:
+        """Drop the stored result for `key` (an in-flight call is unaffected)."""
+        with self._lock:
+            self._results.pop(key, None)
+
+    def stats(self) -> dict:
+        """Hits on stored results, calls that joined one in flight, and executions."""
+        with self._lock:
+            return {"hits": self.hits, "shared": self.shared, "misses": self.misses,
+                    "entries": len(self._results), "inflight": len(self._inflight)}
@@ -1,42 +1,141 @@
 # stock_rsi_plot.py
+import matplotlib
 import matplotlib.pyplot as plt
 from io import BytesIO
 import pandas as pd
 
-from chart_to_code.rule_engine import compute_stoch_rsi
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.image_format import check_format, encode_rgb, figure_to_rgb
+from chart_to_code.raster import check_backend, raster_stoch
+from chart_to_code.vision_budget import check_size
 
-def plot_stock_rsi(df: pd.DataFrame,
+def _stoch_lines(df, timeperiod, fastk_period, fastd_period):
+    ind = IndicatorFrame.wrap(df)
+
+    # compute once with identical parameters (shared with the rule engine)
+    fastk, fastd = ind.stoch_rsi(rsi_period=timeperiod,
+                                 stoch_period=fastk_period,
+                                 smooth_k=fastd_period)
+    return ind.df, fastk, fastd
+
+
+_DPI = 100
+
+
+def _figsize(size):
+    if size is None:
+        return (6, 3)
+    width, height = check_size(size)
+    return (width / _DPI, height / _DPI)
+
+
+def _subplot_defaults() -> dict:
+    """The subplot parameters a new figure starts with."""
+    return {name: matplotlib.rcParams[f'figure.subplot.{name}']
+            for name in ('left', 'bottom', 'right', 'top', 'wspace', 'hspace')}
+
+
+def _build_stoch_figure(df, fastk, fastd, figsize=(6, 3)):
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.set_xticklabels([])
+    lines = [
+        ax.plot(df.index, fastk, label='%K')[0],
+        ax.plot(df.index, fastd, label='%D')[0],
+    ]
+    ax.axhline(80, linestyle='--')
+    ax.axhline(20, linestyle='--')
+    ax.legend()
+    fig.tight_layout()
+    return fig, ax, lines
+
+
+def _save_png(fig) -> bytes:
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=_DPI)
+    buf.seek(0)
+    return buf.getvalue()
+
+
+def _save(fig, format='png'):
+    if format == 'png':
+        return _save_png(fig)
+    return encode_rgb(figure_to_rgb(fig, _DPI), format)
+
+
+def plot_stock_rsi(df: pd.DataFrame | IndicatorFrame,
                    timeperiod: int = 14,
                    fastk_period: int = 14,
-                   fastd_period: int = 3) -> tuple[bytes, float, float]:
+                   fastd_period: int = 3,
+                   backend: str = 'matplotlib',
+                   size: tuple[int, int] | None = None,
+                   format: str = 'png') -> tuple[bytes, float, float]:
     """
+    backend: 'matplotlib' or 'numpy' (chart_to_code.raster, no ticks or legend).
+    size: exact (width, height) in pixels, multiples of 28 (see vision_budget).
+    format: 'png', 'rgb' (uint8 array), 'webp' or 'palette' (see image_format).
+
     Returns:
-      - PNG bytes of the full %K and %D chart,
+      - PNG bytes of the full %K and %D chart (or the image in `format`),
       - the last %K value,
       - the last %D value.
     """
-    buf = BytesIO()
-
-    # compute once with identical parameters
-    fastk, fastd = compute_stoch_rsi(df['close'],
-                                     rsi_period=timeperiod,
-                                     stoch_period=fastk_period,
-                                     smooth_k=fastd_period)
+    check_backend(backend)
+    check_format(format)
+    figsize = _figsize(size)
+    ind = IndicatorFrame.wrap(df)
+    df, fastk, fastd = _stoch_lines(ind, timeperiod, fastk_period, fastd_period)
 
     # plot
-    fig, ax = plt.subplots(figsize=(6, 3))
-    ax.set_xticklabels([])
-    ax.plot(df.index, fastk, label='%K')
-    ax.plot(df.index, fastd, label='%D')
-    ax.axhline(80, linestyle='--')
-    ax.axhline(20, linestyle='--')
-    ax.legend()
-    fig.tight_layout()
-    fig.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
+    if backend == 'numpy':
+        img = raster_stoch(ind, timeperiod, fastk_period, fastd_period,
+                           size=(round(figsize[0] * _DPI), round(figsize[1] * _DPI)))
+        png = encode_rgb(img, format)
+    else:
+        fig, ax, _ = _build_stoch_figure(df, fastk, fastd, figsize)
+        png = _save(fig, format)
+        plt.close(fig)
 
     # extract last values
     k_last = float(fastk.iloc[-1])
     d_last = float(fastd.iloc[-1])
-    return buf.getvalue(), k_last, d_last
+    return png, k_last, d_last
+
+
+class StochRSIRenderer:
+    """
+    Persistent Stoch RSI panel renderer.
+
+    The figure is built on the first render; later renders only swap the
+    %K/%D line data, re-derive the axis limits and redo the layout from the
+    fresh-figure subplot parameters before re-encoding. The PNG is
+    byte-identical to plot_stock_rsi for the same frame.
+    size, format: as for plot_stock_rsi.
+    """
+
+    def __init__(self, timeperiod=14, fastk_period=14, fastd_period=3, size=None, format='png'):
+        check_format(format)
+        self.format = format
+        self.params = (timeperiod, fastk_period, fastd_period)
+        self.figsize = _figsize(size)
+        self.fig = None
+
+    def render(self, df) -> tuple[bytes, float, float]:
+        """Same contract as plot_stock_rsi: (PNG bytes, last %K, last %D)."""
+        df, fastk, fastd = _stoch_lines(df, *self.params)
+        if self.fig is None:
+            self.fig, self.ax, self._lines = _build_stoch_figure(df, fastk, fastd, self.figsize)
+        else:
+            for line, series in zip(self._lines, (fastk, fastd)):
+                line.set_data(df.index, series)
+            self.ax.relim()
+            self.ax.autoscale_view()
+            # tight_layout starts from the current subplot parameters, so each
+            # render restarts it from the fresh-figure ones
+            self.fig.subplots_adjust(**_subplot_defaults())
+            self.fig.tight_layout()
+        return _save(self.fig, self.format), float(fastk.iloc[-1]), float(fastd.iloc[-1])
+
+    def close(self) -> None:
+        if self.fig is not None:
+            plt.close(self.fig)
+            self.fig = None
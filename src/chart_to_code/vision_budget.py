@@ -0,0 +1,171 @@
+# vision_budget.py
+"""
+Image sizes and vision-token costs for the Qwen2.5-VL patch grid.
+
+Qwen2.5-VL cuts images into 14px patches and merges 2x2 of them, so every
+28x28 pixel cell costs one vision token. The processor resizes any other size
+to the nearest multiples of 28 that fit its min/max pixel budget
+(smart_resize below). Panels rendered at exactly such a size skip that
+resize, and a smaller pixel budget buys fewer tokens per request.
+
+Sizes are (width, height) in pixels, like the rest of chart_to_code.
+
+    python -m chart_to_code.vision_budget generated_dataset/panels
+
+prints the token cost of the images already on disk.
+"""
+from io import BytesIO
+import math
+import os
+import struct
+import sys
+
+import numpy as np
+from PIL import Image
+
+PATCH = 28
+# processor defaults for Qwen2.5-VL
+MIN_PIXELS = 4 * PATCH * PATCH
+MAX_PIXELS = 16384 * PATCH * PATCH
+
+# budgeted panel sizes (multiples of 28) close to each panel's native aspect
+PANEL_SIZES = {
+    "main": (448, 308),       # 176 tokens (native ~650x440: ~360)
+    "ao": (672, 252),         # 216 tokens (native 1200x450: 688)
+    "rsi": (448, 224),        # 128 tokens (native 600x300: 231)
+    "composite": (448, 532),  # 304 tokens for all three panels
+}
+
+
+def smart_resize(width: int, height: int, factor: int = PATCH,
+                 min_pixels: int = MIN_PIXELS, max_pixels: int = MAX_PIXELS) -> tuple[int, int]:
+    """The (width, height) the Qwen2.5-VL processor resizes an image to."""
+    if max(width, height) / min(width, height) > 200:
+        raise ValueError(f"Aspect ratio of {width}x{height} is too extreme")
+    h_bar = max(factor, round(height / factor) * factor)
+    w_bar = max(factor, round(width / factor) * factor)
+    if h_bar * w_bar > max_pixels:
+        beta = math.sqrt((height * width) / max_pixels)
+        h_bar = math.floor(height / beta / factor) * factor
+        w_bar = math.floor(width / beta / factor) * factor
+    elif h_bar * w_bar < min_pixels:
+        beta = math.sqrt(min_pixels / (height * width))
+        h_bar = math.ceil(height * beta / factor) * factor
+        w_bar = math.ceil(width * beta / factor) * factor
+    return w_bar, h_bar
+
+
+def vision_tokens(width: int, height: int, min_pixels: int = MIN_PIXELS,
+                  max_pixels: int = MAX_PIXELS) -> int:
+    """Vision tokens an image of this size costs after the processor's resize."""
+    w, h = smart_resize(width, height, min_pixels=min_pixels, max_pixels=max_pixels)
+    return (w // PATCH) * (h // PATCH)
+
+
+def check_size(size) -> tuple[int, int]:
+    """
+    Validate a render size: two positive multiples of PATCH within the
+    processor's pixel budget and aspect limit, so smart_resize keeps it as is.
+    """
+    width, height = size
+    if width <= 0 or height <= 0 or width % PATCH or height % PATCH:
+        raise ValueError(f"size must be positive multiples of {PATCH}px, got {width}x{height}")
+    if not MIN_PIXELS <= width * height <= MAX_PIXELS:
+        raise ValueError(f"size must have {MIN_PIXELS} to {MAX_PIXELS} pixels, got {width}x{height}")
+    if max(width, height) / min(width, height) > 200:
+        raise ValueError(f"Aspect ratio of {width}x{height} is too extreme")
+    return int(width), int(height)
+
+
+def fit_axes_to_figure(fig, pad_inches: float = 0.05) -> None:
+    """
+    Shrink the axes of a fixed-size figure until everything drawn (tick labels
+    included) fits inside it. This is the fixed-size counterpart of
+    savefig(bbox_inches='tight'), for figures such as mplfinance's that
+    matplotlib's tight_layout cannot handle.
+    """
+    renderer = fig.canvas.get_renderer()
+    width, height = fig.get_size_inches()
+    # shrinking can change the ticks (and so the label widths); a few passes settle it
+    for _ in range(3):
+        tight = fig.get_tightbbox(renderer)
+        left = max(0.0, pad_inches - tight.x0) / width
+        right = max(0.0, tight.x1 - width + pad_inches) / width
+        bottom = max(0.0, pad_inches - tight.y0) / height
+        top = max(0.0, tight.y1 - height + pad_inches) / height
+        if not (left or right or bottom or top):
+            return
+
+        # map the union of the axes boxes onto the shrunken area, keeping the
+        # panels' relative positions
+        boxes = [ax.get_position() for ax in fig.axes]
+        x0, x1 = min(b.x0 for b in boxes), max(b.x1 for b in boxes)
+        y0, y1 = min(b.y0 for b in boxes), max(b.y1 for b in boxes)
+        nx0, nx1 = x0 + left, x1 - right
+        ny0, ny1 = y0 + bottom, y1 - top
+        sx, sy = (nx1 - nx0) / (x1 - x0), (ny1 - ny0) / (y1 - y0)
+        for ax, b in zip(fig.axes, boxes):
+            ax.set_position([nx0 + (b.x0 - x0) * sx, ny0 + (b.y0 - y0) * sy,
+                             b.width * sx, b.height * sy])
+
+
+def png_size(png: bytes) -> tuple[int, int]:
+    """(width, height) from a PNG header, without decoding the image."""
+    if png[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError("Not a PNG image")
+    return struct.unpack(">II", png[16:24])
+
+
+def image_size(img) -> tuple[int, int]:
+    """(width, height) of an RGB array or of encoded PNG/WebP bytes."""
+    if isinstance(img, np.ndarray):
+        return img.shape[1], img.shape[0]
+    if img[:8] == b"\x89PNG\r\n\x1a\n":
+        return png_size(img)
+    with Image.open(BytesIO(img)) as pil:  # reads the header only
+        return pil.size
+
+
+def token_report(images: dict) -> dict:
+    """
+    Per-image size and token cost for {name: image}, plus a "total" entry;
+    images are in any image_format format. Use it on one sample's panels to
+    see what a request will cost.
+    """
+    report = {}
+    for name, img in images.items():
+        w, h = image_size(img)
+        report[name] = {"size": (w, h), "resized": smart_resize(w, h), "tokens": vision_tokens(w, h)}
+    report["total"] = {"tokens": sum(r["tokens"] for r in report.values())}
+    return report
+
+
+def _directory_report(root: str) -> None:
+    for name in sorted(os.listdir(root)):
+        folder = os.path.join(root, name)
+        if not os.path.isdir(folder):
+            continue
+        tokens, sizes = [], set()
+        for fname in os.listdir(folder):
+            path = os.path.join(folder, fname)
+            if fname.endswith(".png"):
+                with open(path, "rb") as f:
+                    w, h = png_size(f.read(24))
+            elif fname.endswith(".webp"):
+                with Image.open(path) as pil:
+                    w, h = pil.size
+            elif fname.endswith(".npy"):
+                h, w = np.load(path, mmap_mode="r").shape[:2]
+            else:
+                continue
+            sizes.add((w, h))
+            tokens.append(vision_tokens(w, h))
+        if tokens:
+            budget = PANEL_SIZES.get(name)
+            budget_txt = f", budgeted {budget[0]}x{budget[1]}: {vision_tokens(*budget)}" if budget else ""
+            print(f"{name:10s} {len(tokens):6d} images, {len(sizes)} sizes, "
+                  f"mean {sum(tokens) / len(tokens):.0f} tokens{budget_txt}")
+
+
+if __name__ == "__main__":
+    _directory_report(sys.argv[1] if len(sys.argv) > 1 else "generated_dataset/panels")
@@ -0,0 +1,162 @@
+# window_sampler.py
+"""
+Walk-forward window sampling from long candle histories.
+
+Instead of refetching the latest 100 candles of every pair until the label
+quotas fill, fetch each pair's history once and slide the chart window
+across it. rule_engine.evaluate_chart_logic_series labels every window of a
+history in one vectorized pass, so the windows are grouped by label before
+anything is rendered, and a generator draws only the labels its remaining
+quotas still need:
+
+    sampler = WindowSampler(histories, window=100, stride=5)
+    print(sampler.available())                      # {label: windows}
+    for s in sampler.take(50, accept=lambda s: quota_left(s.label)):
+        render(s.df); save(s.label, s.reasoning)
+
+Windows of each label are drawn in a seeded random order across pairs and
+time, which does not depend on the order the histories were added in (a
+pipeline can add them with add() as they arrive). A drawn window is labeled
+again with evaluate_chart_logic (for its reason phrases and debug values);
+one the caller does not accept is kept and offered again by later take
+calls, so windows skipped because one shard's quota was full are not lost to
+the next shard. With a
+dedup.NearDuplicateIndex, windows too similar to one already taken are
+dropped too, and every taken window is added to it as pending: the caller
+confirms and saves the windows of each shard it commits.
+"""
+from collections import deque, namedtuple
+import hashlib
+import heapq
+import zlib
+
+import numpy as np
+
+from chart_to_code.dedup import NearDuplicateIndex, shape_vector
+from chart_to_code.indicators import IndicatorFrame
+from chart_to_code.rule_engine import evaluate_chart_logic, evaluate_chart_logic_series
+
+Sample = namedtuple("Sample", "symbol timeframe df label reasoning debug fingerprint")
+
+
+def window_fingerprint(df) -> str:
+    """
+    Exact dedup key of a chart window: its closes rounded to 3 decimals. The
+    hash must stay as it is, since the shards of existing datasets store it.
+    """
+    return hashlib.md5(df["close"].round(3).astype(str).to_json().encode()).hexdigest()
+
+
+def window_labels(df, window: int) -> np.ndarray:
+    """Rule-engine label of the window ending at every bar of a history (NaN for the first window - 1 bars)."""
+    return evaluate_chart_logic_series(df, window)["label"].to_numpy()
+
+
+class WindowSampler:
+    """
+    Windows of `window` bars ending every `stride` bars of each history,
+    grouped by rule-engine label.
+
+    histories: {(symbol, timeframe): DataFrame} as from OHLCVStore.afetch_many
+        (entries that are exceptions are skipped); more can be added later.
+    seed: seeds the draw order.
+    dedup: optional NearDuplicateIndex of the windows already in the dataset.
+    """
+
+    def __init__(self, histories: dict | None = None, window: int = 100, stride: int = 1,
+                 seed: int = 0, dedup: NearDuplicateIndex | None = None):
+        if window < 1 or stride < 1:
+            raise ValueError("window and stride must be at least 1")
+        self.window = window
+        self.stride = stride
+        self.seed = seed
+        self.histories = {}
+        # heaps of (priority, key, end) per label
+        self._queues = {}
+        # drawn windows the caller passed on, offered again first
+        self._ready = {}
+        self._fingerprints = set()
+        self.dedup = dedup
+        self._shapes = {}
+        self.drawn = 0
+        # windows dropped as near-duplicates of one in dedup
+        self.near_duplicates = 0
+        for key, df in (histories or {}).items():
+            if not isinstance(df, Exception):
+                self.add(key, df)
+
+    def add(self, key, df, labels=None) -> None:
+        """
+        Add the windows of history `key` ((symbol, timeframe)); `labels` are
+        its window_labels if they were computed already.
+        """
+        if labels is None:
+            labels = window_labels(df, self.window)
+        self.histories[key] = df
+        # windows ending at the newest bar and every `stride` bars before it,
+        # each with a priority seeded by the history and its position
+        ends = range(len(df) - 1, self.window - 2, -self.stride)
+        priorities = np.random.default_rng([self.seed, zlib.crc32(repr(key).encode())]).random(len(ends))
+        for end, priority in zip(ends, priorities.tolist()):
+            heapq.heappush(self._queues.setdefault(labels[end], []), (priority, key, end))
+            self._ready.setdefault(labels[end], deque())
+
+    def available(self) -> dict:
+        """Windows left per label (duplicates among them are only found when drawn)."""
+        return {label: len(q) + len(self._ready[label]) for label, q in sorted(self._queues.items())}
+
+    def _near_duplicate(self, fingerprint) -> bool:
+        """Whether the drawn window is a near-duplicate (and so dropped)."""
+        if self.dedup is None or self.dedup.find(self._shapes[fingerprint]) is None:
+            return False
+        self.near_duplicates += 1
+        return True
+
+    def _next(self, label, seen):
+        ready = self._ready[label]
+        while ready:
+            sample = ready.popleft()
+            if (seen is None or not seen(sample.fingerprint)) and \
+                    not self._near_duplicate(sample.fingerprint):
+                return sample
+        queue = self._queues[label]
+        while queue:
+            _, (symbol, timeframe), end = heapq.heappop(queue)
+            df = self.histories[symbol, timeframe].iloc[end - self.window + 1:end + 1]
+            fingerprint = window_fingerprint(df)
+            if fingerprint in self._fingerprints or (seen is not None and seen(fingerprint)):
+                continue
+            self._fingerprints.add(fingerprint)
+            if self.dedup is not None:
+                self._shapes[fingerprint] = shape_vector(df, self.dedup.segments)
+                if self._near_duplicate(fingerprint):
+                    continue
+            self.drawn += 1
+            label, reasoning, debug = evaluate_chart_logic(IndicatorFrame(df))
+            return Sample(symbol, timeframe, df, label, reasoning, debug, fingerprint)
+        return None
+
+    def take(self, n: int, accept, seen=None) -> list:
+        """
+        Up to `n` samples that `accept(sample)` takes, drawn round-robin over
+        the labels. A label stops being drawn from for this call at its first
+        refusal (its quota is full); the refused sample is kept for later.
+        seen(fingerprint): windows for which it is true are dropped.
+        """
+        out = []
+        active = sorted(label for label, left in self.available().items() if left)
+        while len(out) < n and active:
+            for label in list(active):
+                if len(out) >= n:
+                    break
+                sample = self._next(label, seen)
+                if sample is None:
+                    active.remove(label)
+                elif accept(sample):
+                    out.append(sample)
+                    if self.dedup is not None:
+                        self.dedup.add(sample.fingerprint, self._shapes[sample.fingerprint], pending=True)
+                else:
+                    self._ready[label].appendleft(sample)
+                    active.remove(label)
+        return out
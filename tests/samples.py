@@ -0,0 +1,61 @@
+"""Sample candles for the tests: the offline exchange's series and a random walk."""
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from chart_to_code.async_fetch import StubExchange
+from chart_to_code.resample import ohlcv_frame
+
+# a fixed "now", so the stub's candles do not change between runs
+NOW_MS = 1_760_000_000_000
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+TIMEFRAMES = ["1h", "4h", "1d"]
+
+
+def stub_candles(symbol="BTC/USDT", timeframe="1h", bars=500) -> pd.DataFrame:
+    """The latest `bars` candles of StubExchange (EXCHANGE=stub), as ohlcv_frame."""
+    exchange = StubExchange(rate_limit=0, latency=0.0, now_ms=NOW_MS)
+    return ohlcv_frame(asyncio.run(exchange.fetch_ohlcv(symbol, timeframe, limit=bars)))
+
+
+def sample_close(n=400, seed=7) -> pd.Series:
+    """A random-walk close with a NaN gap and two flat-price runs."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    close[60:90] = close[59]      # flat for longer than the RSI period
+    close[150:155] = np.nan       # missing candles
+    close[300:306] = close[299]   # flat for less than the RSI period
+    return pd.Series(close, index=pd.date_range("2024-01-01", periods=n, freq="h"))
+
+
+def sample_frame(n=400, seed=7) -> pd.DataFrame:
+    """OHLC candles around sample_close (its NaN gap filled, so with flat runs only)."""
+    close = sample_close(n, seed).ffill()
+    spread = np.random.default_rng(seed + 1).random((2, n)) * 0.005
+    opens = close.shift(1).fillna(close.iloc[0])
+    high = np.maximum(opens, close) * (1 + spread[0])
+    low = np.minimum(opens, close) * (1 - spread[1])
+    # a flat run is flat in every column
+    flat = close.diff().eq(0) & close.diff(-1).eq(0)
+    high[flat] = low[flat] = close[flat]
+    return pd.DataFrame({"open": opens, "high": high, "low": low, "close": close,
+                         "volume": 1.0}, index=close.index.rename("ts"))
+
+
+def sample_frames() -> dict:
+    """{name: OHLC frame} of the random walk and the stub candles of every SYMBOLS/TIMEFRAMES pair."""
+    frames = {"random-walk": sample_frame()}
+    for symbol in SYMBOLS:
+        for timeframe in TIMEFRAMES:
+            frames[f"{symbol}-{timeframe}"] = stub_candles(symbol, timeframe)
+    return frames
+
+
+def sample_closes() -> dict:
+    """{name: close} of the random walk and the stub candles of every SYMBOLS/TIMEFRAMES pair."""
+    closes = {"random-walk": sample_close()}
+    for symbol in SYMBOLS:
+        for timeframe in TIMEFRAMES:
+            closes[f"{symbol}-{timeframe}"] = stub_candles(symbol, timeframe)["close"]
+    return closes
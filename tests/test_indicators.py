@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from chart_to_code.indicators import IndicatorFrame, IndicatorState
+from tests.samples import sample_frames
+
+FRAMES = sample_frames()
+
+
+def expected_values(df) -> pd.DataFrame:
+    """IndicatorState's outputs for every bar of df, from the batch pandas definitions."""
+    ind = IndicatorFrame(df)
+    k, d = ind.stoch_rsi()
+    return pd.DataFrame({
+        "close": ind.close,
+        "EMA13": ind.ema13,
+        "EMA21": ind.ema21,
+        "SMMA14": ind.smma14,
+        "trend": (ind.ema13 + ind.ema21 + ind.smma14) / 3,
+        "ao": ind.awesome_oscillator(5, 34),
+        "%K": k,
+        "%D": d,
+    })
+
+
+@pytest.mark.parametrize("name", list(FRAMES))
+def test_indicator_state_matches_pandas(name):
+    df = FRAMES[name]
+    expected = expected_values(df)
+    state = IndicatorState.from_frame(df.iloc[:50])
+    rng = np.random.default_rng(0)
+    for ts, high, low, close in zip(df.index[50:], df["high"][50:], df["low"][50:], df["close"][50:]):
+        # the candle forms over a few ticks before it closes at its final values
+        for scale in 1 + rng.normal(0, 0.01, 3):
+            state.update(ts, high * scale, low * scale, close * scale)
+        values = state.update(ts, high, low, close)
+        row = expected.loc[ts]
+        for key in expected.columns:
+            np.testing.assert_allclose(values[key], row[key], rtol=1e-9, atol=1e-9, equal_nan=True,
+                                       err_msg=f"{key} at {ts}")
+    assert state.count == len(df)
+
+
+def test_indicator_state_rejects_older_candles():
+    df = FRAMES["random-walk"]
+    state = IndicatorState.from_frame(df.iloc[:10])
+    with pytest.raises(ValueError):
+        state.update(df.index[5], 1.0, 1.0, 1.0)
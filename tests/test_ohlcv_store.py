@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+
+from chart_to_code.async_fetch import StubExchange
+from chart_to_code.ohlcv_store import OHLCVStore
+from tests.samples import NOW_MS
+
+HOUR_MS = 3_600_000
+
+
+def sync(store, now_ms, bars):
+    exchange = StubExchange(rate_limit=0, latency=0.0, now_ms=now_ms)
+    return asyncio.run(store.afetch(exchange, "BTC/USDT", "1h", bars))
+
+
+def reference(now_ms, bars):
+    exchange = StubExchange(rate_limit=0, latency=0.0, now_ms=now_ms)
+    return asyncio.run(exchange.fetch_ohlcv("BTC/USDT", "1h", limit=bars))
+
+
+def test_incremental_sync_appends_new_candles(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    sync(store, NOW_MS, 500)
+    df = sync(store, NOW_MS + 2 * HOUR_MS, 100)
+    assert len(store.timestamps("BTC/USDT", "1h")) == 502
+    np.testing.assert_array_equal(df["close"].to_numpy(), [row[4] for row in reference(NOW_MS + 2 * HOUR_MS, 100)])
+
+
+def test_sync_across_a_gap_keeps_the_stored_history(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    sync(store, NOW_MS, 500)
+    # polled for 2 candles after missing 3: the gap is filled, nothing is dropped
+    df = sync(store, NOW_MS + 5 * HOUR_MS, 2)
+    ts = store.timestamps("BTC/USDT", "1h")
+    assert len(ts) == 505
+    assert (np.diff(ts) == HOUR_MS).all()
+    full = reference(NOW_MS + 5 * HOUR_MS, 505)
+    np.testing.assert_array_equal(store.get("BTC/USDT", "1h", 505)["close"].to_numpy(), [row[4] for row in full])
+    assert len(df) == 2
+
+
+def test_series_ahead_of_the_exchange_clock_is_replaced(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    sync(store, NOW_MS, 100)
+    sync(store, NOW_MS - 1000 * HOUR_MS, 100)
+    ts = store.timestamps("BTC/USDT", "1h")
+    assert len(ts) == 100 and ts[-1] <= NOW_MS - 1000 * HOUR_MS
+
+
+def test_for_exchange_keeps_each_exchange_apart(tmp_path):
+    from chart_to_code.replay import ReplayExchange
+
+    recording = OHLCVStore(str(tmp_path / "recordings" / "march"))
+    sync(recording, NOW_MS, 100)
+    stub = OHLCVStore.for_exchange(StubExchange(), str(tmp_path / "ohlcv"))
+    replay = OHLCVStore.for_exchange(ReplayExchange(recording, speed=0), str(tmp_path / "ohlcv"))
+    assert stub.root == str(tmp_path / "ohlcv" / "stub")
+    assert replay.root == str(tmp_path / "ohlcv" / "replay-march")
@@ -0,0 +1,49 @@
+import matplotlib
+import numpy as np
+import pytest
+
+from chart_to_code.main_plot import MainChartRenderer, plot_main_chart
+from chart_to_code.oscillator_plot import OscillatorRenderer, plot_oscillator
+from chart_to_code.stock_rsi_plot import StochRSIRenderer, plot_stock_rsi
+from tests.samples import sample_frame, stub_candles
+
+matplotlib.use("Agg")
+
+
+def frames():
+    """Frames of different lengths and value ranges, rendered one after another."""
+    history = stub_candles("BTC/USDT", "4h", 400)
+    return [history.iloc[:40], history.iloc[-20:], history.iloc[150:250], sample_frame().iloc[:100]]
+
+
+@pytest.mark.parametrize("size", [None, (336, 168)])
+def test_stoch_rsi_renderer_matches_plot_stock_rsi(size):
+    renderer = StochRSIRenderer(size=size)
+    try:
+        for df in frames():
+            png, k_last, d_last = renderer.render(df)
+            expected_png, expected_k, expected_d = plot_stock_rsi(df, size=size)
+            assert png == expected_png
+            np.testing.assert_equal((k_last, d_last), (expected_k, expected_d))
+    finally:
+        renderer.close()
+
+
+@pytest.mark.parametrize("size", [None, (336, 168)])
+def test_oscillator_renderer_matches_plot_oscillator(size):
+    renderer = OscillatorRenderer(size=size)
+    try:
+        for df in frames():
+            assert renderer.render(df) == plot_oscillator(df, size=size)
+    finally:
+        renderer.close()
+
+
+@pytest.mark.parametrize("size", [None, (672, 448)])
+def test_main_chart_renderer_matches_plot_main_chart(size):
+    renderer = MainChartRenderer(size=size)
+    try:
+        for df in frames():
+            assert renderer.render(df) == plot_main_chart(df, size=size)
+    finally:
+        renderer.close()
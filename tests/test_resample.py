@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from chart_to_code.resample import ohlcv_arrays, ohlcv_frame
+
+
+def test_ohlcv_arrays_maps_none_to_nan():
+    rows = [[1_000, 1.0, 2.0, 0.5, 1.5, 10.0],
+            [2_000, 1.5, 2.5, 1.0, 2.0, None],
+            [2_000, 9.0, 9.0, 9.0, 9.0, 9.0],   # duplicate timestamp: dropped
+            [3_000, 2.0, 3.0, 1.5, None, None]]
+    ts, values = ohlcv_arrays(rows)
+    np.testing.assert_array_equal(ts, [1_000, 2_000, 3_000])
+    np.testing.assert_array_equal(values[3], [1.5, 2.0, np.nan])
+    np.testing.assert_array_equal(values[4], [10.0, np.nan, np.nan])
+
+
+def test_ohlcv_frame_matches_pandas_parsing():
+    rows = [[1_000, 1.0, 2.0, 0.5, 1.5, None], [2_000, 1.5, 2.5, 1.0, 2.0, 3.0]]
+    expected = pd.DataFrame(rows, columns=["ts", "open", "high", "low", "close", "volume"], dtype=float)
+    frame = ohlcv_frame(rows)
+    np.testing.assert_array_equal(frame.to_numpy(), expected.iloc[:, 1:].to_numpy())
+    assert (frame.index == pd.to_datetime([1_000, 2_000], unit="ms")).all()
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from chart_to_code.rolling import ewm_mean, rolling_max, rolling_mean, rolling_min
+from chart_to_code.rule_engine import (
+    compute_rsi,
+    compute_rsi_fast,
+    compute_stoch_rsi,
+    compute_stoch_rsi_fast,
+)
+from tests.samples import sample_close, sample_closes
+
+CLOSES = sample_closes()
+
+
+def assert_same(fast, reference, atol=1e-9):
+    np.testing.assert_allclose(np.asarray(fast), np.asarray(reference), rtol=1e-9, atol=atol, equal_nan=True)
+
+
+@pytest.mark.parametrize("close", list(CLOSES.values()), ids=list(CLOSES))
+@pytest.mark.parametrize("window,min_periods", [(3, None), (14, None), (14, 1), (34, 10)])
+def test_rolling_kernels_match_pandas(close, window, min_periods):
+    rolling = close.rolling(window=window, min_periods=min_periods)
+    assert_same(rolling_mean(close, window, min_periods), rolling.mean())
+    assert_same(rolling_min(close, window, min_periods), rolling.min())
+    assert_same(rolling_max(close, window, min_periods), rolling.max())
+
+
+def test_rolling_kernels_along_last_axis():
+    rows = np.stack([sample_close(seed=s).to_numpy() for s in range(4)])
+    for kernel in (rolling_mean, rolling_min, rolling_max):
+        batch = kernel(rows, 14, 1)
+        for row, out in zip(rows, batch):
+            assert_same(out, kernel(row, 14, 1))
+
+
+@pytest.mark.parametrize("close", list(CLOSES.values()), ids=list(CLOSES))
+def test_ewm_mean_matches_pandas_exactly(close):
+    close = close.ffill()
+    for alpha in (2 / 14, 2 / 22, 1 / 14):
+        expected = close.ewm(alpha=alpha, adjust=False).mean().to_numpy()
+        np.testing.assert_array_equal(ewm_mean(close.to_numpy(), alpha), expected)
+
+
+@pytest.mark.parametrize("close", list(CLOSES.values()), ids=list(CLOSES))
+@pytest.mark.parametrize("period", [2, 14])
+def test_compute_rsi_fast_matches_compute_rsi(close, period):
+    fast = compute_rsi_fast(close, period)
+    assert isinstance(fast, pd.Series)
+    assert fast.index.equals(close.index)
+    assert_same(fast, compute_rsi(close, period))
+    assert_same(compute_rsi_fast(close.to_numpy(), period), compute_rsi(close, period))
+
+
+def test_compute_rsi_fast_flat_run_is_nan():
+    rsi = compute_rsi_fast(sample_close(), 14)
+    # no gains and no losses in the window: 0 / 0, as with pandas
+    assert np.isnan(rsi.iloc[89])
+
+
+@pytest.mark.parametrize("close", list(CLOSES.values()), ids=list(CLOSES))
+@pytest.mark.parametrize("rsi_period,stoch_period,smooth_k", [(14, 14, 3), (5, 10, 2)])
+def test_compute_stoch_rsi_fast_matches_compute_stoch_rsi(close, rsi_period, stoch_period, smooth_k):
+    k, d = compute_stoch_rsi(close, rsi_period, stoch_period, smooth_k)
+    fast_k, fast_d = compute_stoch_rsi_fast(close, rsi_period, stoch_period, smooth_k)
+    assert fast_k.index.equals(close.index) and fast_d.index.equals(close.index)
+    # %K divides by the RSI range, which magnifies rounding differences
+    assert_same(fast_k, k, atol=1e-6)
+    assert_same(fast_d, d, atol=1e-6)
+    array_k, array_d = compute_stoch_rsi_fast(close.to_numpy(), rsi_period, stoch_period, smooth_k)
+    assert_same(array_k, k, atol=1e-6)
+    assert_same(array_d, d, atol=1e-6)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from chart_to_code.rule_engine import (
+    evaluate_chart_logic,
+    evaluate_chart_logic_batch,
+    evaluate_chart_logic_series,
+    reasons_from_indices,
+)
+from tests.samples import sample_frames
+
+FRAMES = sample_frames()
+WINDOW = 100
+DEBUG_KEYS = ["price", "trend", "ao", "%K", "%D"]
+
+
+def windows(df, stride):
+    """The WINDOW-bar windows of df ending every `stride` bars, newest last."""
+    return [df.iloc[end - WINDOW + 1:end + 1] for end in range(WINDOW - 1, len(df), stride)]
+
+
+def test_batch_matches_evaluate_chart_logic():
+    charts = [w for df in FRAMES.values() for w in windows(df, 15)]
+    high, low, close = (np.stack([w[c].to_numpy() for w in charts]) for c in ("high", "low", "close"))
+    labels, reason_idx, debug = evaluate_chart_logic_batch(high, low, close, rng=np.random.default_rng(0))
+    assert len(set(labels)) > 2
+    for i, chart in enumerate(charts):
+        label, reasons, expected = evaluate_chart_logic(chart)
+        assert labels[i] == label
+        assert len(reasons_from_indices(reason_idx[i])) == len(reasons)
+        for key in DEBUG_KEYS:
+            np.testing.assert_array_equal(debug[key][i], expected[key], err_msg=key)
+
+
+@pytest.mark.parametrize("name", ["random-walk", "BTC/USDT-1h", "SOL/USDT-1d"])
+def test_series_matches_windowed_evaluate_chart_logic(name):
+    df = FRAMES[name]
+    series = evaluate_chart_logic_series(df, WINDOW)
+    assert series["label"].iloc[:WINDOW - 1].isna().all()
+    for chart in windows(df, 3):
+        label, _, expected = evaluate_chart_logic(chart)
+        row = series.loc[chart.index[-1]]
+        assert row["label"] == label
+        for key in DEBUG_KEYS:
+            np.testing.assert_array_equal(row[key], expected[key], err_msg=key)
@@ -2,8 +2,6 @@
 # validate_on_full.py
 
 import os
-import glob
-import json
 import time
 import base64
 import numpy as np
@@ -11,6 +9,10 @@ import pandas as pd
 from openai import OpenAI
 from typing import List, Tuple, Dict
 
+from chart_to_code.dataset_index import DatasetIndex, update_index
+from chart_to_code.image_format import encode_rgb
+from chart_to_code.packed import PackReader
+
 
 # ─── CONFIG
 serve_URL      = "http://194.68.245.137:22119/v1"
@@ -25,7 +27,14 @@ EMBED_MODEL     = os.getenv("EMBED_MODEL", "models--dunzhang--stella_en_1.5B_v5/
 
 
 BASE_DIR        = "data"
-FULL_JSON_GLOB  = os.path.join(BASE_DIR, "full", "*.json")
+# samples are listed from the dataset index (chart_to_code.dataset_index);
+# packed shards (chart_to_code.packed) hold their samples' images
+TRAIN_DIR       = os.path.join(BASE_DIR, "training")
+PACK_DIR        = os.path.join(BASE_DIR, "packs")
+# optional slice to validate on, comma-separated, e.g. VALIDATE_TIMEFRAME=4h
+# VALIDATE_LABEL="Sell Signal,Bearish"
+VALIDATE_FILTER = {col: os.environ[f"VALIDATE_{col.upper()}"].split(",")
+                   for col in ("symbol", "timeframe", "label") if os.getenv(f"VALIDATE_{col.upper()}")}
 SYSTEM_PROMPT   = "chart_analysis_system_prompt.md"
 USER_PROMPT     = "prompt.txt"
 
@@ -42,11 +51,41 @@ def load_prompt(path: str) -> str:
 
 def load_base64(rel_path: str) -> str:
     full = os.path.join(BASE_DIR, rel_path)
-    with open(full, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+    if full.endswith(".npy"):
+        # raw RGB arrays go over the wire as PNG
+        data = encode_rgb(np.load(full), "png")
+    else:
+        with open(full, "rb") as f:
+            data = f.read()
+    return base64.b64encode(data).decode("utf-8")
+
+def pack_base64(pack: PackReader, i: int, entry: Dict) -> Tuple[str, str]:
+    data = pack.image_data(i, entry["name"])
+    if entry["format"] == "rgb":
+        # raw RGB arrays go over the wire as PNG
+        return base64.b64encode(encode_rgb(data, "png")).decode("utf-8"), "image/png"
+    mime = "image/webp" if entry["format"] == "webp" else "image/png"
+    return base64.b64encode(data).decode("utf-8"), mime
+
+def iter_examples():
+    """(name, index record, [(base64, mime)] per image) for the selected loose and packed samples."""
+    update_index(TRAIN_DIR, BASE_DIR)
+    packs = {}
+    for ex in DatasetIndex(TRAIN_DIR).select(**VALIDATE_FILTER).records():
+        if ex["pack"] is not None:
+            if ex["pack"] not in packs:
+                packs[ex["pack"]] = PackReader(os.path.join(PACK_DIR, ex["pack"]))
+            pack, i = packs[ex["pack"]], ex["pack_index"]
+            parts = [pack_base64(pack, i, entry) for entry in pack[i]["images"]]
+            yield f"{ex['pack']}:{i}", ex, parts
+        else:
+            # main/ao/rsi panels, or the single composite image
+            parts = [(load_base64(rel), "image/webp" if rel.endswith(".webp") else "image/png")
+                     for rel in ex["images"]]
+            yield os.path.basename(ex["full"] or ex["images"][0]), ex, parts
 
-def make_image_part(b64: str) -> Dict:
-    return {"type":"image_url","image_url":{"url":f"data:image/png;base64,{b64}"}}
+def make_image_part(b64: str, mime: str = "image/png") -> Dict:
+    return {"type":"image_url","image_url":{"url":f"data:{mime};base64,{b64}"}}
 
 def format_debug(debug: Dict) -> str:
     return (
@@ -75,33 +114,32 @@ user_text   = load_prompt(USER_PROMPT)
 
 # ─── VALIDATION LOOP
 records=[]
-for path in glob.glob(FULL_JSON_GLOB):
-    with open(path) as f:
-        ex = json.load(f)
-
+for name, ex, image_parts in iter_examples():
     # ground truth
     gt_label   = ex["label"].strip()
-    gt_reasons = ex["reasoning"][:]  # copy
+    gt_reasons = list(ex.get("reasoning") or [])  # copy; None without per-sample JSON
     while len(gt_reasons)<3:
         gt_reasons.append("")
 
     debug_txt  = format_debug(ex["debug"])
-    imgs_rel   = [ex["images"]["main"], ex["images"]["ao"], ex["images"]["rsi"]]
+    image_mode = ex["image_mode"]
 
     # build chat messages
     sys_msg = {"role":"system","content":[{"type":"text","text":system_text}]}
     user_content = [{"type":"text","text":user_text},
                     {"type":"text","text":debug_txt}]
-    for rel in imgs_rel:
-        user_content.append(make_image_part(load_base64(rel)))
+    for b64, mime in image_parts:
+        user_content.append(make_image_part(b64, mime))
     user_msg = {"role":"user","content":user_content}
 
     # call VLM
+    start = time.time()
     resp = client.chat.completions.create(
         model=CHAT_MODEL_PATH,
         messages=[sys_msg,user_msg],
         max_tokens=512
     )
+    latency = time.time() - start
     out = resp.choices[0].message.content.strip()
     pred_label, pred_reasons = parse_response(out)
 
@@ -126,13 +164,16 @@ for path in glob.glob(FULL_JSON_GLOB):
                 v1 = np.array(pair.data[1].embedding)
                 sims.append(cosine_sim(v0,v1))
             except Exception as e:
-                print(f"Embedding error for '{gt}' vs '{pr}' in {path}: {e}")
+                print(f"Embedding error for '{gt}' vs '{pr}' in {name}: {e}")
                 sims.append(0.0)
 
     avg_sim = sum(sims)/3.0
 
     records.append({
-        "file":       os.path.basename(path),
+        "file":       name,
+        "image_mode": image_mode,
+        "prompt_tokens": resp.usage.prompt_tokens if resp.usage else None,
+        "latency":    latency,
         "gt_label":   gt_label,
         "pred_label": pred_label,
         "ok_structure": ok_structure,
@@ -151,5 +192,8 @@ print(f"Structure OK   : {df['ok_structure'].mean():.2%}")
 print(f"Label Accuracy : {df['ok_label'].mean():.2%}")
 print(f"Mean Sim       : {df['avg_sim'].mean():.4f}")
 
+# prompt size and latency per image layout (panels vs composite)
+print(df.groupby("image_mode")[["prompt_tokens", "latency"]].mean().to_string())
+
 df.to_csv("validation_full_results.csv", index=False)
 print("Saved validation_full_results.csv")